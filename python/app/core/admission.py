@@ -0,0 +1,396 @@
+"""Per-client rate limits and per-model admission control for the prediction endpoints.
+
+Each prediction route has a cost class (cheap crop regression, CNN or LLM)
+and the models it runs. A request is admitted in two steps:
+
+1. Rate limit: a token bucket per client and cost class, where the client is
+   the ``user-id`` header (the client address when it is absent). An empty
+   bucket is answered with 429 before the body is read. Buckets live in
+   process or, with RATE_LIMIT_MONGO, in a Mongo collection shared by every
+   worker.
+2. Concurrency: at most MODEL_CONCURRENCY[model] requests run on a model at
+   once, across all routes using it. Requests queue for a slot once the body
+   has been received; one whose expected queue time (from the queue ahead and
+   the mean time a slot is held) is over ADMISSION_MAX_QUEUE_MS, or that has
+   actually waited that long, is shed with 503.
+
+Both rejections carry a Retry-After header.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+from pymongo import ReturnDocument
+
+from app.core.config import get_settings
+from app.core.database import get_db
+from app.core.metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+from app.utils.cache import LRUTTLCache
+
+CHEAP = "cheap"
+CNN = "cnn"
+LLM = "llm"
+
+# Client identifiers longer than this are cut, so a header cannot grow the bucket keys
+MAX_CLIENT_KEY = 128
+# After a failed shared-bucket call, use the in-process buckets for this long before trying Mongo again
+SHARED_RETRY_SECONDS = 5.0
+# Weight of the latest request in the mean slot-holding time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+@dataclass(frozen=True)
+class RouteCost:
+    cost_class: str
+    tokens: float = 1.0
+    models: Tuple[str, ...] = ()  # acquired in this (sorted) order, so overlapping routes cannot deadlock
+
+
+# Routes missing here (history, stats, metrics, model admin) are not limited
+ROUTE_COSTS: Dict[Tuple[str, str], RouteCost] = {
+    ("POST", "/predict_crop"): RouteCost(CHEAP, 1, ("crop",)),
+    # A batch is charged as a flat 10 requests; its size is unknown until the body is parsed
+    ("POST", "/predict_crop/batch"): RouteCost(CHEAP, 10, ("crop",)),
+    ("POST", "/predict_crop/batch/upload"): RouteCost(CHEAP, 10, ("crop",)),
+    ("POST", "/predict_pest"): RouteCost(CNN, 1, ("pest",)),
+    ("POST", "/disease-prediction"): RouteCost(CNN, 1, ("disease",)),
+    ("POST", "/predict_nutrient_deficiency"): RouteCost(CNN, 1, ("nutrient",)),
+    ("POST", "/scan"): RouteCost(CNN, 3, ("disease", "nutrient", "pest")),
+    ("POST", "/chatbot"): RouteCost(LLM, 1, ("gemini",)),
+    ("POST", "/chatbot/stream"): RouteCost(LLM, 1, ("gemini",)),
+}
+
+
+class AdmissionError(RuntimeError):
+    """A request refused by the rate limiter (429) or shed by a model limiter (503)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    rate: float  # tokens per second
+    burst: float
+
+    @property
+    def refill_seconds(self) -> float:
+        return self.burst / self.rate
+
+
+class RateLimiter:
+    """Token buckets per (cost class, client), in process or shared through Mongo.
+
+    A shared bucket is refilled and drawn from in one ``find_one_and_update``,
+    so concurrent workers cannot spend the same tokens. When Mongo fails, or
+    takes longer than ``shared_timeout`` seconds, the in-process bucket
+    answers instead (for SHARED_RETRY_SECONDS), so an outage loosens the
+    limit to one bucket per worker rather than refusing or stalling traffic.
+    """
+
+    collection = "rate_limits"
+
+    def __init__(
+        self, limits: Dict[str, BucketLimit], max_keys: int, use_mongo: bool = False, shared_timeout: float = 0.1
+    ) -> None:
+        self.limits = limits
+        # An idle bucket is full again after refill_seconds, so expired entries need not be kept
+        self.memory = LRUTTLCache(max_entries=max_keys)
+        self.use_mongo = use_mongo
+        self.shared_timeout = shared_timeout
+        self.shared_errors = 0
+        self._index_ready = False
+        self._shared_retry_at = 0.0
+
+    def _take_local(self, key: str, limit: BucketLimit, cost: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self.memory.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / limit.rate
+        self.memory.set(key, (tokens, now), ttl_seconds=limit.refill_seconds)
+        return wait
+
+    async def _ensure_index(self) -> None:
+        if not self._index_ready:
+            await get_db()[self.collection].create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+
+    async def _take_shared(self, key: str, limit: BucketLimit, cost: float) -> float:
+        await self._ensure_index()
+        now = time.time()
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated", now]}]}]}
+        refilled = {"$min": [limit.burst, {"$add": [{"$ifNull": ["$tokens", limit.burst]}, {"$multiply": [elapsed, limit.rate]}]}]}
+        enough = {"$gte": ["$tokens", cost]}
+        doc = await get_db()[self.collection].find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {
+                    "granted": enough,
+                    "tokens": {"$cond": [enough, {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    # The expiry index reads dates as UTC
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=limit.refill_seconds),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return 0.0 if doc["granted"] else (cost - doc["tokens"]) / limit.rate
+
+    async def take(self, client: str, cost_class: str, tokens: float) -> float:
+        """Draws ``tokens`` from the client's bucket; returns 0, or the seconds until they are available."""
+        limit = self.limits.get(cost_class)
+        if limit is None:
+            return 0.0
+        key = f"{cost_class}:{client}"
+        cost = min(tokens, limit.burst)  # otherwise a request larger than the bucket could never pass
+        if self.use_mongo and time.monotonic() >= self._shared_retry_at:
+            try:
+                # Otherwise an unreachable Mongo holds every request for the server selection timeout
+                return await asyncio.wait_for(self._take_shared(key, limit, cost), self.shared_timeout)
+            except Exception:
+                self.shared_errors += 1
+                self._shared_retry_at = time.monotonic() + SHARED_RETRY_SECONDS
+        return self._take_local(key, limit, cost)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "limits": {
+                name: {"per_minute": limit.rate * 60, "burst": limit.burst} for name, limit in self.limits.items()
+            },
+            "memory": self.memory.stats(),
+        }
+        if self.use_mongo:
+            stats["shared"] = {"errors": self.shared_errors}
+        return stats
+
+
+class ModelLimiter:
+    """At most ``limit`` requests on one model; the rest queue for up to ``max_wait`` seconds."""
+
+    def __init__(self, name: str, limit: int, max_wait: float) -> None:
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.max_wait = max_wait  # 0 = queue without a bound
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_time = 0.0  # moving average of how long a slot is held, in seconds
+        self.admitted = 0
+        self.shed = 0
+
+    def expected_wait(self) -> float:
+        """Seconds until a new arrival gets a slot, from the queue ahead of it and the mean service time."""
+        if self.in_flight < self.limit:
+            return 0.0
+        return (self.waiting + 1) * self.service_time / self.limit
+
+    def _overloaded(self) -> AdmissionError:
+        self.shed += 1
+        return AdmissionError(
+            f"Server busy: too many requests queued for the '{self.name}' model",
+            status_code=503,
+            retry_after=self.expected_wait(),
+        )
+
+    async def acquire(self) -> None:
+        if self.max_wait and self.expected_wait() > self.max_wait:
+            raise self._overloaded()
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait or None)
+        except asyncio.TimeoutError:
+            raise self._overloaded() from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, model=self.name)
+
+    def release(self, held: float | None = None) -> None:
+        """Frees the slot; ``held`` (seconds) feeds the mean service time, None for a slot never used."""
+        self.in_flight -= 1
+        if held is not None:
+            self.service_time += SERVICE_TIME_SMOOTHING * (held - self.service_time) if self.service_time else held
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "service_ms": round(self.service_time * 1000, 2),
+            "expected_wait_ms": round(self.expected_wait() * 1000, 2),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionController:
+    def __init__(self, rate_limiter: RateLimiter, models: Dict[str, ModelLimiter]) -> None:
+        self.rate_limiter = rate_limiter
+        self.models = models
+
+    async def check_rate(self, client: str, cost: RouteCost) -> None:
+        wait = await self.rate_limiter.take(client, cost.cost_class, cost.tokens)
+        if wait:
+            ADMISSION_REJECTIONS.inc(cost_class=cost.cost_class, reason="rate_limited")
+            raise AdmissionError(f"Rate limit exceeded for {cost.cost_class} requests", status_code=429, retry_after=wait)
+
+    async def acquire(self, cost: RouteCost) -> List[ModelLimiter]:
+        """Takes a slot on every model of the route, or none of them."""
+        held: List[ModelLimiter] = []
+        try:
+            for name in cost.models:
+                limiter = self.models.get(name)
+                if limiter is not None:
+                    await limiter.acquire()
+                    held.append(limiter)
+        except BaseException as e:
+            if isinstance(e, AdmissionError):
+                ADMISSION_REJECTIONS.inc(cost_class=cost.cost_class, reason="overloaded")
+            for limiter in held:
+                limiter.release()
+            raise
+        return held
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_limits": self.rate_limiter.stats(),
+            "models": {name: limiter.stats() for name, limiter in self.models.items()},
+        }
+
+
+def _bucket_limits() -> Dict[str, BucketLimit]:
+    settings = get_settings()
+    configured = {
+        CHEAP: (settings.RATE_LIMIT_CHEAP_PER_MINUTE, settings.RATE_LIMIT_CHEAP_BURST),
+        CNN: (settings.RATE_LIMIT_CNN_PER_MINUTE, settings.RATE_LIMIT_CNN_BURST),
+        LLM: (settings.RATE_LIMIT_LLM_PER_MINUTE, settings.RATE_LIMIT_LLM_BURST),
+    }
+    # A rate of 0 leaves the class unlimited
+    return {
+        name: BucketLimit(rate=per_minute / 60, burst=max(1.0, burst))
+        for name, (per_minute, burst) in configured.items()
+        if per_minute > 0
+    }
+
+
+@lru_cache
+def get_admission_controller() -> AdmissionController:
+    settings = get_settings()
+    rate_limiter = RateLimiter(
+        _bucket_limits(),
+        max_keys=settings.RATE_LIMIT_MAX_KEYS,
+        use_mongo=settings.RATE_LIMIT_MONGO,
+        shared_timeout=settings.RATE_LIMIT_MONGO_TIMEOUT_MS / 1000,
+    )
+    models = {
+        name: ModelLimiter(name, limit, settings.ADMISSION_MAX_QUEUE_MS / 1000)
+        for name, limit in settings.MODEL_CONCURRENCY.items()
+        if limit > 0
+    }
+    return AdmissionController(rate_limiter, models)
+
+
+def client_key(scope: dict) -> str:
+    for name, value in scope["headers"]:
+        if name == b"user-id" and value.strip():
+            return "user:" + value.decode("latin-1").strip()[:MAX_CLIENT_KEY]
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class AdmissionControlMiddleware:
+    """Applies ROUTE_COSTS: 429 when the client's bucket is empty, 503 when a model sheds the request.
+
+    The rate check runs before the body is read. Model slots are taken once
+    the last body chunk arrives, so a slow upload does not hold a slot while
+    it trickles in, and are held until the response (streamed chatbot
+    replies included) is finished.
+    """
+
+    def __init__(self, app: Callable, controller: AdmissionController | None = None) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def _reject(self, send: Callable, error: AdmissionError) -> None:
+        body = json.dumps({"detail": str(error)}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": error.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(error.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        cost = ROUTE_COSTS.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller or get_admission_controller()
+        try:
+            await controller.check_rate(client_key(scope), cost)
+        except AdmissionError as e:
+            await self._reject(send, e)
+            return
+
+        held: List[ModelLimiter] = []
+        acquired = False
+        rejected: AdmissionError | None = None
+        response_started = False
+        started = 0.0
+
+        async def admitting_receive() -> Any:
+            nonlocal held, acquired, rejected, started
+            if rejected is not None:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False) and not acquired:
+                acquired = True
+                try:
+                    held = await controller.acquire(cost)
+                except AdmissionError as e:
+                    # The app sees a disconnect and stops; the rejection is sent below
+                    rejected = e
+                    return {"type": "http.disconnect"}
+                started = time.perf_counter()
+            return message
+
+        async def guarded_send(message: dict) -> None:
+            nonlocal response_started
+            if rejected is not None:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, admitting_receive, guarded_send)
+        except Exception:
+            if rejected is None:
+                raise
+        finally:
+            held_for = time.perf_counter() - started
+            for limiter in held:
+                limiter.release(held_for)
+        if rejected is not None and not response_started:
+            await self._reject(send, rejected)
@@ -26,12 +26,161 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("API_KEY", "openweather_api_key"),
     )
 
+    # Offline Gemini stand-in for latency testing
+    GEMINI_FAKE: bool = False
+    GEMINI_FAKE_TTFB_MS: float = 300.0
+    GEMINI_FAKE_TOKEN_MS: float = 20.0
+
+    # Chatbot answer cache
+    CHATBOT_CACHE_MAX_ENTRIES: int = 1024
+    CHATBOT_CACHE_TTL_SECONDS: float = 3600
+
     # SMTP / Email
     SMTP_HOST: str | None = None
     SMTP_PORT: int | None = 587
     SMTP_USER: str | None = None
     SMTP_PASS: str | None = None
     SMTP_FROM: str | None = None
+    SMTP_STARTTLS: bool = True
+    SMTP_POOL_SIZE: int = 2
+    SMTP_POOL_MAX_IDLE_SECONDS: float = 60
+
+    # Notification outbox
+    NOTIFY_BATCH_SIZE: int = 20
+    NOTIFY_MAX_ATTEMPTS: int = 5
+    NOTIFY_RETRY_BASE_SECONDS: float = 30
+    NOTIFY_DEDUPE_WINDOW_SECONDS: float = 3600
+    NOTIFY_LEASE_SECONDS: float = 300
+    NOTIFY_POLL_SECONDS: float = 5
+
+    # Models this worker loads and warms up at startup (crop, pest, disease, nutrient)
+    PRELOAD_MODELS: list[str] = Field(default_factory=lambda: ["crop", "pest", "disease", "nutrient"])
+
+    # Inference backend for the pest and disease CNNs: "native" (torch/keras) or "onnx" (ONNX Runtime)
+    INFERENCE_BACKEND: str = "native"
+    ONNX_INTRA_OP_THREADS: int = 0  # 0 lets ONNX Runtime pick
+    ONNX_QUANTIZE_INT8: bool = False
+    ONNX_CACHE_DIR: str | None = None  # defaults to models/onnx
+
+    # Model registry: versions registered under MODEL_REGISTRY_DIR (default models/registry) can be
+    # activated or rolled back at run time; each process re-reads the active versions this often (0 = never)
+    MODEL_REGISTRY_DIR: str | None = None
+    MODEL_REGISTRY_POLL_SECONDS: float = 10.0
+    MODEL_ADMIN_TOKEN: str | None = None  # required in the X-Admin-Token header of /models changes; unset = disabled
+
+    # Pest micro-batching
+    PEST_BATCH_MAX_SIZE: int = 16
+    PEST_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Pesticide recommendation index compiled from data/Pesticides.csv
+    PESTICIDE_INDEX_PATH: str | None = None  # defaults to models/pesticide_index.json
+    PESTICIDE_MATCH_CUTOFF: float = 0.75  # minimum edit-distance similarity for a fuzzy match
+    PESTICIDE_SEARCH_MAX_RESULTS: int = 50
+
+    # Crop regressors: "compiled" (array evaluator built at load time) or "sklearn"
+    CROP_INFERENCE_BACKEND: str = "compiled"
+
+    # Crop prediction memo, keyed on label codes and readings rounded to CROP_INPUT_DECIMALS (None = exact)
+    CROP_CACHE_ENABLED: bool = True
+    CROP_CACHE_MAX_ENTRIES: int = 8192
+    CROP_CACHE_TTL_SECONDS: float = 86400
+    CROP_INPUT_DECIMALS: int | None = 2
+
+    # Batch crop scoring
+    CROP_BATCH_MAX_ROWS: int = 50000
+
+    # Prediction cache for image endpoints
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 4096
+    PREDICTION_CACHE_TTL_SECONDS: float = 86400
+    PREDICTION_CACHE_MONGO: bool = False
+
+    # Pest and disease classifier outputs: top-k probabilities, softmax temperatures fitted on held-out
+    # data, and the confidence below which a result is returned as uncertain without being explained or stored
+    PREDICTION_TOP_K: int = 3
+    PEST_TEMPERATURE: float = 1.0
+    DISEASE_TEMPERATURE: float = 1.0
+    PEST_MIN_CONFIDENCE: float = 0.2
+    DISEASE_MIN_CONFIDENCE: float = 0.5
+
+    # Prefilter run on a thumbnail before the CNNs; failing uploads are answered with 422
+    IMAGE_GATE_ENABLED: bool = True
+    IMAGE_GATE_MIN_CONTRAST: float = 4.0  # standard deviation of the most varied colour channel
+    IMAGE_GATE_MIN_SHARPNESS: float = 5.0  # variance of the Laplacian
+    PEST_MIN_PLANT_FRACTION: float = 0.0  # pest photos may show only the insect
+    DISEASE_MIN_PLANT_FRACTION: float = 0.15
+
+    # Gemini disease explanations
+    EXPLANATION_TTL_SECONDS: float = 7 * 86400
+    EXPLANATION_PREWARM: bool = True
+    EXPLANATION_REFRESH_INTERVAL_SECONDS: float = 3600
+
+    # Upload limits for image endpoints; larger files are rejected with 413
+    MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    MAX_IMAGE_PIXELS: int = 60_000_000
+    # Whole request bodies (uploads plus form fields, or JSON batches); 0 = unlimited
+    MAX_REQUEST_BYTES: int = 21 * 1024 * 1024
+
+    # Nutrient analyzer; larger photos are decoded at reduced resolution
+    NUTRIENT_MAX_PIXELS: int = 4_000_000
+    NUTRIENT_MIN_REGION_PIXELS: int = 4
+    NUTRIENT_TILE_ROWS: int = 512
+
+    # Write-behind persistence of prediction documents
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_BATCH_SIZE: int = 200
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: float = 250
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+    WRITE_BEHIND_SPILL_DIR: str = "spill"
+    WRITE_BEHIND_CLOSE_TIMEOUT_SECONDS: float = 10  # at shutdown, spill whatever Mongo has not taken by then
+
+    # Prediction history pages
+    HISTORY_PAGE_SIZE: int = 20
+    HISTORY_MAX_PAGE_SIZE: int = 100
+
+    # Admission control keyed on the user-id header (client address when absent): token buckets per client
+    # and cost class answer 429; per-model concurrency caps shed with 503 past ADMISSION_MAX_QUEUE_MS in the queue
+    ADMISSION_ENABLED: bool = True
+    RATE_LIMIT_CHEAP_PER_MINUTE: float = 120  # crop predictions; 0 = unlimited
+    RATE_LIMIT_CHEAP_BURST: float = 30
+    RATE_LIMIT_CNN_PER_MINUTE: float = 30  # pest, disease, nutrient and scan
+    RATE_LIMIT_CNN_BURST: float = 10
+    RATE_LIMIT_LLM_PER_MINUTE: float = 10  # chatbot
+    RATE_LIMIT_LLM_BURST: float = 5
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMIT_MONGO: bool = False  # share the buckets between workers through Mongo
+    RATE_LIMIT_MONGO_TIMEOUT_MS: float = 100  # slower shared-bucket calls fall back to the in-process buckets
+    MODEL_CONCURRENCY: dict[str, int] = Field(
+        default_factory=lambda: {"crop": 32, "pest": 8, "disease": 4, "nutrient": 4, "gemini": 8}
+    )
+    ADMISSION_MAX_QUEUE_MS: float = 2000  # 0 = queue without a bound
+
+    # Executor pools ("thread" or "process"); QUEUE is the backlog allowed beyond WORKERS
+    INFERENCE_POOL_KIND: str = "thread"
+    INFERENCE_POOL_WORKERS: int = 4
+    INFERENCE_POOL_QUEUE: int = 32
+    IMAGE_POOL_KIND: str = "thread"
+    IMAGE_POOL_WORKERS: int = 4
+    IMAGE_POOL_QUEUE: int = 32
+    IO_POOL_KIND: str = "thread"
+    IO_POOL_WORKERS: int = 16
+    IO_POOL_QUEUE: int = 64
+
+    # Slow-request profiler: stacks of requests slower than PROFILE_SLOW_REQUEST_MS are dumped to PROFILE_DIR (0 = off)
+    PROFILE_SLOW_REQUEST_MS: float = 0
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = "profiles"
+
+    # Production server (serve.py): a gunicorn master preloads SERVER_SHARED_MODELS, then forks the workers
+    SERVER_WORKERS: int = 2
+    SERVER_WORKER_THREADS: int = 0  # math threads per worker; 0 splits the CPUs between the workers
+    SERVER_SHARED_MODELS: list[str] = Field(default_factory=lambda: ["crop", "pest", "nutrient"])
+    SERVER_SHARE_TORCH_MEMORY: bool = False
+    SERVER_TIMEOUT_SECONDS: int = 120
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_MAX_REQUESTS: int = 0  # recycle a worker after this many requests (0 = never)
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    SERVER_PIDFILE: str | None = None
 
     # CORS
     CORS_ORIGINS: list[str] = Field(default_factory=lambda: ["*"])
@@ -1,9 +1,16 @@
+from typing import Awaitable, Callable
+
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from .config import get_settings
 
 _settings = get_settings()
 _client: AsyncIOMotorClient | None = None
 _db: AsyncIOMotorDatabase | None = None
+_close_hooks: list[Callable[[], Awaitable[None]]] = []
+
+# Collections holding per-user prediction documents ({"user_id", "timestamp", "prediction", "input"})
+PREDICTION_COLLECTIONS = ("crops", "pests", "diseases", "nutrients", "scans")
 
 
 def get_client() -> AsyncIOMotorClient:
@@ -21,8 +28,39 @@ def get_db() -> AsyncIOMotorDatabase:
     return _db
 
 
+async def ensure_indexes() -> None:
+    """Creates the indexes the read paths rely on; a no-op for indexes that already exist."""
+    db = get_db()
+    # Serves history pages (keyset on timestamp, _id) and per-user time-range aggregations
+    history = IndexModel(
+        [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="user_history",
+    )
+    for collection in PREDICTION_COLLECTIONS:
+        await db[collection].create_indexes([history])
+    notifications = db["notifications"]
+    # Replaced by the unique outbox_dedupe_slot index
+    if "outbox_dedupe" in await notifications.index_information():
+        await notifications.drop_index("outbox_dedupe")
+    await notifications.create_indexes([
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="outbox_due"),
+        # One holder per dedupe key, so concurrent identical alerts cannot both be queued
+        IndexModel([("dedupe_slot", ASCENDING)], name="outbox_dedupe_slot", unique=True, sparse=True),
+    ])
+
+
+def register_close_hook(hook: Callable[[], Awaitable[None]]) -> None:
+    """Registers a coroutine function that close_db awaits before the client is closed."""
+    _close_hooks.append(hook)
+
+
 async def close_db() -> None:
     global _client, _db
+    for hook in _close_hooks:
+        try:
+            await hook()
+        except Exception:
+            pass
     if _client:
         _client.close()
     _client = None
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+from .config import get_settings
+
+INFERENCE = "inference"
+IMAGE = "image"
+IO = "io"
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool's queue is full; routes turn this into a 503."""
+
+    def __init__(self, pool: str, retry_after: int = 1) -> None:
+        super().__init__(f"Server busy: '{pool}' pool queue is full")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class BoundedPool:
+    """Thread or process pool that refuses work once ``workers + queue_limit`` jobs are pending."""
+
+    def __init__(self, name: str, kind: str, workers: int, queue_limit: int) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind for '{name}': {kind}")
+        self.name = name
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_limit)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Executor | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    def _release(self, _future: Any = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise PoolSaturatedError(self.name)
+            self._pending += 1
+        if self.kind == "process":
+            # Arguments are pickled to the worker, and memoryviews cannot be
+            args = tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in args)
+        try:
+            future = self._get_executor().submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # Released when the job itself ends: a cancelled caller only cancels a job that has not started,
+        # and one already running keeps its slot until it finishes
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "workers": self.workers, "capacity": self.capacity, "pending": self._pending}
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+_pools: Dict[str, BoundedPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> BoundedPool:
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if name not in _pools:
+            settings = get_settings()
+            prefix = name.upper()
+            _pools[name] = BoundedPool(
+                name,
+                kind=getattr(settings, f"{prefix}_POOL_KIND"),
+                workers=getattr(settings, f"{prefix}_POOL_WORKERS"),
+                queue_limit=getattr(settings, f"{prefix}_POOL_QUEUE"),
+            )
+        return _pools[name]
+
+
+async def run_in_pool(name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Runs a blocking callable on the named pool without stalling the event loop.
+
+    Functions sent to a process pool must be picklable (module-level).
+    """
+    return await get_pool(name).run(fn, *args, **kwargs)
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait)
+        _pools.clear()
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import bisect
+import math
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cache hit to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+# (metric name, type, help, [(labels, value)]) produced by collectors at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts with a final +Inf slot, sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(bound) if math.isinf(bound) else repr(bound)}
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the metrics of this process and renders them in the Prometheus text format.
+
+    Collectors are called at scrape time and turn existing stats (pools,
+    caches, batchers) into metric families, so those modules need no changes.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                continue  # a broken collector must not take /metrics down
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("app_http_requests_total", "HTTP requests by route, method and status.", ("method", "route", "status"))
+REQUEST_SECONDS = registry.histogram("app_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+IN_FLIGHT = registry.gauge("app_http_requests_in_flight", "HTTP requests currently being served.")
+STAGE_SECONDS = registry.histogram("app_stage_duration_seconds", "Latency of individual service stages.", ("stage",))
+STAGE_ERRORS = registry.counter("app_stage_errors_total", "Service stages that raised.", ("stage",))
+SHORT_CIRCUITS = registry.counter(
+    "app_prediction_short_circuits_total",
+    "Image predictions stopped before the downstream work (prefilter rejections and uncertain results).",
+    ("model", "reason"),
+)
+ADMISSION_REJECTIONS = registry.counter(
+    "app_admission_rejections_total",
+    "Requests refused by admission control (rate_limited: 429, overloaded: 503).",
+    ("cost_class", "reason"),
+)
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "app_admission_wait_seconds", "Time admitted requests queued for a model slot.", ("model",)
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Times a block (sync or inside a coroutine) into ``app_stage_duration_seconds``."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+# ---------------------- HTTP middleware ----------------------
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route template.
+
+    Written against raw ASGI rather than ``BaseHTTPMiddleware`` so streaming
+    responses are not buffered. For multipart uploads it also records the
+    ``upload.receive`` stage: from the start of the request until its last
+    body chunk has been received, which covers the transfer and Starlette's
+    parsing of the form as it arrives (the ``upload.read`` stage in the routes
+    only covers reading the already spooled file).
+    """
+
+    def __init__(self, app: Any, profiler: Optional["SlowRequestProfiler"] = None) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+        IN_FLIGHT.inc()
+        if self.profiler is not None:
+            self.profiler.request_started()
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        body_pending = _is_multipart(scope)
+
+        async def timed_receive() -> Dict[str, Any]:
+            nonlocal body_pending
+            message = await receive()
+            if body_pending and (message["type"] != "http.request" or not message.get("more_body", False)):
+                body_pending = False
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="upload.receive")
+            return message
+
+        try:
+            await self.app(scope, timed_receive if body_pending else receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUESTS.inc(method=method, route=route, status=status)
+            REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+            if self.profiler is not None:
+                self.profiler.request_finished(f"{method} {route}", started, elapsed)
+
+
+def _is_multipart(scope: Dict[str, Any]) -> bool:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-type":
+            return value.lower().startswith(b"multipart/form-data")
+    return False
+
+
+# ---------------------- Sampling profiler ----------------------
+class SlowRequestProfiler:
+    """Samples every thread's stack while requests are in flight and dumps slow requests as collapsed stacks.
+
+    Samples are taken with ``sys._current_frames`` every ``interval`` seconds
+    and kept for ``retention`` seconds. When a request takes longer than
+    ``threshold`` seconds, the samples taken during it are written to
+    ``output_dir`` in the folded format flamegraph.pl and speedscope read.
+    Requests that overlap share samples, so a dump may include their work too.
+    """
+
+    def __init__(self, threshold: float, interval: float, output_dir: str | Path, retention: float = 120.0) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = Path(output_dir)
+        self._samples: Deque[Tuple[float, List[str]]] = deque(maxlen=max(1, int(retention / interval)))
+        self._active = 0
+        self._lock = threading.Lock()
+        self._samples_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._frame_names: Dict[Any, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.dumps = 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+
+    def request_started(self) -> None:
+        with self._lock:
+            self._active += 1
+            self._ensure_thread()
+        self._wakeup.set()
+
+    def request_finished(self, label: str, started: float, elapsed: float) -> None:
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self._wakeup.clear()
+        if elapsed >= self.threshold:
+            stacks = self._stacks_between(started, started + elapsed)
+            if stacks:
+                threading.Thread(target=self._dump, args=(label, elapsed, stacks), daemon=True).start()
+
+    def _frame_name(self, code: Any) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+            self._frame_names[code] = name
+        return name
+
+    def _sample(self) -> List[str]:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            parts = []
+            while frame is not None:
+                parts.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            parts.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(parts)))
+        return stacks
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            sample = (time.perf_counter(), self._sample())
+            with self._samples_lock:
+                self._samples.append(sample)
+            time.sleep(self.interval)
+
+    def _stacks_between(self, start: float, end: float) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._samples_lock:
+            samples = list(self._samples)
+        for taken_at, stacks in samples:
+            if start <= taken_at <= end:
+                for stack in stacks:
+                    counts[stack] = counts.get(stack, 0) + 1
+        return counts
+
+    def _dump(self, label: str, elapsed: float, stacks: Dict[str, int]) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = self.output_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{int(1000 * elapsed)}ms-{slug}.folded"
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+        self.dumps += 1
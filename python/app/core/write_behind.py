@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections import defaultdict, deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Deque, Dict, List
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from .config import get_settings
+from .database import get_db, register_close_hook
+from .metrics import STAGE_SECONDS, stage_timer
+
+_DUPLICATE_KEY = 11000
+# How long to wait before retrying a spill replay that failed
+_REPLAY_RETRY_SECONDS = 30.0
+
+
+def _only_duplicates(error: BulkWriteError) -> bool:
+    # Replayed documents keep the _id assigned on the first attempt, so a
+    # duplicate key just means that part of the batch had already landed.
+    write_errors = error.details.get("writeErrors", [])
+    return bool(write_errors) and all(e.get("code") == _DUPLICATE_KEY for e in write_errors)
+
+
+class WriteBehindBuffer:
+    """Buffers prediction documents and writes them with ``insert_many``.
+
+    A collection is flushed once it holds ``batch_size`` documents or every
+    ``flush_interval`` seconds. When more than ``max_pending`` documents are
+    waiting, or Mongo rejects a flush, documents are appended to JSONL files
+    in ``spill_dir``; they are replayed after the next successful flush.
+    Once one batch of a flush fails the rest are spilled without trying
+    Mongo, and ``close`` gives up on Mongo after ``close_timeout`` seconds, so
+    an outage cannot hold a shutdown past the server's graceful timeout.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        spill_dir: str | Path,
+        close_timeout: float = 10.0,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.batch_size, max_pending)
+        self.spill_dir = Path(spill_dir)
+        self.close_timeout = close_timeout
+        self._pending: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._size = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._writing: tuple[str, List[Dict[str, Any]]] | None = None  # the batch insert_many is sending
+        self._replaying: set[Path] = set()  # replay files this process is working through
+        self._has_spill = bool(self._spill_files()) if self.spill_dir.exists() else False
+        self._next_replay_at = 0.0
+
+        self.flushes = 0
+        self.flush_errors = 0
+        self.documents_written = 0
+        self.documents_spilled = 0
+        self.documents_replayed = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def _ensure_worker(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, collection: str, doc: Dict[str, Any]) -> None:
+        await self.add_many(collection, [doc])
+
+    async def add_many(self, collection: str, docs: List[Dict[str, Any]]) -> None:
+        self._ensure_worker()
+        self._pending[collection].extend(docs)
+        self._size += len(docs)
+        if self._size > self.max_pending:
+            # Keep memory bounded: move the overflow straight to disk
+            overflow = self._take(collection, self._size - self.max_pending)
+            await asyncio.to_thread(self._spill, collection, overflow)
+        if len(self._pending[collection]) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take(self, collection: str, count: int) -> List[Dict[str, Any]]:
+        queue = self._pending[collection]
+        taken = [queue.popleft() for _ in range(min(count, len(queue)))]
+        self._size -= len(taken)
+        return taken
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Shielded so cancelling the worker never drops a batch mid-write
+                await asyncio.shield(self.flush())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    async def flush(self, deadline: float | None = None) -> bool:
+        """Writes out everything pending; with a ``time.monotonic()`` deadline, spills what is left once it passes.
+
+        Returns False when another flush still held the lock at the deadline.
+        """
+        if self._flush_lock is None:
+            return True
+        if deadline is None or not self._flush_lock.locked():
+            await self._flush_lock.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._flush_lock.acquire(), _remaining(deadline))
+            except asyncio.TimeoutError:
+                return False
+        try:
+            healthy, wrote = True, False
+            for collection in list(self._pending):
+                while self._pending[collection]:
+                    if not healthy:
+                        # Mongo just failed; further batches would each wait out the server selection timeout
+                        rest = self._take(collection, len(self._pending[collection]))
+                        await asyncio.to_thread(self._spill, collection, rest)
+                        break
+                    batch = self._take(collection, self.batch_size)
+                    if await self._write(collection, batch, _remaining(deadline)):
+                        wrote = True
+                    else:
+                        healthy = False
+                        await asyncio.to_thread(self._spill, collection, batch)
+            # A successful write shows Mongo is back, so replay without waiting out the retry delay
+            if deadline is None and healthy and self._has_spill and (wrote or time.monotonic() >= self._next_replay_at):
+                await self._replay()
+        finally:
+            self._flush_lock.release()
+        return True
+
+    async def _write(self, collection: str, docs: List[Dict[str, Any]], timeout: float | None = None) -> bool:
+        started = time.perf_counter()
+        self._writing = (collection, docs)
+        try:
+            # insert_many assigns the _ids before sending, so a batch cut off here and spilled replays without duplicates
+            await asyncio.wait_for(get_db()[collection].insert_many(docs, ordered=False), timeout)
+        except BulkWriteError as e:
+            if not _only_duplicates(e):
+                self.flush_errors += 1
+                return False
+        except Exception:
+            self.flush_errors += 1
+            return False
+        finally:
+            self._writing = None
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage="mongo.insert_many")
+        self.flushes += 1
+        self.documents_written += len(docs)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
+        return True
+
+    def _spill(self, collection: str, docs: List[Dict[str, Any]], replayed: bool = False) -> None:
+        if not docs:
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_dir / f"{collection}.jsonl", "a", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc) + "\n")
+        if not replayed:
+            self.documents_spilled += len(docs)
+        self._has_spill = True
+
+    def _spill_files(self) -> List[Path]:
+        """Spill files waiting for a replay, including replays a dead worker never finished."""
+        files = list(self.spill_dir.glob("*.jsonl"))
+        for path in self.spill_dir.glob("*.replay"):
+            pid = _replay_pid(path)
+            if pid is None:
+                continue
+            # A file under our own pid that we are not replaying was left by a cancelled
+            # replay or by an earlier process that had the same pid
+            stale = path not in self._replaying if pid == os.getpid() else not _pid_alive(pid)
+            if stale:
+                files.append(path)
+        return sorted(files)
+
+    async def _replay(self) -> None:
+        for path in self._spill_files():
+            collection = path.name.rsplit(".", 2)[0] if path.suffix == ".replay" else path.stem
+            # Unique per claim so two files of one collection never share a name
+            replaying = self.spill_dir / f"{collection}.{os.getpid()}-{uuid.uuid4().hex[:8]}.replay"
+            try:
+                path.rename(replaying)
+            except FileNotFoundError:
+                continue  # another worker picked it up
+            self._replaying.add(replaying)
+            try:
+                docs = await asyncio.to_thread(_read_spill, replaying)
+                for start in range(0, len(docs), self.batch_size):
+                    batch = docs[start:start + self.batch_size]
+                    if not await self._write(collection, batch):
+                        await asyncio.to_thread(self._spill, collection, docs[start:], True)
+                        replaying.unlink(missing_ok=True)
+                        self._next_replay_at = time.monotonic() + _REPLAY_RETRY_SECONDS
+                        return
+                    self.documents_replayed += len(batch)
+                replaying.unlink(missing_ok=True)
+            finally:
+                self._replaying.discard(replaying)
+        self._has_spill = bool(self._spill_files())
+
+    async def close(self) -> None:
+        deadline = time.monotonic() + self.close_timeout
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not await self.flush(deadline) and self._writing is not None:
+            # The worker's flush is still waiting on Mongo; keep its batch too, a replay skips it if it lands
+            self._spill(*self._writing)
+        # Anything Mongo did not take is kept on disk for the next start
+        for collection in list(self._pending):
+            self._spill(collection, self._take(collection, len(self._pending[collection])))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._size,
+            "queue_depth_by_collection": {name: len(q) for name, q in self._pending.items() if q},
+            "max_pending": self.max_pending,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "documents_written": self.documents_written,
+            "documents_spilled": self.documents_spilled,
+            "documents_replayed": self.documents_replayed,
+            "last_flush_ms": round(1000 * self.last_flush_seconds, 3),
+            "max_flush_ms": round(1000 * self.max_flush_seconds, 3),
+            "avg_flush_ms": round(1000 * self.total_flush_seconds / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+
+def _remaining(deadline: float | None) -> float | None:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _replay_pid(path: Path) -> int | None:
+    # <collection>.<pid>.replay, or <collection>.<pid>-<token>.replay
+    try:
+        return int(path.name.rsplit(".", 2)[-2].split("-")[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # alive, owned by another user
+    return True
+
+
+def _read_spill(path: Path) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json_util.loads(line) for line in f if line.strip()]
+
+
+@lru_cache
+def get_write_buffer() -> WriteBehindBuffer | None:
+    settings = get_settings()
+    if not settings.WRITE_BEHIND_ENABLED:
+        return None
+    buffer = WriteBehindBuffer(
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000.0,
+        max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+        spill_dir=settings.WRITE_BEHIND_SPILL_DIR,
+        close_timeout=settings.WRITE_BEHIND_CLOSE_TIMEOUT_SECONDS,
+    )
+    register_close_hook(buffer.close)
+    return buffer
+
+
+async def store_documents(collection: str, docs: List[Dict[str, Any]]) -> None:
+    """Queues prediction documents for a batched write, or inserts them directly when write-behind is off."""
+    buffer = get_write_buffer()
+    if buffer is not None:
+        await buffer.add_many(collection, docs)
+    elif len(docs) == 1:
+        with stage_timer("mongo.insert_one"):
+            await get_db()[collection].insert_one(docs[0])
+    elif docs:
+        with stage_timer("mongo.insert_many"):
+            await get_db()[collection].insert_many(docs, ordered=False)
+
+
+async def store_document(collection: str, doc: Dict[str, Any]) -> None:
+    await store_documents(collection, [doc])
@@ -1,18 +1,42 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.admission import AdmissionControlMiddleware
 from app.core.config import get_settings
-from app.core.database import close_db
+from app.core.database import close_db, ensure_indexes
+from app.core.executors import shutdown_pools
+from app.core.metrics import MetricsMiddleware, SlowRequestProfiler
+from app.core.request_limits import RequestSizeLimitMiddleware
 from app.routes.crop_routes import router as crop_router
 from app.routes.pest_routes import router as pest_router
+from app.routes.pesticide_routes import router as pesticide_router
 from app.routes.nutrient_routes import router as nutrient_router
 from app.routes.disease_routes import router as disease_router
+from app.routes.scan_routes import router as scan_router
 from app.routes.chatbot_routes import router as chatbot_router
+from app.routes.notification_routes import router as notification_router
+from app.routes.history_routes import router as history_router
+from app.routes.system_routes import router as system_router
+from app.routes.metrics_routes import router as metrics_router
+from app.routes.model_routes import router as model_router
+from app.services.explanation_service import run_explanation_refresher
+from app.services.notification_service import run_notification_worker
+from app.services.warmup_service import is_ready, model_status, warm_up_models_async
+from app.utils.email_utils import get_smtp_pool
+from app.utils.ai_helpers import get_pest_batcher
 
 settings = get_settings()
 
 app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG)
 
+# Inside CORS so a 413 still carries the CORS headers
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=settings.MAX_REQUEST_BYTES)
+if settings.ADMISSION_ENABLED:
+    # Outside the size limit, so rate-limited clients are refused before any of the body is read
+    app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS or ["*"],
@@ -21,6 +45,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+profiler = None
+if settings.PROFILE_SLOW_REQUEST_MS:
+    profiler = SlowRequestProfiler(
+        threshold=settings.PROFILE_SLOW_REQUEST_MS / 1000,
+        interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        output_dir=settings.PROFILE_DIR,
+    )
+# Added last so it is outermost and also times CORS handling
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 @app.get("/health1")
 async def health_check():
     return {"status": "Running"}
@@ -32,14 +66,59 @@ async def health_check():
 @app.get("/health3")
 async def health_check():
     return {"status": "Running"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    ready = is_ready(settings.PRELOAD_MODELS)
+    body = {"ready": ready, "models": model_status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 # Routers
 app.include_router(crop_router)
 app.include_router(pest_router)
+app.include_router(pesticide_router)
 app.include_router(nutrient_router)
 app.include_router(disease_router)
+app.include_router(scan_router)
 app.include_router(chatbot_router)
+app.include_router(notification_router)
+app.include_router(history_router)
+app.include_router(system_router)
+app.include_router(metrics_router)
+app.include_router(model_router)
+
+
+_background_tasks: list[asyncio.Task] = []
+
+
+async def _ensure_indexes() -> None:
+    try:
+        await ensure_indexes()
+    except Exception:
+        # Mongo unreachable at startup; queries still work, just unindexed until the next start
+        pass
+
+
+@app.on_event("startup")
+async def startup_event():
+    _background_tasks.append(asyncio.create_task(_ensure_indexes()))
+    if settings.PRELOAD_MODELS:
+        _background_tasks.append(asyncio.create_task(warm_up_models_async(settings.PRELOAD_MODELS)))
+    if settings.EXPLANATION_PREWARM:
+        _background_tasks.append(asyncio.create_task(run_explanation_refresher()))
+    if get_smtp_pool() is not None:
+        _background_tasks.append(asyncio.create_task(run_notification_worker()))
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    get_pest_batcher().stop()
+    shutdown_pools()
+    smtp_pool = get_smtp_pool()
+    if smtp_pool is not None:
+        smtp_pool.close()
     await close_db()
@@ -0,0 +1,15 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+
+class ScanDocument(BaseModel):
+    id: Optional[str] = Field(default=None, alias="_id")
+    prediction: Dict[str, Any]
+    input: Dict[str, Any]
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
+    timestamp: datetime = Field(default_factory=datetime.now)
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
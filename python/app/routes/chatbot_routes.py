@@ -1,6 +1,10 @@
+import json
+
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
-from app.utils.ai_helpers import get_rules_data, get_gemini_model
+from app.core.executors import PoolSaturatedError
+from app.services.chatbot_service import answer, stream_answer
 
 router = APIRouter(prefix="", tags=["chatbot"])
 
@@ -13,23 +17,41 @@ async def chatbot_endpoint(req: Request):
         if not user_message:
             return {"reply": "Please provide a message."}
 
-        rules = get_rules_data()
-        model = get_gemini_model()
-        if model is None:
-            return {"reply": "Gemini API key not configured."}
-
-        prompt = (
-            "You are Agro, an AI assistant for the AI Crop Monitoring System.\n"
-            "Follow these rules:\n" + "\n".join(rules.get("rules", [])) + "\n\n"
-            "Respond in a friendly, human-like, conversational tone.\n"
-            "Use bullet points or numbered lists if listing features or steps.\n"
-            "Keep answers concise, 2-5 sentences max.\n"
-            "Do not repeat your name in every message.\n"
-            "If user asks for something outside your scope, politely tell them.\n\n"
-            f"User: {user_message}\nAgro:"
-        )
-
-        response = model.generate_content(prompt)
-        return {"reply": response.text.strip() if hasattr(response, "text") else ""}
+        return {"reply": await answer(user_message)}
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/chatbot/stream")
+async def chatbot_stream_endpoint(req: Request):
+    """Server-sent events: one ``data: {"delta": ...}`` per chunk, then ``data: [DONE]``."""
+    try:
+        body = await req.json()
+        user_message: str = body.get("message", "").strip()
+    except Exception as e:
+        # Malformed JSON, a body that is not an object, or a message that is not a string
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        if not user_message:
+            yield _sse({"delta": "Please provide a message."})
+        else:
+            try:
+                async for text in stream_answer(user_message):
+                    yield _sse({"delta": text})
+            except Exception as e:
+                yield _sse({"error": str(e)}, event="error")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
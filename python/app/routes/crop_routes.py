@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Header
+from typing import Any, Dict, List
 
-from app.schemas.crop_schema import CropRequest, CropResponse
+from fastapi import APIRouter, HTTPException, Header, UploadFile, File
+
+from app.core.config import get_settings
+from app.core.executors import INFERENCE, PoolSaturatedError, run_in_pool
+from app.schemas.crop_schema import CropRequest, CropResponse, CropBatchResponse
 from app.services.crop_service import predict_and_store as crop_predict
+from app.services.crop_service import predict_batch_and_store, rows_from_upload
 from app.utils.ai_helpers import get_crop_encoder, get_season_encoder
 
 router = APIRouter(prefix="", tags=["crop"])
@@ -20,5 +25,41 @@ async def predict_crop(request: CropRequest, user_id: str | None = Header(defaul
             "valid_crops": crops,
             "valid_seasons": seasons,
         })
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _check_batch_size(rows: List[Any]) -> None:
+    max_rows = get_settings().CROP_BATCH_MAX_ROWS
+    if len(rows) > max_rows:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(rows)} rows (max {max_rows})")
+
+
+@router.post("/predict_crop/batch", response_model=CropBatchResponse)
+async def predict_crop_batch(rows: List[Dict[str, Any]], user_id: str | None = Header(default=None)):
+    _check_batch_size(rows)
+    try:
+        return await predict_batch_and_store(rows, user_id=user_id)
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/predict_crop/batch/upload", response_model=CropBatchResponse)
+async def predict_crop_batch_upload(file: UploadFile = File(...), user_id: str | None = Header(default=None)):
+    try:
+        data = await file.read()
+        rows = await run_in_pool(INFERENCE, rows_from_upload, file.filename, data)
+        _check_batch_size(rows)
+        return await predict_batch_and_store(rows, user_id=user_id)
+    except HTTPException:
+        raise
+    except (ValueError, UnicodeDecodeError) as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Header
 
+from app.core.executors import PoolSaturatedError
+from app.core.metrics import stage_timer
 from app.schemas.disease_schema import DiseaseResponse
 from app.services.disease_service import predict_and_store as disease_predict
+from app.utils.image_preprocessing import ImageRejectedError
+from app.utils.uploads import read_image_upload
 
 router = APIRouter(prefix="", tags=["disease"])
 
@@ -9,12 +13,14 @@ router = APIRouter(prefix="", tags=["disease"])
 @router.post("/disease-prediction", response_model=DiseaseResponse)
 async def predict_disease(image: UploadFile = File(...), user_id: str | None = Header(default=None)):
     try:
-        if not image.filename.lower().endswith(("png", "jpg", "jpeg")):
-            raise HTTPException(status_code=400, detail="Invalid file type")
-        image_bytes = await image.read()
-        result = await disease_predict(image_bytes, user_id=user_id)
+        with stage_timer("upload.read"):
+            # Judged by content rather than file name; the model was trained on JPEG and PNG photos
+            upload = await read_image_upload(image, formats=("jpeg", "png"))
+        result = await disease_predict(upload.data, user_id=user_id, digest=upload.digest)
         return result
-    except HTTPException:
-        raise
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
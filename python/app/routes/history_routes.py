@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import List, Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from app.core.config import get_settings
+from app.schemas.history_schema import DeficiencyCount, HistoryPage, LabelFrequency
+from app.services.history_service import (
+    InvalidCursorError,
+    deficiency_counts,
+    label_frequency,
+    list_history,
+)
+
+router = APIRouter(prefix="", tags=["history"])
+settings = get_settings()
+
+Kind = Literal["crop", "pest", "disease", "nutrient", "scan"]
+Period = Literal["day", "week", "month"]
+
+
+def _require_user(user_id: str | None) -> str:
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id header is required")
+    return user_id
+
+
+@router.get("/history/{kind}", response_model=HistoryPage)
+async def history(
+    kind: Kind,
+    user_id: str | None = Header(default=None),
+    limit: int = Query(default=settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    detail: bool = False,
+):
+    user_id = _require_user(user_id)
+    try:
+        return await list_history(kind, user_id, limit, cursor, since, until, detail)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/history/{kind}/frequency", response_model=List[LabelFrequency])
+async def history_frequency(
+    kind: Literal["pest", "disease"],
+    user_id: str | None = Header(default=None),
+    period: Period = "week",
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    user_id = _require_user(user_id)
+    try:
+        return await label_frequency(kind, user_id, period, since, until)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/history/nutrient/deficiencies", response_model=List[DeficiencyCount])
+async def history_deficiencies(
+    user_id: str | None = Header(default=None),
+    period: Period = "month",
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    user_id = _require_user(user_id)
+    try:
+        return await deficiency_counts(user_id, period, since, until)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
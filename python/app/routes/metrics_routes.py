@@ -0,0 +1,116 @@
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.admission import get_admission_controller
+from app.core.config import get_settings
+from app.core.executors import pool_stats
+from app.core.metrics import Family, registry
+from app.core.write_behind import get_write_buffer
+from app.services.chatbot_service import chat_stats, get_answer_cache
+from app.services.crop_service import get_crop_prediction_cache
+from app.services.explanation_service import get_explanation_cache
+from app.services.warmup_service import READY, model_status
+from app.utils.ai_helpers import get_pest_batcher
+from app.utils.cache import get_prediction_cache
+from app.utils.memory_stats import process_memory
+
+router = APIRouter(prefix="", tags=["system"])
+
+
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterable[Tuple[str, float]]:
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", float(value)
+
+
+def _families(name: str, label: str, stats_by_label: Dict[str, Dict[str, Any]]) -> List[Family]:
+    """Turns ``{label value: stats dict}`` into one gauge family per numeric stat."""
+    families: Dict[str, Family] = {}
+    for label_value, stats in stats_by_label.items():
+        for key, value in _flatten(stats):
+            metric = f"app_{name}_{key}"
+            if metric not in families:
+                families[metric] = (metric, "gauge", f"{name} {key.replace('_', ' ')}.", [])
+            families[metric][3].append(({label: label_value}, value))
+    return list(families.values())
+
+
+def _collect_pools() -> List[Family]:
+    return _families("pool", "pool", pool_stats())
+
+
+def _collect_admission() -> List[Family]:
+    if not get_settings().ADMISSION_ENABLED:
+        return []
+    return _families("admission", "model", get_admission_controller().stats()["models"])
+
+
+def _collect_batchers() -> List[Family]:
+    return _families("batcher", "batcher", {"pest": get_pest_batcher().stats.snapshot()})
+
+
+def _collect_caches() -> List[Family]:
+    caches = {
+        "explanation": get_explanation_cache().stats(),
+        "chatbot_answer": get_answer_cache().stats(),
+    }
+    prediction = get_prediction_cache()
+    if prediction is not None:
+        caches["prediction"] = prediction.stats()
+    crop = get_crop_prediction_cache()
+    if crop is not None:
+        caches["crop_prediction"] = crop.stats()
+    return _families("cache", "cache", caches)
+
+
+def _collect_chatbot() -> List[Family]:
+    return _families("chatbot", "model", {"gemini": chat_stats.snapshot()})
+
+
+def _collect_persistence() -> List[Family]:
+    buffer = get_write_buffer()
+    return _families("write_behind", "buffer", {"prediction_documents": buffer.stats()}) if buffer else []
+
+
+def _collect_models() -> List[Family]:
+    status = model_status()
+    ready = ("app_model_ready", "gauge", "1 once the model is loaded and warmed up.", [])
+    seconds = ("app_model_load_seconds", "gauge", "Model startup time by phase.", [])
+    for model, state in status.items():
+        ready[3].append(({"model": model}, 1.0 if state["state"] == READY else 0.0))
+        for phase in ("import", "load", "warmup"):
+            if state.get(f"{phase}_ms") is not None:
+                seconds[3].append(({"model": model, "phase": phase}, state[f"{phase}_ms"] / 1000))
+    return [ready, seconds]
+
+
+def _collect_memory() -> List[Family]:
+    memory = process_memory(os.getpid())
+    family = ("app_process_memory_bytes", "gauge", "Memory of the worker serving this scrape.", [])
+    for kind in ("rss", "pss", "shared", "private"):
+        if f"{kind}_mb" in memory:
+            family[3].append(({"kind": kind}, memory[f"{kind}_mb"] * 1024 * 1024))
+    return [family]
+
+
+for _collector in (
+    _collect_pools,
+    _collect_admission,
+    _collect_batchers,
+    _collect_caches,
+    _collect_chatbot,
+    _collect_persistence,
+    _collect_models,
+    _collect_memory,
+):
+    registry.register_collector(_collector)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
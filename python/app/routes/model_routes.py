@@ -0,0 +1,54 @@
+import asyncio
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.core.config import get_settings
+from app.schemas.model_schema import ActivateRequest
+from app.utils.ai_helpers import get_model_registry
+from app.utils.model_registry import ModelVersionError
+
+router = APIRouter(prefix="/models", tags=["models"])
+
+# Registry calls run on threads of this process (not the IO pool, which may be a process pool):
+# they act on the models this process serves.
+
+
+def _check_admin(token: str | None) -> None:
+    expected = get_settings().MODEL_ADMIN_TOKEN
+    if not expected:
+        raise HTTPException(status_code=403, detail="Model administration is disabled; set MODEL_ADMIN_TOKEN to enable it")
+    if not hmac.compare_digest(token or "", expected):
+        raise HTTPException(status_code=403, detail="A valid X-Admin-Token header is required")
+
+
+@router.get("")
+async def model_versions_status():
+    return await asyncio.to_thread(get_model_registry().status)
+
+
+@router.get("/{name}/versions")
+async def list_model_versions(name: str):
+    try:
+        return await asyncio.to_thread(get_model_registry().versions, name)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.post("/{name}/activate", status_code=202)
+async def activate_model_version(name: str, body: ActivateRequest, x_admin_token: str | None = Header(default=None)):
+    """Starts loading ``version`` in the background; GET /models shows when it is serving."""
+    _check_admin(x_admin_token)
+    try:
+        return await asyncio.to_thread(get_model_registry().activate, name, body.version)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.post("/{name}/rollback", status_code=202)
+async def rollback_model_version(name: str, x_admin_token: str | None = Header(default=None)):
+    _check_admin(x_admin_token)
+    try:
+        return await asyncio.to_thread(get_model_registry().rollback, name)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
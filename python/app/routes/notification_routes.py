@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+
+from app.services.notification_service import get_notification
+
+router = APIRouter(prefix="", tags=["notifications"])
+
+
+@router.get("/notifications/{notification_id}")
+async def notification_status(notification_id: str):
+    try:
+        doc = await get_notification(notification_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    doc["id"] = doc.pop("_id")
+    return doc
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
 
+from app.core.executors import PoolSaturatedError
+from app.core.metrics import stage_timer
 from app.schemas.nutrient_schema import NutrientRequest, NutrientResponse
 from app.services.nutrient_service import predict_and_store as nutrient_predict
+from app.utils.image_preprocessing import ImageRejectedError
+from app.utils.uploads import read_image_upload
 
 router = APIRouter(prefix="", tags=["nutrient"])
 
@@ -14,8 +18,13 @@ async def predict_nutrient_deficiency(
     user_id: str | None = Header(default=None),
 ):
     try:
-        image_bytes = await image.read()
-        result = await nutrient_predict(image_bytes, mobile_number, email, user_id=user_id)
+        with stage_timer("upload.read"):
+            upload = await read_image_upload(image)
+        result = await nutrient_predict(upload.data, mobile_number, email, user_id=user_id, digest=upload.digest)
         return result
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
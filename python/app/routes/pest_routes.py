@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Header
 
+from app.core.executors import PoolSaturatedError
+from app.core.metrics import stage_timer
 from app.schemas.pest_schema import PestResponse
 from app.services.pest_service import predict_and_store as pest_predict
+from app.utils.image_preprocessing import ImageRejectedError
+from app.utils.uploads import read_image_upload
 
 router = APIRouter(prefix="", tags=["pest"])
 
@@ -9,8 +13,13 @@ router = APIRouter(prefix="", tags=["pest"])
 @router.post("/predict_pest", response_model=PestResponse)
 async def predict_pest(image: UploadFile = File(...), user_id: str | None = Header(default=None)):
     try:
-        image_bytes = await image.read()
-        result = await pest_predict(image_bytes, user_id=user_id)
+        with stage_timer("upload.read"):
+            upload = await read_image_upload(image)
+        result = await pest_predict(upload.data, user_id=user_id, digest=upload.digest)
         return result
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
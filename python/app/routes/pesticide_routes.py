@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Query
+
+from app.core.config import get_settings
+from app.schemas.pesticide_schema import PesticideMatch, PesticideSearchResponse
+from app.utils.pesticide_index import get_pesticide_index
+
+router = APIRouter(prefix="/pesticides", tags=["pest"])
+
+
+@router.get("/search", response_model=PesticideSearchResponse)
+async def search_pesticides(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(default=10, ge=1)):
+    limit = min(limit, get_settings().PESTICIDE_SEARCH_MAX_RESULTS)
+    matches = get_pesticide_index().search(q, limit=limit)
+    return PesticideSearchResponse(
+        query=q,
+        results=[
+            PesticideMatch(pest=m.name, pesticide=m.recommendation, match=m.match, score=m.score) for m in matches
+        ],
+    )
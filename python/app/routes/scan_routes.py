@@ -0,0 +1,33 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
+
+from app.core.executors import PoolSaturatedError
+from app.core.metrics import stage_timer
+from app.schemas.scan_schema import ScanResponse
+from app.services.scan_service import scan_and_store
+from app.utils.image_preprocessing import ImageRejectedError
+from app.utils.uploads import read_image_upload
+
+router = APIRouter(prefix="", tags=["scan"])
+
+
+@router.post("/scan", response_model=ScanResponse)
+async def scan_leaf(
+    image: UploadFile = File(...),
+    mobile_number: Optional[str] = Form(default=None),
+    email: Optional[str] = Form(default=None),
+    user_id: str | None = Header(default=None),
+):
+    """Pest, disease and nutrient analysis of one photo in a single request."""
+    try:
+        with stage_timer("upload.read"):
+            upload = await read_image_upload(image)
+        result = await scan_and_store(upload.data, mobile_number, email, user_id=user_id, digest=upload.digest)
+        return result
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi import APIRouter
+
+from app.core.admission import get_admission_controller
+from app.core.config import get_settings
+from app.core.executors import pool_stats
+from app.core.write_behind import get_write_buffer
+from app.services.chatbot_service import chat_stats, get_answer_cache
+from app.services.crop_service import get_crop_prediction_cache
+from app.services.explanation_service import get_explanation_cache
+from app.utils.ai_helpers import get_pest_batcher
+from app.utils.cache import get_prediction_cache
+from app.utils.memory_stats import worker_memory
+
+router = APIRouter(prefix="/stats", tags=["system"])
+
+
+@router.get("/batching")
+async def batching_stats():
+    batcher = get_pest_batcher()
+    return {
+        "pest": {
+            "max_batch_size": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait * 1000,
+            **batcher.stats.snapshot(),
+        }
+    }
+
+
+@router.get("/pools")
+async def executor_pool_stats():
+    return pool_stats()
+
+
+@router.get("/cache")
+async def cache_stats():
+    cache = get_prediction_cache()
+    return {"enabled": cache is not None, **(cache.stats() if cache else {})}
+
+
+@router.get("/crop_cache")
+async def crop_cache_stats():
+    cache = get_crop_prediction_cache()
+    return {"enabled": cache is not None, **(cache.stats() if cache else {})}
+
+
+@router.get("/explanations")
+async def explanation_stats():
+    return get_explanation_cache().stats()
+
+
+@router.get("/chatbot")
+async def chatbot_stats():
+    return {**chat_stats.snapshot(), "answer_cache": get_answer_cache().stats()}
+
+
+@router.get("/persistence")
+async def persistence_stats():
+    buffer = get_write_buffer()
+    return {"write_behind": buffer is not None, **(buffer.stats() if buffer else {})}
+
+
+@router.get("/admission")
+async def admission_stats():
+    if not get_settings().ADMISSION_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_admission_controller().stats()}
+
+
+@router.get("/workers")
+async def worker_stats():
+    # On a thread of this worker: with IO_POOL_KIND=process the IO pool would measure its own child
+    return await asyncio.to_thread(worker_memory)
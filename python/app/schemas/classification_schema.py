@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+
+class ClassProbability(BaseModel):
+    label: str
+    probability: float
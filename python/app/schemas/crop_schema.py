@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
 
 class CropRequest(BaseModel):
@@ -13,3 +14,17 @@ class CropRequest(BaseModel):
 class CropResponse(BaseModel):
     water_required: float
     days_until_harvest: float
+
+
+class CropBatchItem(BaseModel):
+    index: int
+    water_required: Optional[float] = None
+    days_until_harvest: Optional[float] = None
+    error: Optional[str] = None
+
+
+class CropBatchResponse(BaseModel):
+    count: int
+    succeeded: int
+    failed: int
+    results: List[CropBatchItem]
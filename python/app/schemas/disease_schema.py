@@ -1,7 +1,12 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+
+from app.schemas.classification_schema import ClassProbability
 
 
 class DiseaseResponse(BaseModel):
     disease: str
     explanation: Optional[str]
+    confidence: Optional[float] = None
+    confident: bool = True
+    top_k: List[ClassProbability] = []
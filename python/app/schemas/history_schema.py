@@ -0,0 +1,28 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class HistoryItem(BaseModel):
+    id: str
+    timestamp: datetime
+    prediction: Dict[str, Any]
+    input: Optional[Dict[str, Any]] = None
+
+
+class HistoryPage(BaseModel):
+    items: List[HistoryItem]
+    next_cursor: Optional[str]
+
+
+class LabelFrequency(BaseModel):
+    period: str
+    label: Optional[str]
+    count: int
+
+
+class DeficiencyCount(BaseModel):
+    period: str
+    analyses: int
+    deficient: int
+    regions: int
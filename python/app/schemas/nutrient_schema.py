@@ -13,3 +13,4 @@ class NutrientResponse(BaseModel):
     whatsapp_messages: List[str]
     whatsapp_url: Optional[str]
     email_sent_to: Optional[EmailStr]
+    notification_id: Optional[str] = None
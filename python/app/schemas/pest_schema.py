@@ -1,6 +1,12 @@
 from pydantic import BaseModel
+from typing import List, Optional
+
+from app.schemas.classification_schema import ClassProbability
 
 
 class PestResponse(BaseModel):
     pest: str
     pesticide: str
+    confidence: Optional[float] = None
+    confident: bool = True
+    top_k: List[ClassProbability] = []
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class PesticideMatch(BaseModel):
+    pest: str
+    pesticide: str
+    match: str
+    score: float
+
+
+class PesticideSearchResponse(BaseModel):
+    query: str
+    results: List[PesticideMatch]
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Dict, List
+
+from app.schemas.disease_schema import DiseaseResponse
+from app.schemas.nutrient_schema import NutrientResponse
+from app.schemas.pest_schema import PestResponse
+
+
+class ScanResponse(BaseModel):
+    pest: PestResponse
+    disease: DiseaseResponse
+    nutrient: NutrientResponse
+    cached: List[str]
+    timings_ms: Dict[str, float]
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+ANALYSES = ("pest", "disease", "nutrient")
+
+# Set once per worker process by _init_worker
+_worker_analyses: Tuple[str, ...] = ()
+
+
+# ---------------------- Sources ----------------------
+def _is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_images(source: str | Path, skip: Set[str] = frozenset()) -> Iterator[Tuple[str, bytes]]:
+    """Yields (name, bytes) for every image in a directory tree or tar file, in a stable order.
+
+    Tar files (optionally compressed) are read as a stream, so the archive is
+    never extracted or held in memory.
+    """
+    source = Path(source)
+    if source.is_dir():
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                path = Path(root) / filename
+                name = path.relative_to(source).as_posix()
+                if _is_image(name) and name not in skip:
+                    yield name, path.read_bytes()
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source, mode="r|*") as tar:
+            for member in tar:
+                if member.isfile() and _is_image(member.name) and member.name not in skip:
+                    f = tar.extractfile(member)
+                    if f is not None:
+                        yield member.name, f.read()
+    else:
+        raise ValueError(f"{source} is neither a directory nor a tar file")
+
+
+def _chunks(items: Iterator[Tuple[str, bytes]], size: int) -> Iterator[List[Tuple[str, bytes]]]:
+    chunk: List[Tuple[str, bytes]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------------------- Workers ----------------------
+def _init_worker(analyses: Sequence[str], threads: int) -> None:
+    """Pins the math libraries to ``threads`` threads and loads the models this run needs."""
+    global _worker_analyses
+    _worker_analyses = tuple(analyses)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+    from app.services.warmup_service import MODEL_FRAMEWORKS, warm_up_models
+    from app.utils.ai_helpers import import_framework
+
+    # Same import order as the server warm-up; torchvision crashes if it is first imported after tensorflow
+    for name in ANALYSES:
+        if name in analyses:
+            for module in MODEL_FRAMEWORKS[name]:
+                import_framework(module)
+    if "pest" in analyses:
+        import_framework("torch").set_num_threads(threads)
+    if "disease" in analyses:
+        tf = import_framework("tensorflow")
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        import_framework("cv2").setNumThreads(threads)
+
+    failed = {name: s["error"] for name, s in warm_up_models(analyses).items() if s["state"] != "ready"}
+    if failed:
+        raise RuntimeError(f"Could not load models: {failed}")
+
+
+def _predict_pest(inputs: List[Any]) -> List[Dict[str, Any]]:
+    from app.utils.ai_helpers import pest_predict_batch
+
+    return [{"pest": pest, "pesticide": pesticide} for pest, pesticide in pest_predict_batch(inputs)]
+
+
+def _predict_disease(inputs: List[Any]) -> List[Dict[str, Any]]:
+    import numpy as np
+
+    from app.utils.ai_helpers import DISEASE_CLASS_NAMES, disease_probabilities, format_disease_label
+
+    predicted = disease_probabilities(np.concatenate(inputs)).argmax(axis=1).tolist()
+    return [{"disease": format_disease_label(DISEASE_CLASS_NAMES[i])} for i in predicted]
+
+
+def _score_chunk(chunk: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """Scores a chunk of images in one worker; the CNNs see the chunk as one batch each."""
+    from app.core.config import get_settings
+    from app.services.nutrient_service import analyze_decoded
+    from app.utils.image_preprocessing import DISEASE_INPUT_SIZE, decode_image, disease_input, pest_input
+
+    analyses = _worker_analyses
+    if "nutrient" in analyses:
+        decode_args = {"max_pixels": get_settings().NUTRIENT_MAX_PIXELS}
+    else:
+        decode_args = {"min_size": (DISEASE_INPUT_SIZE, DISEASE_INPUT_SIZE)}
+    batches = {"pest": (pest_input, _predict_pest), "disease": (disease_input, _predict_disease)}
+    batched = [name for name in batches if name in analyses]
+
+    rows: List[Dict[str, Any]] = []
+    inputs: Dict[str, List[Any]] = {name: [] for name in batched}
+    decoded_rows: List[Dict[str, Any]] = []
+    for name, data in chunk:
+        started = time.perf_counter()
+        row: Dict[str, Any] = {"path": name, "error": None}
+        try:
+            decoded = decode_image(data, **decode_args)
+            row["width"], row["height"] = decoded.original_size
+            if "nutrient" in analyses:
+                regions, _ = analyze_decoded(decoded)
+                row["nutrient_region_count"] = len(regions)
+                row["nutrient_regions"] = json.dumps(regions)
+            prepared = {analysis: batches[analysis][0](decoded) for analysis in batched}
+            for analysis, value in prepared.items():
+                inputs[analysis].append(value)
+            decoded_rows.append(row)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["elapsed_ms"] = 1000 * (time.perf_counter() - started)
+        rows.append(row)
+
+    for analysis in batched:
+        if not decoded_rows:
+            break
+        started = time.perf_counter()
+        try:
+            for row, fields in zip(decoded_rows, batches[analysis][1](inputs[analysis])):
+                row.update(fields)
+        except Exception as e:
+            for row in decoded_rows:
+                row["error"] = f"{type(e).__name__}: {e}"
+        # Batch time is shared evenly between the images in it
+        share = 1000 * (time.perf_counter() - started) / len(decoded_rows)
+        for row in decoded_rows:
+            row["elapsed_ms"] += share
+    for row in rows:
+        row["elapsed_ms"] = round(row["elapsed_ms"], 3)
+    return rows
+
+
+# ---------------------- Output ----------------------
+class JSONLWriter:
+    """Appends one JSON object per line; the file is also the checkpoint.
+
+    Only rows scored without an error count as done, so a resumed run retries
+    the failures and appends a new row for each of them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._drop_partial_line()
+
+    def _drop_partial_line(self) -> None:
+        # An interrupted run can leave half a line; cut it so appended rows start on a fresh line
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def done(self) -> Set[str]:
+        done: Set[str] = set()
+        if not self.path.exists():
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    path = row["path"]
+                except (ValueError, KeyError):
+                    continue  # a line cut short by an interrupted run
+                if not row.get("error"):
+                    done.add(path)
+        return done
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def close(self) -> None:
+        pass
+
+
+class ParquetWriter:
+    """Writes a directory of Parquet part files; each part is renamed into place once complete.
+
+    A part is written once ``rows_per_part`` rows are buffered or
+    ``flush_seconds`` after the last one, so a killed run loses at most that
+    much work. As with JSONL, rows with an error do not count as done.
+    """
+
+    def __init__(self, path: Path, rows_per_part: int = 5000, flush_seconds: float = 60.0) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet output requires the 'pyarrow' package; use a .jsonl output instead")
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.flush_seconds = flush_seconds
+        self._buffer: List[Dict[str, Any]] = []
+        self._flushed_at = time.monotonic()
+
+    def done(self) -> Set[str]:
+        import pyarrow.parquet as pq
+
+        done: Set[str] = set()
+        for part in sorted(self.path.glob("part-*.parquet")):
+            table = pq.read_table(part, columns=["path", "error"])
+            done.update(path for path, error in zip(table.column("path").to_pylist(), table.column("error").to_pylist())
+                        if not error)
+        return done
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.rows_per_part or time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        columns = sorted({key for row in self._buffer for key in row})
+        table = pa.Table.from_pylist([{key: row.get(key) for key in columns} for row in self._buffer])
+        name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp = self.path / f".{name}.tmp"
+        pq.write_table(table, tmp)
+        tmp.rename(self.path / name)
+        self._buffer = []
+
+    def close(self) -> None:
+        self._flush()
+
+
+def open_writer(output: str | Path) -> JSONLWriter | ParquetWriter:
+    output = Path(output)
+    if output.suffix == ".jsonl":
+        return JSONLWriter(output)
+    if output.suffix == ".parquet" or output.is_dir():
+        return ParquetWriter(output)
+    raise ValueError("Output must be a .jsonl file or a .parquet directory")
+
+
+# ---------------------- Driver ----------------------
+def score_archive(
+    source: str | Path,
+    output: str | Path,
+    analyses: Sequence[str] = ANALYSES,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    chunk_size: int = 16,
+    resume: bool = False,
+    progress_seconds: float = 10.0,
+) -> Dict[str, Any]:
+    """Scores every image under ``source`` into ``output`` and returns throughput figures.
+
+    Each worker process loads its models once; the output doubles as the
+    checkpoint, so with ``resume`` images already scored without an error are
+    skipped. Buffered rows are written out even when the run is interrupted.
+    """
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        raise ValueError(f"Unknown analyses: {sorted(unknown)}")
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    threads_per_worker = threads_per_worker or max(1, cpus // workers)
+
+    writer = open_writer(output)
+    done = writer.done()
+    if done and not resume:
+        raise ValueError(f"{output} already holds {len(done)} results; pass resume to continue it")
+
+    scored = errors = first_rows = 0
+    first_result_at: Optional[float] = None
+    started = last_report = time.perf_counter()
+    try:
+        # spawn: the parent never loads the frameworks, and forking after TF/torch start is unsafe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(tuple(analyses), threads_per_worker),
+        ) as pool:
+            pending: Set[Future] = set()
+            chunks = _chunks(iter_images(source, skip=done), chunk_size)
+            exhausted = False
+            while pending or not exhausted:
+                # Keep a couple of chunks queued per worker so memory stays bounded
+                while not exhausted and len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        pending.add(pool.submit(_score_chunk, chunk))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if first_result_at is None:
+                    first_result_at = time.perf_counter()
+                    first_rows = sum(len(future.result()) for future in finished)
+                for future in finished:
+                    rows = future.result()
+                    writer.write(rows)
+                    scored += len(rows)
+                    errors += sum(1 for row in rows if row["error"])
+                now = time.perf_counter()
+                if progress_seconds and now - last_report >= progress_seconds:
+                    last_report = now
+                    print(f"scored {scored} images ({errors} errors), {scored / (now - started):.1f} images/sec",
+                          file=sys.stderr, flush=True)
+    finally:
+        writer.close()
+
+    finished_at = time.perf_counter()
+    elapsed = finished_at - started
+    # Throughput after the workers have loaded their models and returned a first chunk
+    steady = (scored - first_rows) / (finished_at - first_result_at) if first_result_at and scored > first_rows else None
+    return {
+        "scored": scored,
+        "errors": errors,
+        "skipped": len(done),
+        "seconds": round(elapsed, 3),
+        "startup_seconds": round(first_result_at - started, 3) if first_result_at else None,
+        "images_per_second": round(scored / elapsed, 2) if elapsed else 0.0,
+        "steady_images_per_second": round(steady, 2) if steady else None,
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+    }
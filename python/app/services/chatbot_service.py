@@ -0,0 +1,144 @@
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict
+
+from app.core.config import get_settings
+from app.core.executors import IO, run_in_pool
+from app.core.metrics import stage_timer
+from app.utils.ai_helpers import build_chatbot_prompt, get_gemini_model
+from app.utils.cache import LRUTTLCache
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+class ChatStats:
+    """Time-to-first-byte and tokens/sec for Gemini completions (tokens are whitespace-split words)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.completions = 0
+        self.streamed = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.total_ttfb = 0.0
+        self.max_ttfb = 0.0
+        self.total_tokens = 0
+        self.total_generation_time = 0.0
+
+    def record(self, ttfb: float, tokens: int, elapsed: float, streamed: bool) -> None:
+        with self._lock:
+            self.completions += 1
+            self.streamed += int(streamed)
+            self.total_ttfb += ttfb
+            self.max_ttfb = max(self.max_ttfb, ttfb)
+            self.total_tokens += tokens
+            self.total_generation_time += elapsed
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "completions": self.completions,
+                "streamed": self.streamed,
+                "cache_hits": self.cache_hits,
+                "errors": self.errors,
+                "avg_ttfb_ms": round(1000 * self.total_ttfb / self.completions, 3) if self.completions else 0.0,
+                "max_ttfb_ms": round(1000 * self.max_ttfb, 3),
+                "tokens_per_sec": (
+                    round(self.total_tokens / self.total_generation_time, 2) if self.total_generation_time else 0.0
+                ),
+            }
+
+
+chat_stats = ChatStats()
+
+
+@lru_cache
+def get_answer_cache() -> LRUTTLCache:
+    settings = get_settings()
+    return LRUTTLCache(
+        max_entries=settings.CHATBOT_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.CHATBOT_CACHE_TTL_SECONDS,
+    )
+
+
+def normalize_question(message: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", message.lower())).strip()
+
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+async def answer(user_message: str) -> str:
+    model = get_gemini_model()
+    if model is None:
+        return "Gemini API key not configured."
+
+    cache = get_answer_cache()
+    key = normalize_question(user_message)
+    cached = cache.get(key)
+    if cached is not None:
+        chat_stats.cache_hits += 1
+        return cached
+
+    started = time.perf_counter()
+    try:
+        with stage_timer("chatbot.gemini"):
+            response = await run_in_pool(IO, model.generate_content, build_chatbot_prompt(user_message))
+    except Exception:
+        chat_stats.errors += 1
+        raise
+    elapsed = time.perf_counter() - started
+    reply = response.text.strip() if hasattr(response, "text") else ""
+    # Without streaming the first byte arrives with the last one
+    chat_stats.record(elapsed, _count_tokens(reply), elapsed, streamed=False)
+    if reply:
+        cache.set(key, reply)
+    return reply
+
+
+async def stream_answer(user_message: str) -> AsyncIterator[str]:
+    """Yields reply text as Gemini produces it; cached answers are yielded in one piece."""
+    model = get_gemini_model()
+    if model is None:
+        yield "Gemini API key not configured."
+        return
+
+    cache = get_answer_cache()
+    key = normalize_question(user_message)
+    cached = cache.get(key)
+    if cached is not None:
+        chat_stats.cache_hits += 1
+        yield cached
+        return
+
+    started = time.perf_counter()
+    ttfb = None
+    parts: list[str] = []
+    skipped = False
+    try:
+        response = await model.generate_content_async(build_chatbot_prompt(user_message), stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except (AttributeError, ValueError):
+                # genai raises ValueError for a blocked or empty chunk; skip it rather than end the stream
+                skipped = True
+                continue
+            if not text:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            parts.append(text)
+            yield text
+    except Exception:
+        chat_stats.errors += 1
+        raise
+    elapsed = time.perf_counter() - started
+    reply = "".join(parts).strip()
+    chat_stats.record(ttfb if ttfb is not None else elapsed, _count_tokens(reply), elapsed, streamed=True)
+    if reply and not skipped:
+        cache.set(key, reply)
@@ -1,70 +1,211 @@
+import csv
+import io
 from datetime import datetime
-from typing import Dict, Any, Optional
-
-from app.core.database import get_db
-from app.utils.ai_helpers import (
-    get_water_model,
-    get_harvest_model,
-    get_crop_encoder,
-    get_season_encoder,
-)
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from pydantic import ValidationError
+
+from app.core.config import get_settings
+from app.core.executors import INFERENCE, run_in_pool
+from app.core.metrics import stage_timer
+from app.core.write_behind import store_document, store_documents
+from app.utils.ai_helpers import CropModels, get_model_registry
+from app.utils.cache import LRUTTLCache
 from app.schemas.crop_schema import CropRequest
 
 
-async def predict_and_store(request: CropRequest, user_id: Optional[str] = None) -> Dict[str, Any]:
-    crop_encoder = get_crop_encoder()
-    season_encoder = get_season_encoder()
-    water_model = get_water_model()
-    harvest_model = get_harvest_model()
-
-
-    def normalize_label(label: str, known: list[str]) -> str:
-        mapping = {k.lower(): k for k in known}
-        key = label.strip().lower()
-        if key not in mapping:
-            raise ValueError(f"Unknown label: {label}")
-        return mapping[key]
-
-    crop_label = normalize_label(request.crop, list(crop_encoder.classes_))
-    season_label = normalize_label(request.season, list(season_encoder.classes_))
-
-    crop_encoded = crop_encoder.transform([crop_label])[0]
-    season_encoded = season_encoder.transform([season_label])[0]
-
-    water_features = [[
-        crop_encoded,
-        season_encoded,
-        request.temperature,
-        request.humidity,
-        request.ph,
-        request.avg_water,
-    ]]
-    water_pred = float(water_model.predict(water_features)[0])
-
-    harvest_features = [[
-        crop_encoded,
-        season_encoded,
-        request.temperature,
-        request.humidity,
-        request.ph,
-        water_pred,
-    ]]
-    harvest_pred = float(harvest_model.predict(harvest_features)[0])
+READING_FIELDS = ("temperature", "humidity", "ph", "avg_water")
+
+
+@lru_cache
+def get_crop_prediction_cache() -> LRUTTLCache | None:
+    settings = get_settings()
+    if not settings.CROP_CACHE_ENABLED:
+        return None
+    return LRUTTLCache(
+        max_entries=settings.CROP_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.CROP_CACHE_TTL_SECONDS,
+    )
+
+
+def _quantize(value: float) -> float:
+    decimals = get_settings().CROP_INPUT_DECIMALS
+    return value if decimals is None else round(value, decimals)
+
+
+def encode_request(request: CropRequest, models: CropModels | None = None) -> tuple:
+    """Label codes plus quantized readings: the model input, and the memo key for it."""
+    models = models or get_model_registry().get("crop").assets
+    crop_code = models.crop_index.get(request.crop.strip().lower())
+    if crop_code is None:
+        raise ValueError(f"Unknown label: {request.crop}")
+    season_code = models.season_index.get(request.season.strip().lower())
+    if season_code is None:
+        raise ValueError(f"Unknown label: {request.season}")
+    readings = (request.temperature, request.humidity, request.ph, request.avg_water)
+    if not np.isfinite(readings).all():
+        # "nan" and "inf" pass validation; the regressors would predict garbage or raise for the whole batch
+        fields = [name for name, value in zip(READING_FIELDS, readings) if not np.isfinite(value)]
+        raise ValueError(f"Not a finite number: {', '.join(fields)}")
+    return (
+        crop_code,
+        season_code,
+        _quantize(request.temperature),
+        _quantize(request.humidity),
+        _quantize(request.ph),
+        _quantize(request.avg_water),
+    )
+
+
+def _predict_encoded(features: tuple) -> tuple[Dict[str, Any], str]:
+    """The prediction, and the version of the regressors that made it."""
+    # Both regressors from one version, even if a new one is swapped in meanwhile
+    loaded = get_model_registry().get("crop")
+    model_input = np.array([features], dtype=np.float64)
+    water_pred = float(loaded.assets.water_regressor.predict(model_input)[0])
+
+    # The harvest model takes the predicted water requirement in place of avg_water
+    model_input[0, 5] = water_pred
+    harvest_pred = float(loaded.assets.harvest_regressor.predict(model_input)[0])
 
     result = {
         "water_required": round(water_pred, 2),
         "days_until_harvest": round(harvest_pred, 0),
     }
+    return result, loaded.version
 
-    db = get_db()
-    try:
-        await db["crops"].insert_one({
-            "prediction": result,
-            "input": request.model_dump(),
-            "user_id": user_id,
-            "timestamp": datetime.now(),
-        })
-    except Exception:
-        pass
+
+def _predict(request: CropRequest) -> Dict[str, Any]:
+    return _predict_encoded(encode_request(request))[0]
+
+
+async def predict_and_store(request: CropRequest, user_id: Optional[str] = None) -> Dict[str, Any]:
+    cache = get_crop_prediction_cache()
+    # The version covers both regressors and both label encoders
+    loaded = get_model_registry().get("crop")
+    version = loaded.version
+    features = encode_request(request, loaded.assets)
+    result = cache.get((version, *features)) if cache is not None else None
+
+    if result is None:
+        with stage_timer("crop.inference"):
+            result, used = await run_in_pool(INFERENCE, _predict_encoded, features)
+            if used != version:
+                # Swapped in between: the label codes came from the previous version's encoders
+                loaded = get_model_registry().get("crop")
+                features = encode_request(request, loaded.assets)
+                result, used = await run_in_pool(INFERENCE, _predict_encoded, features)
+        # Cached and stored under the version that ran, so a rollback never serves another version's result
+        version = used
+        if cache is not None:
+            cache.set((version, *features), result)
+
+    await store_document("crops", {
+        "prediction": result,
+        "input": request.model_dump(),
+        "user_id": user_id,
+        "model_version": version,
+        "timestamp": datetime.now(),
+    })
 
     return result
+
+
+def _encode_rows(
+    rows: List[Any], models: CropModels | None = None
+) -> tuple[List[int], List[CropRequest], np.ndarray, Dict[int, str]]:
+    """Validates and label-encodes raw rows; returns the good rows as one feature matrix."""
+    positions: List[int] = []
+    requests: List[CropRequest] = []
+    errors: Dict[int, str] = {}
+    features = np.empty((len(rows), 6), dtype=np.float64)
+    for pos, row in enumerate(rows):
+        try:
+            request = row if isinstance(row, CropRequest) else CropRequest.model_validate(row)
+        except ValidationError as e:
+            errors[pos] = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()
+            )
+            continue
+        try:
+            features[len(positions)] = encode_request(request, models)
+        except ValueError as e:
+            errors[pos] = str(e)
+            continue
+        positions.append(pos)
+        requests.append(request)
+    return positions, requests, features[:len(positions)], errors
+
+
+def _predict_batch(rows: List[Any]) -> tuple[List[Dict[str, Any]], List[CropRequest], List[Dict[str, Any]], str]:
+    # Encoders and regressors of one version for the whole batch
+    loaded = get_model_registry().get("crop")
+    positions, requests, features, errors = _encode_rows(rows, loaded.assets)
+
+    water_preds = np.empty(0)
+    harvest_preds = np.empty(0)
+    if len(positions):
+        water_preds = loaded.assets.water_regressor.predict(features)
+        # The harvest model takes the predicted water requirement in place of avg_water
+        features[:, 5] = water_preds
+        harvest_preds = loaded.assets.harvest_regressor.predict(features)
+
+    items: List[Dict[str, Any]] = [{"index": pos, "error": msg} for pos, msg in errors.items()]
+    predictions: List[Dict[str, Any]] = []
+    for pos, water, harvest in zip(positions, water_preds.tolist(), harvest_preds.tolist()):
+        prediction = {
+            "water_required": round(water, 2),
+            "days_until_harvest": round(harvest, 0),
+        }
+        predictions.append(prediction)
+        items.append({"index": pos, **prediction})
+    items.sort(key=lambda item: item["index"])
+    return items, requests, predictions, loaded.version
+
+
+def rows_from_upload(filename: str, data: bytes) -> List[Dict[str, Any]]:
+    """Reads crop rows from a CSV file, or an Arrow IPC / Parquet file when pyarrow is installed."""
+    name = (filename or "").lower()
+    if name.endswith((".arrow", ".feather", ".ipc", ".parquet")):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Arrow/Parquet uploads require the 'pyarrow' package")
+        if name.endswith(".parquet"):
+            table = pq.read_table(io.BytesIO(data))
+        else:
+            table = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+        return table.to_pylist()
+    text = data.decode("utf-8-sig")
+    return [
+        {key.strip().lower(): value for key, value in row.items() if key}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+async def predict_batch_and_store(rows: List[Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    with stage_timer("crop.batch_inference"):
+        items, requests, predictions, version = await run_in_pool(INFERENCE, _predict_batch, rows)
+
+    if predictions:
+        now = datetime.now()
+        await store_documents("crops", [
+            {
+                "prediction": prediction,
+                "input": request.model_dump(),
+                "user_id": user_id,
+                "model_version": version,
+                "timestamp": now,
+            }
+            for request, prediction in zip(requests, predictions)
+        ])
+
+    return {
+        "count": len(items),
+        "succeeded": len(predictions),
+        "failed": len(items) - len(predictions),
+        "results": items,
+    }
@@ -1,21 +1,58 @@
 from datetime import datetime
 from typing import Dict, Any, Optional
 
-from app.core.database import get_db
-from app.utils.ai_helpers import disease_predict_from_bytes, gemini_explain_disease
+from app.core.config import get_settings
+from app.core.executors import IMAGE, INFERENCE, run_in_pool
+from app.core.metrics import SHORT_CIRCUITS, stage_timer
+from app.core.write_behind import store_document
+from app.services.explanation_service import explain_disease
+from app.utils.ai_helpers import (
+    disease_classify_from_array,
+    disease_preprocess,
+    get_model_version,
+)
+from app.utils.cache import get_prediction_cache
+from app.utils.image_gate import ImageGateError
 
 
-async def predict_and_store(image: bytes, user_id: Optional[str] = None) -> Dict[str, Any]:
-    disease = disease_predict_from_bytes(image)
-    explanation = gemini_explain_disease(disease)
+async def predict_and_store(
+    image: bytes | memoryview, user_id: Optional[str] = None, digest: Optional[str] = None
+) -> Dict[str, Any]:
+    cache = get_prediction_cache()
+    version = get_model_version("disease")
+    # "disease:v2" results carry the top-k probabilities
+    cache_key = cache.key("disease:v2", version, image, digest) if cache else None
+    classified = await cache.get(cache_key) if cache else None
 
-    result = {"disease": disease, "explanation": explanation}
+    if classified is None:
+        try:
+            with stage_timer("disease.preprocess"):
+                opencv_image = await run_in_pool(IMAGE, disease_preprocess, image, True)
+        except ImageGateError as e:
+            SHORT_CIRCUITS.inc(model="disease", reason=e.reason)
+            raise
+        with stage_timer("disease.inference"):
+            classified = await run_in_pool(INFERENCE, disease_classify_from_array, opencv_image)
+        # The version that ran, which differs if a new one was swapped in meanwhile
+        version = classified.pop("model_version")
+        if cache:
+            await cache.set(cache.key("disease:v2", version, image, digest), classified)
 
-    db = get_db()
-    await db["diseases"].insert_one({
+    result = {**classified, "explanation": None}
+    result["confident"] = classified["confidence"] >= get_settings().DISEASE_MIN_CONFIDENCE
+    if not result["confident"]:
+        # An uncertain label is neither explained nor recorded
+        SHORT_CIRCUITS.inc(model="disease", reason="low_confidence")
+        return result
+
+    with stage_timer("disease.explanation"):
+        result["explanation"] = await explain_disease(classified["disease"])
+
+    await store_document("diseases", {
         "prediction": result,
         "input": {"file": "image"},
         "user_id": user_id,
+        "model_version": version,
         "timestamp": datetime.now(),
     })
 
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.database import get_db
+from app.core.executors import IO, run_in_pool
+from app.core.metrics import stage_timer
+from app.utils.ai_helpers import disease_labels, gemini_explain_disease, get_gemini_model
+
+NOT_CONFIGURED = "Gemini API key not configured."
+NO_RESPONSE = "No response"
+
+
+class ExplanationCache:
+    """Gemini disease explanations, kept in memory and in the ``disease_explanations`` collection.
+
+    A stale entry is still served while a background task refreshes it, and
+    concurrent misses for the same disease share one in-flight Gemini call.
+    """
+
+    collection = "disease_explanations"
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+        self.llm_errors = 0
+        self.coalesced = 0
+
+    def _is_fresh(self, generated_at: float) -> bool:
+        return time.time() - generated_at < self.ttl_seconds
+
+    async def _load(self, disease: str) -> Optional[Tuple[str, float]]:
+        entry = self._entries.get(disease)
+        if entry is not None:
+            return entry
+        try:
+            doc = await get_db()[self.collection].find_one({"_id": disease})
+        except Exception:
+            return None
+        # Placeholders stored before they were excluded from caching are not explanations
+        if not doc or doc["explanation"] in (NOT_CONFIGURED, NO_RESPONSE):
+            return None
+        entry = (doc["explanation"], doc["generated_at"].timestamp())
+        self._entries[disease] = entry
+        return entry
+
+    async def _generate(self, disease: str) -> str:
+        self.llm_calls += 1
+        try:
+            with stage_timer("explanation.gemini"):
+                explanation = await run_in_pool(IO, gemini_explain_disease, disease)
+        except Exception:
+            self.llm_errors += 1
+            raise
+        if explanation is None:
+            # Not cached, so the next request asks Gemini again
+            self.llm_errors += 1
+            return NO_RESPONSE if get_gemini_model() is not None else NOT_CONFIGURED
+        now = datetime.now()
+        self._entries[disease] = (explanation, now.timestamp())
+        try:
+            await get_db()[self.collection].replace_one(
+                {"_id": disease},
+                {"explanation": explanation, "generated_at": now},
+                upsert=True,
+            )
+        except Exception:
+            pass
+        return explanation
+
+    def _refresh(self, disease: str) -> asyncio.Task:
+        task = self._inflight.get(disease)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.create_task(self._generate(disease))
+        self._inflight[disease] = task
+        task.add_done_callback(lambda t: self._finish(disease, t))
+        return task
+
+    def _finish(self, disease: str, task: asyncio.Task) -> None:
+        if self._inflight.get(disease) is task:
+            del self._inflight[disease]
+        if not task.cancelled():
+            # Background refreshes have no awaiter; mark the exception as retrieved
+            task.exception()
+
+    async def get(self, disease: str) -> str:
+        if get_gemini_model() is None:
+            return NOT_CONFIGURED
+
+        entry = await self._load(disease)
+        if entry is not None:
+            explanation, generated_at = entry
+            if self._is_fresh(generated_at):
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh(disease)
+            return explanation
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(disease))
+
+    async def warm(self, refresh_stale: bool = True) -> None:
+        """Makes sure every disease label has an explanation, regenerating stale ones."""
+        if get_gemini_model() is None:
+            return
+        tasks = []
+        for disease in disease_labels():
+            entry = await self._load(disease)
+            if entry is None or (refresh_stale and not self._is_fresh(entry[1])):
+                tasks.append(self._refresh(disease))
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "llm_calls": self.llm_calls,
+            "llm_errors": self.llm_errors,
+            "inflight": len(self._inflight),
+        }
+
+
+@lru_cache
+def get_explanation_cache() -> ExplanationCache:
+    return ExplanationCache(ttl_seconds=get_settings().EXPLANATION_TTL_SECONDS)
+
+
+async def explain_disease(disease: str) -> str:
+    return await get_explanation_cache().get(disease)
+
+
+async def run_explanation_refresher() -> None:
+    """Pre-warms explanations at startup and keeps regenerating them before they go stale."""
+    settings = get_settings()
+    cache = get_explanation_cache()
+    while True:
+        try:
+            await cache.warm()
+        except Exception:
+            pass
+        await asyncio.sleep(settings.EXPLANATION_REFRESH_INTERVAL_SECONDS)
@@ -0,0 +1,167 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+
+from app.core.database import get_db
+
+# History kind -> collection
+COLLECTIONS: Dict[str, str] = {
+    "crop": "crops",
+    "pest": "pests",
+    "disease": "diseases",
+    "nutrient": "nutrients",
+    "scan": "scans",
+}
+
+# Fields a history page returns per kind; detail=True returns the whole prediction and input
+SUMMARY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "crop": ("prediction", "input"),
+    "pest": ("prediction.pest", "prediction.pesticide"),
+    "disease": ("prediction.disease",),
+    "nutrient": ("prediction.medium_red_region_count", "prediction.email_sent_to"),
+    "scan": (
+        "prediction.pest.pest",
+        "prediction.disease.disease",
+        "prediction.nutrient.medium_red_region_count",
+    ),
+}
+
+# $dateToString formats for the aggregation buckets; weeks are ISO weeks
+PERIOD_FORMATS: Dict[str, str] = {
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m",
+}
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque keyset cursor for the position just after ``doc``."""
+    raw = json_util.dumps([doc["timestamp"], doc["_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, doc_id = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(timestamp, datetime):
+        raise InvalidCursorError("Invalid cursor")
+    # json_util returns aware datetimes; stored timestamps are naive
+    return timestamp.replace(tzinfo=None), doc_id
+
+
+def _time_range(since: Optional[datetime], until: Optional[datetime]) -> Dict[str, Any]:
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = since
+    if until is not None:
+        bounds["$lt"] = until
+    return {"timestamp": bounds} if bounds else {}
+
+
+async def list_history(
+    kind: str,
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    detail: bool = False,
+) -> Dict[str, Any]:
+    """One page of a user's predictions, newest first.
+
+    Pages are keyed on (timestamp, _id) rather than skipped over, so each page
+    is a bounded walk of the (user_id, timestamp, _id) index however deep it is.
+    """
+    query: Dict[str, Any] = {"user_id": user_id, **_time_range(since, until)}
+    if cursor:
+        timestamp, doc_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": doc_id}},
+        ]
+
+    fields = ("prediction", "input") if detail else SUMMARY_FIELDS[kind]
+    projection = {"timestamp": 1, **{field: 1 for field in fields}}
+    docs = await (
+        get_db()[COLLECTIONS[kind]]
+        .find(query, projection)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    items = [
+        {
+            "id": str(doc["_id"]),
+            "timestamp": doc["timestamp"],
+            "prediction": doc.get("prediction", {}),
+            "input": doc.get("input"),
+        }
+        for doc in docs[:limit]
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def _aggregate(collection: str, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await get_db()[collection].aggregate(pipeline).to_list(length=None)
+
+
+def _match(user_id: str, since: Optional[datetime], until: Optional[datetime]) -> Dict[str, Any]:
+    return {"$match": {"user_id": user_id, **_time_range(since, until)}}
+
+
+def _period(period: str) -> Dict[str, Any]:
+    return {"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$timestamp"}}
+
+
+async def label_frequency(
+    kind: str,
+    user_id: str,
+    period: str = "week",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Predictions per period and predicted label, for the "pest" and "disease" kinds."""
+    pipeline = [
+        _match(user_id, since, until),
+        {"$project": {"_id": 0, "timestamp": 1, "label": f"$prediction.{kind}"}},
+        {"$group": {"_id": {"period": _period(period), "label": "$label"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "period": "$_id.period", "label": "$_id.label", "count": 1}},
+        {"$sort": {"period": 1, "count": -1, "label": 1}},
+    ]
+    return await _aggregate(COLLECTIONS[kind], pipeline)
+
+
+async def deficiency_counts(
+    user_id: str,
+    period: str = "month",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Nutrient analyses per period, how many found deficient regions, and the region total."""
+    pipeline = [
+        _match(user_id, since, until),
+        {"$project": {"_id": 0, "timestamp": 1, "regions": "$prediction.medium_red_region_count"}},
+        {
+            "$group": {
+                "_id": _period(period),
+                "analyses": {"$sum": 1},
+                "deficient": {"$sum": {"$cond": [{"$gt": ["$regions", 0]}, 1, 0]}},
+                "regions": {"$sum": "$regions"},
+            }
+        },
+        {"$project": {"_id": 0, "period": "$_id", "analyses": 1, "deficient": 1, "regions": 1}},
+        {"$sort": {"period": 1}},
+    ]
+    return await _aggregate(COLLECTIONS["nutrient"], pipeline)
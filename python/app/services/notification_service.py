@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import get_settings
+from app.core.database import get_db
+from app.core.executors import IO, run_in_pool
+from app.core.metrics import stage_timer
+from app.utils.email_utils import build_message, get_smtp_pool
+
+COLLECTION = "notifications"
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+def _dedupe_key(to_email: str, subject: str, body: str) -> str:
+    return hashlib.sha256(f"{to_email.strip().lower()}\0{subject}\0{body}".encode()).hexdigest()
+
+
+async def enqueue_email(to_email: str, subject: str, body: str) -> str:
+    """Stores an email in the outbox and returns its notification id.
+
+    An identical alert (same recipient, subject and body) that is still queued
+    or was sent within the dedupe window is not queued again; its id is
+    returned instead.
+
+    The newest alert for a key holds it in ``dedupe_slot``, which has a
+    unique index, so concurrent identical alerts cannot both be queued. A
+    holder that failed or fell out of the window gives the slot up to the
+    next alert.
+    """
+    settings = get_settings()
+    db = get_db()
+    now = datetime.now()
+    cutoff = now - timedelta(seconds=settings.NOTIFY_DEDUPE_WINDOW_SECONDS)
+    dedupe_key = _dedupe_key(to_email, subject, body)
+
+    notification_id = uuid.uuid4().hex
+    doc = {
+        "_id": notification_id,
+        "channel": "email",
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "dedupe_key": dedupe_key,
+        "dedupe_slot": dedupe_key,
+        "status": QUEUED,
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+        "next_attempt_at": now,
+    }
+    while True:
+        try:
+            await db[COLLECTION].insert_one(doc)
+            break
+        except DuplicateKeyError:
+            pass
+        holder = await db[COLLECTION].find_one({"dedupe_slot": dedupe_key}, {"_id": 1, "status": 1, "created_at": 1})
+        if holder is None:
+            continue  # released since the insert failed
+        if holder["status"] in (QUEUED, SENDING, SENT) and holder["created_at"] >= cutoff:
+            return holder["_id"]
+        # Stale holder; a no-op if a concurrent enqueue already released it
+        await db[COLLECTION].update_one({"_id": holder["_id"], "dedupe_slot": dedupe_key}, {"$unset": {"dedupe_slot": ""}})
+    _get_wakeup().set()
+    return notification_id
+
+
+async def get_notification(notification_id: str) -> Optional[Dict[str, Any]]:
+    return await get_db()[COLLECTION].find_one(
+        {"_id": notification_id},
+        {"_id": 1, "channel": 1, "to": 1, "status": 1, "attempts": 1, "last_error": 1, "created_at": 1, "updated_at": 1},
+    )
+
+
+async def _claim_batch(batch_size: int, lease_seconds: float) -> List[Dict[str, Any]]:
+    """Atomically marks due notifications as ``sending`` so concurrent workers never share one."""
+    db = get_db()
+    now = datetime.now()
+    claimed = []
+    for _ in range(batch_size):
+        doc = await db[COLLECTION].find_one_and_update(
+            {
+                "$or": [
+                    {"status": QUEUED, "next_attempt_at": {"$lte": now}},
+                    # Claims left behind by a worker that died mid-send
+                    {"status": SENDING, "updated_at": {"$lte": now - timedelta(seconds=lease_seconds)}},
+                ]
+            },
+            {"$set": {"status": SENDING, "updated_at": now}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            break
+        claimed.append(doc)
+    return claimed
+
+
+def _send(docs: List[Dict[str, Any]]) -> List[Optional[str]]:
+    pool = get_smtp_pool()
+    if pool is None:
+        return ["SMTP not configured"] * len(docs)
+    sender = get_settings().SMTP_FROM
+    return pool.send_batch([build_message(d["subject"], d["body"], d["to"], sender) for d in docs])
+
+
+async def _process_batch(docs: List[Dict[str, Any]]) -> None:
+    settings = get_settings()
+    db = get_db()
+    with stage_timer("smtp.send"):
+        errors = await run_in_pool(IO, _send, docs)
+    now = datetime.now()
+    for doc, error in zip(docs, errors):
+        attempts = doc.get("attempts", 0) + 1
+        if error is None:
+            update = {"status": SENT, "attempts": attempts, "last_error": None, "updated_at": now}
+        elif attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+            update = {"status": FAILED, "attempts": attempts, "last_error": error, "updated_at": now}
+        else:
+            backoff = settings.NOTIFY_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            update = {
+                "status": QUEUED,
+                "attempts": attempts,
+                "last_error": error,
+                "updated_at": now,
+                "next_attempt_at": now + timedelta(seconds=backoff),
+            }
+        await db[COLLECTION].update_one({"_id": doc["_id"]}, {"$set": update})
+
+
+async def run_notification_worker() -> None:
+    """Drains the outbox in batches; wakes on new notifications or every poll interval for retries."""
+    settings = get_settings()
+    wakeup = _get_wakeup()
+    while True:
+        wakeup.clear()
+        try:
+            docs = await _claim_batch(settings.NOTIFY_BATCH_SIZE, settings.NOTIFY_LEASE_SECONDS)
+            if docs:
+                await _process_batch(docs)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=settings.NOTIFY_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -1,49 +1,34 @@
+import logging
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
-import io
-import numpy as np
-from PIL import Image
-from scipy import ndimage
-
-from app.core.database import get_db
-from app.utils.email_utils import send_email
+from app.core.config import get_settings
+from app.core.executors import INFERENCE, run_in_pool
+from app.core.metrics import stage_timer
+from app.core.write_behind import store_document
+from app.services.notification_service import enqueue_email
+from app.utils.cache import get_prediction_cache
+from app.utils.email_utils import get_smtp_pool
+from app.utils.image_preprocessing import DecodedImage, decode_image
+from app.utils.nutrient_analyzer import find_regions
 from app.utils.whatsapp_utils import build_whatsapp_link
 
+logger = logging.getLogger(__name__)
 
-async def predict_and_store(image_bytes: bytes, mobile_number: str, email: str, user_id: str | None = None) -> Dict[str, Any]:
-    # Load image and convert to grayscale
-    input_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img_array = np.array(input_image)
-
-    if len(img_array.shape) == 3:
-        img_gray = img_array.mean(axis=2)
-    else:
-        img_gray = img_array
-
-    # Normalize to 0-1
-    img_norm = (img_gray - img_gray.min()) / (img_gray.max() - img_gray.min() + 1e-8)
+# Bump when the analysis below changes so cached results are not reused
+ANALYZER_VERSION = "3"
 
-    # Medium-intensity range to indicate possible deficiency
-    medium_red_min = 0.75
-    medium_red_max = 0.9
-    mask = (img_norm >= medium_red_min) & (img_norm <= medium_red_max)
 
-    # Label connected regions
-    labeled, _ = ndimage.label(mask)
-    slices = ndimage.find_objects(labeled) or []
+def analyze_decoded(decoded: DecodedImage) -> Tuple[List[Dict[str, int]], List[str]]:
+    settings = get_settings()
+    regions = find_regions(
+        decoded,
+        min_region_pixels=settings.NUTRIENT_MIN_REGION_PIXELS,
+        tile_rows=settings.NUTRIENT_TILE_ROWS,
+    )
 
-    regions: List[Dict[str, int]] = []
     messages: List[str] = []
-    for idx, sl in enumerate(slices, 1):
-        y, x = sl
-        box = {
-            "x_start": int(x.start),
-            "x_stop": int(x.stop),
-            "y_start": int(y.start),
-            "y_stop": int(y.stop),
-        }
-        regions.append(box)
+    for idx, box in enumerate(regions, 1):
         msg = (
             f"Region {idx}: Possible nutrient deficiency detected in area "
             f"({box['x_start']},{box['y_start']}) to ({box['x_stop']},{box['y_stop']}). "
@@ -51,31 +36,80 @@ async def predict_and_store(image_bytes: bytes, mobile_number: str, email: str,
         )
         messages.append(msg)
 
-    message_text = "\n".join(messages) if messages else "No significant deficiency regions detected."
-    whatsapp_url = build_whatsapp_link(mobile_number, message_text) if messages else None
-
-    email_error = None
-    if email:
-        email_error = send_email(
-            subject="Crop Nutrient Deficiency Alert",
-            body=message_text,
-            to_email=email,
-        )
+    return regions, messages
+
+
+def _analyze(image_bytes: bytes | memoryview) -> Tuple[List[Dict[str, int]], List[str]]:
+    return analyze_decoded(decode_image(image_bytes, max_pixels=get_settings().NUTRIENT_MAX_PIXELS))
+
+
+def analyzer_version() -> str:
+    settings = get_settings()
+    return f"{ANALYZER_VERSION}-{settings.NUTRIENT_MAX_PIXELS}-{settings.NUTRIENT_MIN_REGION_PIXELS}"
 
-    result = {
-        "medium_red_region_count": len(regions),
-        "regions": regions,
-        "whatsapp_messages": messages,
-        "whatsapp_url": whatsapp_url,
-        "email_sent_to": None if email_error else email,
-    }
 
-    db = get_db()
-    await db["nutrients"].insert_one({
+async def predict_and_store(
+    image_bytes: bytes | memoryview,
+    mobile_number: str,
+    email: str,
+    user_id: str | None = None,
+    digest: str | None = None,
+) -> Dict[str, Any]:
+    cache = get_prediction_cache()
+    version = analyzer_version()
+    cache_key = cache.key("nutrient", version, image_bytes, digest) if cache else None
+    cached = await cache.get(cache_key) if cache else None
+
+    if cached is None:
+        with stage_timer("nutrient.analyze"):
+            regions, messages = await run_in_pool(INFERENCE, _analyze, image_bytes)
+        if cache:
+            await cache.set(cache_key, {"regions": regions, "messages": messages})
+    else:
+        regions, messages = cached["regions"], cached["messages"]
+
+    result = await build_report(regions, messages, mobile_number, email)
+
+    await store_document("nutrients", {
         "prediction": result,
         "input": {"mobile_number": mobile_number, "email": email},
         "user_id": user_id,
+        "model_version": version,
         "timestamp": datetime.now(),
     })
 
     return result
+
+
+async def build_report(
+    regions: List[Dict[str, int]],
+    messages: List[str],
+    mobile_number: Optional[str],
+    email: Optional[str],
+) -> Dict[str, Any]:
+    """Builds the nutrient response and queues the email alert, if any."""
+    message_text = "\n".join(messages) if messages else "No significant deficiency regions detected."
+    whatsapp_url = build_whatsapp_link(mobile_number, message_text) if messages and mobile_number else None
+
+    # The alert is sent by the notification worker; poll /notifications/{id} for delivery status
+    notification_id = None
+    if email and get_smtp_pool() is not None:
+        try:
+            with stage_timer("nutrient.enqueue_email"):
+                notification_id = await enqueue_email(
+                    to_email=email,
+                    subject="Crop Nutrient Deficiency Alert",
+                    body=message_text,
+                )
+        except Exception:
+            # The analysis is still returned; as before the outbox, a failed alert only clears email_sent_to
+            logger.exception("Could not queue the nutrient alert email")
+
+    return {
+        "medium_red_region_count": len(regions),
+        "regions": regions,
+        "whatsapp_messages": messages,
+        "whatsapp_url": whatsapp_url,
+        "email_sent_to": email if notification_id else None,
+        "notification_id": notification_id,
+    }
@@ -1,20 +1,49 @@
 from datetime import datetime
 from typing import Dict, Any, Optional
 
-from app.core.database import get_db
-from app.utils.ai_helpers import pest_predict_from_bytes
+from app.core.config import get_settings
+from app.core.executors import IMAGE, run_in_pool
+from app.core.metrics import SHORT_CIRCUITS, stage_timer
+from app.core.write_behind import store_document
+from app.utils.ai_helpers import get_model_version, get_pest_batcher, pest_preprocess
+from app.utils.cache import get_prediction_cache
+from app.utils.image_gate import ImageGateError
 
 
-async def predict_and_store(image_bytes: bytes, user_id: Optional[str] = None) -> Dict[str, Any]:
-    pest, pesticide = pest_predict_from_bytes(image_bytes)
+async def predict_and_store(
+    image_bytes: bytes | memoryview, user_id: Optional[str] = None, digest: Optional[str] = None
+) -> Dict[str, Any]:
+    cache = get_prediction_cache()
+    version = get_model_version("pest")
+    # "pest:v2" results carry the top-k probabilities
+    cache_key = cache.key("pest:v2", version, image_bytes, digest) if cache else None
+    result = await cache.get(cache_key) if cache else None
 
-    result = {"pest": pest, "pesticide": pesticide}
+    if result is None:
+        try:
+            with stage_timer("pest.preprocess"):
+                pixels = await run_in_pool(IMAGE, pest_preprocess, image_bytes, True)
+        except ImageGateError as e:
+            SHORT_CIRCUITS.inc(model="pest", reason=e.reason)
+            raise
+        with stage_timer("pest.inference"):
+            result = await get_pest_batcher().submit(pixels)
+        # The version that ran, which differs if a new one was swapped in meanwhile
+        version = result.pop("model_version")
+        if cache:
+            await cache.set(cache.key("pest:v2", version, image_bytes, digest), result)
 
-    db = get_db()
-    await db["pests"].insert_one({
+    # Judged on every request, so a changed threshold applies to cached results too
+    result = {**result, "confident": result["confidence"] >= get_settings().PEST_MIN_CONFIDENCE}
+    if not result["confident"]:
+        SHORT_CIRCUITS.inc(model="pest", reason="low_confidence")
+        return result
+
+    await store_document("pests", {
         "prediction": result,
         "input": {"file": "image"},
         "user_id": user_id,
+        "model_version": version,
         "timestamp": datetime.now(),
     })
 
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.executors import IMAGE, INFERENCE, run_in_pool
+from app.core.metrics import SHORT_CIRCUITS, STAGE_SECONDS
+from app.core.write_behind import store_document
+from app.services.explanation_service import explain_disease
+from app.services.nutrient_service import analyze_decoded, analyzer_version, build_report
+from app.utils.ai_helpers import disease_classify_from_array, get_model_version, get_pest_batcher
+from app.utils.cache import PredictionCache, get_prediction_cache
+from app.utils.image_gate import ImageGateError, screen_image
+from app.utils.image_preprocessing import (
+    DISEASE_INPUT_SIZE,
+    DecodedImage,
+    decode_image,
+    disease_input,
+    pest_input,
+)
+
+
+async def _timed(timings: Dict[str, float], stage: str, work: Awaitable[Any]) -> Any:
+    started = time.perf_counter()
+    try:
+        return await work
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(1000 * elapsed, 3)
+        STAGE_SECONDS.observe(elapsed, stage=f"scan.{stage}")
+
+
+async def _pest(decoded: DecodedImage) -> Dict[str, Any]:
+    pixels = await run_in_pool(IMAGE, pest_input, decoded)
+    return await get_pest_batcher().submit(pixels)
+
+
+async def _disease(decoded: DecodedImage) -> Dict[str, Any]:
+    opencv_image = await run_in_pool(IMAGE, disease_input, decoded)
+    return await run_in_pool(INFERENCE, disease_classify_from_array, opencv_image)
+
+
+async def _nutrient(decoded: DecodedImage) -> Dict[str, Any]:
+    regions, messages = await run_in_pool(INFERENCE, analyze_decoded, decoded)
+    return {"regions": regions, "messages": messages}
+
+
+ANALYSES = {
+    "pest": _pest,
+    "disease": _disease,
+    "nutrient": _nutrient,
+}
+
+
+def _model_versions() -> Dict[str, str]:
+    return {
+        "pest": get_model_version("pest"),
+        "disease": get_model_version("disease"),
+        "nutrient": analyzer_version(),
+    }
+
+
+def _cache_keys(
+    cache: PredictionCache, image_bytes: bytes | memoryview, digest: str | None, versions: Dict[str, str]
+) -> Dict[str, str]:
+    # Same keys as the single-analysis endpoints, so either path can reuse the other's results
+    digest = digest or hashlib.sha256(image_bytes).hexdigest()
+    return {
+        "pest": cache.key("pest:v2", versions["pest"], image_bytes, digest),
+        "disease": cache.key("disease:v2", versions["disease"], image_bytes, digest),
+        "nutrient": cache.key("nutrient", versions["nutrient"], image_bytes, digest),
+    }
+
+
+async def scan_and_store(
+    image_bytes: bytes | memoryview,
+    mobile_number: Optional[str] = None,
+    email: Optional[str] = None,
+    user_id: Optional[str] = None,
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Runs the pest, disease and nutrient analyses on one upload, decoding it once."""
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    cache = get_prediction_cache()
+    versions = _model_versions()
+    keys = _cache_keys(cache, image_bytes, digest, versions) if cache else {}
+    results: Dict[str, Any] = {}
+    if cache:
+        cached = await asyncio.gather(*(cache.get(keys[name]) for name in ANALYSES))
+        results = {name: value for name, value in zip(ANALYSES, cached) if value is not None}
+    missing = [name for name in ANALYSES if name not in results]
+
+    if missing:
+        # The nutrient analysis needs the most pixels; the CNN inputs are resized from the same decode
+        if "nutrient" in missing:
+            decode_args = {"max_pixels": get_settings().NUTRIENT_MAX_PIXELS}
+        else:
+            decode_args = {"min_size": (DISEASE_INPUT_SIZE, DISEASE_INPUT_SIZE)}
+        decoded = await _timed(timings, "decode", run_in_pool(IMAGE, decode_image, image_bytes, **decode_args))
+        try:
+            await _timed(
+                timings, "screen", run_in_pool(IMAGE, screen_image, decoded, get_settings().DISEASE_MIN_PLANT_FRACTION)
+            )
+        except ImageGateError as e:
+            SHORT_CIRCUITS.inc(model="scan", reason=e.reason)
+            raise
+        computed = await asyncio.gather(*(_timed(timings, name, ANALYSES[name](decoded)) for name in missing))
+        del decoded
+        for name, value in zip(missing, computed):
+            # The CNN results name the version that ran, in case a new one was swapped in meanwhile
+            versions[name] = value.pop("model_version", versions[name])
+            results[name] = value
+        if cache:
+            keys = _cache_keys(cache, image_bytes, digest, versions)
+            for name in missing:
+                await cache.set(keys[name], results[name])
+
+    settings = get_settings()
+    pest = {**results["pest"], "confident": results["pest"]["confidence"] >= settings.PEST_MIN_CONFIDENCE}
+    disease = {**results["disease"], "explanation": None}
+    disease["confident"] = disease["confidence"] >= settings.DISEASE_MIN_CONFIDENCE
+    if disease["confident"]:
+        disease["explanation"] = await _timed(timings, "explanation", explain_disease(disease["disease"]))
+    else:
+        SHORT_CIRCUITS.inc(model="disease", reason="low_confidence")
+    nutrient = await build_report(
+        results["nutrient"]["regions"], results["nutrient"]["messages"], mobile_number, email
+    )
+
+    result = {
+        "pest": pest,
+        "disease": disease,
+        "nutrient": nutrient,
+        "cached": sorted(name for name in ANALYSES if name not in missing),
+        "timings_ms": timings,
+    }
+    timings["total"] = round(1000 * (time.perf_counter() - started), 3)
+
+    await store_document("scans", {
+        "prediction": result,
+        "input": {"file": "image", "mobile_number": mobile_number, "email": email},
+        "user_id": user_id,
+        "model_version": versions,
+        "timestamp": datetime.now(),
+    })
+
+    return result
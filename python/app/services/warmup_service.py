@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
+
+from PIL import Image
+
+from app.utils.ai_helpers import (
+    get_crop_models,
+    get_disease_model_and_labels,
+    get_model_registry,
+    get_pest_model_and_assets,
+    import_framework,
+    warm_crop_models,
+    warm_disease_model,
+    warm_pest_model,
+)
+from app.utils.image_preprocessing import DecodedImage
+from app.utils.nutrient_analyzer import find_regions
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+def _warm_crop() -> None:
+    warm_crop_models(get_model_registry().get("crop"))
+
+
+def _warm_pest() -> None:
+    warm_pest_model(get_model_registry().get("pest"))
+
+
+def _warm_disease() -> None:
+    warm_disease_model(get_model_registry().get("disease"))
+
+
+def _load_nutrient() -> None:
+    import_framework("scipy.ndimage")
+
+
+def _warm_nutrient() -> None:
+    image = Image.new("RGB", (64, 64), (120, 160, 90))
+    find_regions(DecodedImage(image=image, original_size=image.size))
+
+
+# Framework modules each model needs, imported one model at a time before
+# the parallel load phase (see import_framework).
+MODEL_FRAMEWORKS: Dict[str, tuple[str, ...]] = {
+    "crop": ("sklearn.ensemble",),
+    "pest": ("torch", "torchvision"),
+    "disease": ("tensorflow", "cv2"),
+    "nutrient": ("scipy.ndimage",),
+}
+
+# name -> (load, dummy inference)
+MODEL_WARMUPS: Dict[str, tuple[Callable[[], Any], Callable[[], Any]]] = {
+    "crop": (get_crop_models, _warm_crop),
+    "pest": (get_pest_model_and_assets, _warm_pest),
+    "disease": (get_disease_model_and_labels, _warm_disease),
+    "nutrient": (_load_nutrient, _warm_nutrient),
+}
+
+# Models that can be loaded before a fork and used by the children. TensorFlow's
+# runtime threads do not survive fork(), so the disease model loads per worker.
+FORK_SAFE_MODELS = ("crop", "pest", "nutrient")
+
+_status: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _set(name: str, **fields: Any) -> None:
+    with _lock:
+        _status.setdefault(
+            name, {"state": PENDING, "import_ms": None, "load_ms": None, "warmup_ms": None, "error": None}
+        )
+        _status[name].update(fields)
+
+
+def _warm_one(name: str) -> None:
+    load, warm = MODEL_WARMUPS[name]
+    try:
+        _set(name, state=LOADING)
+        started = time.perf_counter()
+        load()
+        loaded = time.perf_counter()
+        _set(name, state=WARMING, load_ms=round(1000 * (loaded - started), 1))
+        warm()
+        _set(name, state=READY, warmup_ms=round(1000 * (time.perf_counter() - loaded), 1))
+    except Exception as e:
+        _set(name, state=FAILED, error=f"{type(e).__name__}: {e}")
+
+
+def warm_up_models(names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Loads the named models in parallel threads and runs one dummy inference on each."""
+    names = [name for name in names if name in MODEL_WARMUPS]
+    for name in names:
+        _set(name, state=PENDING)
+    for name in names:
+        started = time.perf_counter()
+        try:
+            for module in MODEL_FRAMEWORKS.get(name, ()):
+                import_framework(module)
+        except Exception as e:
+            _set(name, state=FAILED, error=f"{type(e).__name__}: {e}")
+        _set(name, import_ms=round(1000 * (time.perf_counter() - started), 1))
+    names = [name for name in names if _status[name]["state"] != FAILED]
+    if names:
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="warmup") as pool:
+            list(pool.map(_warm_one, names))
+    return model_status()
+
+
+def preload_models(names: Iterable[str], share_torch_memory: bool = False) -> Dict[str, float]:
+    """Loads the fork-safe models without running them, in a process about to fork workers.
+
+    Torch is held to one thread while loading so no OpenMP pool exists yet; a
+    pool started before fork() can hang the children that inherit it. Workers
+    set their own thread counts and run the warm-up after forking.
+    """
+    names = [name for name in MODEL_WARMUPS if name in names and name in FORK_SAFE_MODELS]
+    if "pest" in names:
+        import_framework("torch").set_num_threads(1)
+    seconds: Dict[str, float] = {}
+    for name in names:
+        started = time.perf_counter()
+        for module in MODEL_FRAMEWORKS.get(name, ()):
+            import_framework(module)
+        MODEL_WARMUPS[name][0]()
+        seconds[name] = round(time.perf_counter() - started, 3)
+    if share_torch_memory and "pest" in names:
+        # Moves the weights to /dev/shm, which must have room for them (about 45 MB)
+        get_pest_model_and_assets()[0].share_memory()
+    return seconds
+
+
+async def warm_up_models_async(names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    return await asyncio.to_thread(warm_up_models, list(names))
+
+
+def model_status() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {name: dict(status) for name, status in _status.items()}
+
+
+def is_ready(names: Iterable[str]) -> bool:
+    status = model_status()
+    return all(status.get(name, {}).get("state") == READY for name in names if name in MODEL_WARMUPS)
@@ -1,135 +1,375 @@
 from __future__ import annotations
 
 from pathlib import Path
+from dataclasses import dataclass
 from functools import lru_cache
-import io
+import importlib
 import json
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Sequence
 import joblib
 import numpy as np
-import pandas as pd
-from PIL import Image
-import cv2
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
-import tensorflow as tf
-import google.generativeai as genai
 
 from app.core.config import get_settings
-
+from app.utils.batching import MicroBatcher
+from app.utils.fake_gemini import FakeGeminiModel
+from app.utils.image_gate import screen_image
+from app.utils.model_registry import LoadedModel, ModelRegistry, ModelSpec
+from app.utils.pesticide_index import PesticideIndex, get_pesticide_index
+from app.utils.tree_ensembles import compile_regressor
+from app.utils.image_preprocessing import (
+    DISEASE_INPUT_SIZE,
+    PEST_INPUT_SIZE,
+    decode_image,
+    disease_input,
+    normalize_pest_batch,
+    pest_input,
+)
+
+# torch/torchvision, tensorflow, cv2 and google.generativeai take
+# seconds to import, so each is imported on first use through import_framework.
+if TYPE_CHECKING:
+    import torch
+
+# Importing torch and tensorflow from two threads at once can crash the
+# interpreter, so first-time framework imports are serialized.
+_framework_import_lock = threading.RLock()
 
 ROOT_DIR = Path(__file__).resolve().parents[2]  # points to python/
 MODELS_DIR = ROOT_DIR / "models"
 DATA_DIR = ROOT_DIR / "data"
 
 
+# Files whose contents determine each model's predictions (the builtin version of each)
+MODEL_FILES = {
+    "crop": (
+        MODELS_DIR / "water_model.pkl",
+        MODELS_DIR / "harvest_model.pkl",
+        MODELS_DIR / "le_crop.pkl",
+        MODELS_DIR / "le_season.pkl",
+    ),
+    "pest": (MODELS_DIR / "pest_cnn_model.pth", DATA_DIR / "pest_classes.txt", DATA_DIR / "Pesticides.csv"),
+    "disease": (MODELS_DIR / "plant_disease_model.h5",),
+}
+
+
 @lru_cache
 def get_settings_cached():
     return get_settings()
 
 
+def import_framework(name: str):
+    module = sys.modules.get(name)
+    # A module another thread is still importing is already in sys.modules; wait for it under the lock
+    if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+        return module
+    with _framework_import_lock:
+        return importlib.import_module(name)
+
+
+def get_model_version(name: str) -> str:
+    """Version of the model currently serving ``name`` ("builtin-<fingerprint>" or a registered version)."""
+    return get_model_registry().version(name)
+
+
 # ---------------------- Gemini / Chatbot ----------------------
 @lru_cache
 def get_gemini_model():
     settings = get_settings_cached()
+    if settings.GEMINI_FAKE:
+        return FakeGeminiModel(settings.GEMINI_FAKE_TTFB_MS, settings.GEMINI_FAKE_TOKEN_MS)
     if settings.API_KEY:
+        genai = import_framework("google.generativeai")
         genai.configure(api_key=settings.API_KEY)
         return genai.GenerativeModel("gemini-2.0-flash")
     return None
 
 
 # ---------------------- Classic ML models ----------------------
-@lru_cache
+@dataclass
+class CropModels:
+    """Both regressors (as loaded, and as served) and both label encoders of one crop model version."""
+
+    water: Any
+    harvest: Any
+    water_regressor: Any
+    harvest_regressor: Any
+    crop_encoder: Any
+    season_encoder: Any
+    crop_index: dict[str, int]
+    season_index: dict[str, int]
+
+
+def _crop_regressor(model):
+    return compile_regressor(model) if get_settings_cached().CROP_INFERENCE_BACKEND == "compiled" else model
+
+
+def _label_index(encoder) -> dict[str, int]:
+    # LabelEncoder codes are the positions in the sorted classes_ array
+    return {str(label).strip().lower(): code for code, label in enumerate(encoder.classes_)}
+
+
+def load_crop_models(paths: dict[str, Path]) -> CropModels:
+    water = joblib.load(paths["water_model.pkl"])
+    harvest = joblib.load(paths["harvest_model.pkl"])
+    crop_encoder = joblib.load(paths["le_crop.pkl"])
+    season_encoder = joblib.load(paths["le_season.pkl"])
+    return CropModels(
+        water=water,
+        harvest=harvest,
+        # Compiled to lookup tables unless CROP_INFERENCE_BACKEND is "sklearn"
+        water_regressor=_crop_regressor(water),
+        harvest_regressor=_crop_regressor(harvest),
+        crop_encoder=crop_encoder,
+        season_encoder=season_encoder,
+        crop_index=_label_index(crop_encoder),
+        season_index=_label_index(season_encoder),
+    )
+
+
+def warm_crop_models(loaded: LoadedModel) -> None:
+    features = np.zeros((1, 6))
+    loaded.assets.water_regressor.predict(features)
+    loaded.assets.harvest_regressor.predict(features)
+
+
+def get_crop_models() -> CropModels:
+    return get_model_registry().get("crop").assets
+
+
 def get_water_model():
-    return joblib.load(MODELS_DIR / "water_model.pkl")
+    return get_crop_models().water
 
 
-@lru_cache
 def get_harvest_model():
-    return joblib.load(MODELS_DIR / "harvest_model.pkl")
+    return get_crop_models().harvest
+
+
+def get_water_regressor():
+    """The water model as served: compiled to lookup tables unless CROP_INFERENCE_BACKEND is "sklearn"."""
+    return get_crop_models().water_regressor
+
+
+def get_harvest_regressor():
+    return get_crop_models().harvest_regressor
 
 
-@lru_cache
 def get_crop_encoder():
-    return joblib.load(MODELS_DIR / "le_crop.pkl")
+    return get_crop_models().crop_encoder
 
 
-@lru_cache
 def get_season_encoder():
-    return joblib.load(MODELS_DIR / "le_season.pkl")
+    return get_crop_models().season_encoder
+
+
+def get_crop_label_index() -> dict[str, int]:
+    return get_crop_models().crop_index
+
+
+def get_season_label_index() -> dict[str, int]:
+    return get_crop_models().season_index
+
+
+# ---------------------- Class probabilities ----------------------
+def softmax(logits: np.ndarray, temperature: float = 1.0) -> np.ndarray:
+    """Row-wise softmax of ``logits / temperature``; a temperature above 1 tempers an overconfident model."""
+    scaled = np.asarray(logits, dtype=np.float64) / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    np.exp(scaled, out=scaled)
+    return scaled / scaled.sum(axis=1, keepdims=True)
+
+
+def top_k(probabilities: np.ndarray, labels: Sequence[str], k: int) -> list[dict]:
+    order = np.argsort(probabilities)[::-1][:k]
+    return [{"label": labels[i], "probability": round(float(probabilities[i]), 4)} for i in order]
 
 
 # ---------------------- Torch / Pest model ----------------------
-@lru_cache
-def get_pest_model_and_assets():
+def load_pest_model(paths: dict[str, Path]):
+    torch = import_framework("torch")
+    nn = import_framework("torch.nn")
+    models = import_framework("torchvision.models")
+
     model = models.resnet18(weights=None)
     model.fc = nn.Linear(model.fc.in_features, 132)
-    state = torch.load(MODELS_DIR / "pest_cnn_model.pth", map_location=torch.device("cpu"))
+    state = torch.load(paths["pest_cnn_model.pth"], map_location=torch.device("cpu"))
     model.load_state_dict(state)
     model.eval()
 
-    with open(DATA_DIR / "pest_classes.txt", "r", encoding="utf-8") as f:
+    with open(paths["pest_classes.txt"], "r", encoding="utf-8") as f:
         pest_classes = [line.strip() for line in f.readlines()]
 
-    pesticide_df = pd.read_csv(DATA_DIR / "Pesticides.csv")
-    pest_map = {
-        str(row["Pest Name"]).lower().strip(): row["Most Commonly Used Pesticides"]
-        for _, row in pesticide_df.iterrows()
-    }
+    # Indexed by class, like the model's outputs
+    csv_path = paths["Pesticides.csv"]
+    index = get_pesticide_index() if csv_path == DATA_DIR / "Pesticides.csv" else PesticideIndex.from_csv(csv_path)
+    recommendations = index.for_classes(pest_classes)
 
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-    ])
+    return model, pest_classes, recommendations
 
-    return model, pest_classes, pest_map, transform
 
+def warm_pest_model(loaded: LoadedModel) -> None:
+    torch = import_framework("torch")
+    pest_logits(torch.from_numpy(normalize_pest_batch([np.zeros((224, 224, 3), dtype=np.uint8)])), loaded)
 
-def pest_predict_from_bytes(image_bytes: bytes) -> tuple[str, str]:
-    model, classes, pest_map, transform = get_pest_model_and_assets()
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img_tensor = transform(img).unsqueeze(0)
+
+def get_pest_model_and_assets():
+    return get_model_registry().get("pest").assets
+
+
+def pest_preprocess(image_bytes: bytes | memoryview, screen: bool = False) -> np.ndarray:
+    """Decodes an upload into the 224x224x3 uint8 image the pest batcher expects.
+
+    With ``screen``, the image prefilter runs on the decode first and raises ImageGateError.
+    """
+    decoded = decode_image(image_bytes, min_size=(PEST_INPUT_SIZE, PEST_INPUT_SIZE))
+    if screen:
+        screen_image(decoded, get_settings_cached().PEST_MIN_PLANT_FRACTION)
+    return pest_input(decoded)
+
+
+def pest_classify_batch(images: list[np.ndarray]) -> list[dict]:
+    """Runs one ResNet18 forward pass over a list of preprocessed images; top-k probabilities per image."""
+    torch = import_framework("torch")
+    settings = get_settings_cached()
+    batch = torch.from_numpy(normalize_pest_batch(images))
+    # One version for the whole batch, even if a new one is swapped in meanwhile
+    loaded = get_model_registry().get("pest")
+    _, classes, recommendations = loaded.assets
+    probabilities = softmax(pest_logits(batch, loaded), settings.PEST_TEMPERATURE)
+    results = []
+    for row in probabilities:
+        idx = int(row.argmax())
+        results.append({
+            "pest": classes[idx],
+            "pesticide": recommendations[idx],
+            "confidence": round(float(row[idx]), 4),
+            "top_k": top_k(row, classes, settings.PREDICTION_TOP_K),
+            "model_version": loaded.version,
+        })
+    return results
+
+
+def pest_predict_batch(images: list[np.ndarray]) -> list[tuple[str, str]]:
+    return [(result["pest"], result["pesticide"]) for result in pest_classify_batch(images)]
+
+
+def pest_logits(batch: "torch.Tensor", loaded: LoadedModel | None = None) -> np.ndarray:
+    """Raw class scores for an (N, 3, 224, 224) batch from the configured inference backend."""
+    loaded = loaded or get_model_registry().get("pest")
+    if get_settings_cached().INFERENCE_BACKEND == "onnx":
+        from app.utils.inference_backends import run_onnx
+
+        return run_onnx("pest", batch.numpy(), loaded=loaded)
+    torch = import_framework("torch")
     with torch.no_grad():
-        outputs = model(img_tensor)
-        _, predicted = torch.max(outputs.data, 1)
-        pest = classes[predicted.item()]
-        pesticide = pest_map.get(pest.lower().strip(), "No Recommendation")
-    return pest, pesticide
+        return loaded.assets[0](batch).numpy()
+
+
+def pest_predict_from_bytes(image_bytes: bytes) -> tuple[str, str]:
+    return pest_predict_batch([pest_preprocess(image_bytes)])[0]
 
 
-# ---------------------- TensorFlow / Disease model ----------------------
 @lru_cache
-def get_disease_model_and_labels():
-    model = tf.keras.models.load_model(MODELS_DIR / "plant_disease_model.h5")
-    CLASS_NAMES = ('Tomato-Bacterial_spot', 'Potato-Early blight', 'Corn-Common_rust')
-    return model, CLASS_NAMES
+def get_pest_batcher() -> MicroBatcher:
+    settings = get_settings_cached()
+    return MicroBatcher(
+        pest_classify_batch,
+        max_batch_size=settings.PEST_BATCH_MAX_SIZE,
+        max_wait_ms=settings.PEST_BATCH_MAX_WAIT_MS,
+        name="pest-batcher",
+    )
 
 
-def disease_predict_from_bytes(image_bytes: bytes) -> str:
-    model, CLASS_NAMES = get_disease_model_and_labels()
+# ---------------------- TensorFlow / Disease model ----------------------
+DISEASE_CLASS_NAMES = ('Tomato-Bacterial_spot', 'Potato-Early blight', 'Corn-Common_rust')
+
 
-    # Convert bytes to cv2 image like in user's snippet
-    file_bytes = np.asarray(bytearray(image_bytes), dtype=np.uint8)
-    opencv_image = cv2.imdecode(file_bytes, 1)
+def load_disease_model(paths: dict[str, Path]):
+    tf = import_framework("tensorflow")
+    model = tf.keras.models.load_model(paths["plant_disease_model.h5"])
+    return model, DISEASE_CLASS_NAMES
 
-    # Resize image to 256x256 as in user's snippet
-    opencv_image = cv2.resize(opencv_image, (256, 256))
 
-    # Convert image to 4 dimensions as in user's snippet
-    opencv_image = opencv_image.reshape(1, 256, 256, 3)
+def warm_disease_model(loaded: LoadedModel) -> None:
+    disease_probabilities(np.zeros((1, 256, 256, 3), dtype=np.uint8), loaded)
+
+
+def get_disease_model_and_labels():
+    return get_model_registry().get("disease").assets
 
-    # Make prediction
-    Y_pred = model.predict(opencv_image)
-    result_index = np.argmax(Y_pred)
-    result = CLASS_NAMES[result_index]
 
+def format_disease_label(class_name: str) -> str:
     # Format output like user's snippet: "This is [plant_type] leaf with [disease]"
-    plant_type = result.split('-')[0]
-    disease = result.split('-')[1]
+    plant_type = class_name.split('-')[0]
+    disease = class_name.split('-')[1]
     return f"This is {plant_type} leaf with {disease}"
 
 
+def disease_labels() -> list[str]:
+    """Every label ``disease_predict_from_array`` can return, without loading the model."""
+    return [format_disease_label(name) for name in DISEASE_CLASS_NAMES]
+
+
+def disease_preprocess(image_bytes: bytes | memoryview, screen: bool = False) -> np.ndarray:
+    """Decodes an upload into the (1, 256, 256, 3) BGR array the disease model expects.
+
+    With ``screen``, the image prefilter runs on the decode first and raises ImageGateError.
+    """
+    decoded = decode_image(image_bytes, min_size=(DISEASE_INPUT_SIZE, DISEASE_INPUT_SIZE))
+    if screen:
+        screen_image(decoded, get_settings_cached().DISEASE_MIN_PLANT_FRACTION)
+    return disease_input(decoded)
+
+
+def disease_probabilities(batch: np.ndarray, loaded: LoadedModel | None = None) -> np.ndarray:
+    """Class probabilities for an (N, 256, 256, 3) BGR batch from the configured inference backend."""
+    loaded = loaded or get_model_registry().get("disease")
+    if get_settings_cached().INFERENCE_BACKEND == "onnx":
+        from app.utils.inference_backends import run_onnx
+
+        return run_onnx("disease", batch, loaded=loaded)
+    # Calling the model directly skips the per-call setup model.predict does
+    return np.asarray(loaded.assets[0](batch, training=False))
+
+
+def disease_classify_from_array(opencv_image: np.ndarray) -> dict:
+    settings = get_settings_cached()
+    labels = disease_labels()
+    loaded = get_model_registry().get("disease")
+    # The model ends in a softmax, so the temperature is applied to its log-probabilities
+    log_probabilities = np.log(np.clip(disease_probabilities(opencv_image, loaded), 1e-12, None))
+    row = softmax(log_probabilities, settings.DISEASE_TEMPERATURE)[0]
+    idx = int(row.argmax())
+    return {
+        "disease": labels[idx],
+        "confidence": round(float(row[idx]), 4),
+        "top_k": top_k(row, labels, settings.PREDICTION_TOP_K),
+        "model_version": loaded.version,
+    }
+
+
+def disease_predict_from_array(opencv_image: np.ndarray) -> str:
+    return disease_classify_from_array(opencv_image)["disease"]
+
+
+def disease_predict_from_bytes(image_bytes: bytes) -> str:
+    return disease_predict_from_array(disease_preprocess(image_bytes))
+
+
+# ---------------------- Model registry ----------------------
+@lru_cache
+def get_model_registry() -> ModelRegistry:
+    settings = get_settings_cached()
+    specs = [
+        ModelSpec("crop", MODEL_FILES["crop"], load_crop_models, warm_crop_models),
+        ModelSpec("pest", MODEL_FILES["pest"], load_pest_model, warm_pest_model),
+        ModelSpec("disease", MODEL_FILES["disease"], load_disease_model, warm_disease_model),
+    ]
+    root = Path(settings.MODEL_REGISTRY_DIR) if settings.MODEL_REGISTRY_DIR else MODELS_DIR / "registry"
+    return ModelRegistry(specs, root, poll_seconds=settings.MODEL_REGISTRY_POLL_SECONDS)
+
+
 # ---------------------- Rules / Chatbot helpers ----------------------
 @lru_cache
 def get_rules_data() -> dict:
@@ -137,10 +377,33 @@ def get_rules_data() -> dict:
         return json.load(f)
 
 
-def gemini_explain_disease(disease: str) -> str:
+@lru_cache
+def get_chatbot_system_prompt() -> str:
+    rules = get_rules_data()
+    return (
+        "You are Agro, an AI assistant for the AI Crop Monitoring System.\n"
+        "Follow these rules:\n" + "\n".join(rules.get("rules", [])) + "\n\n"
+        "Respond in a friendly, human-like, conversational tone.\n"
+        "Use bullet points or numbered lists if listing features or steps.\n"
+        "Keep answers concise, 2-5 sentences max.\n"
+        "Do not repeat your name in every message.\n"
+        "If user asks for something outside your scope, politely tell them.\n\n"
+    )
+
+
+def build_chatbot_prompt(user_message: str) -> str:
+    return get_chatbot_system_prompt() + f"User: {user_message}\nAgro:"
+
+
+def gemini_explain_disease(disease: str) -> str | None:
+    """Gemini's explanation, or None when no model is configured or the response has no text."""
     model = get_gemini_model()
     if not model:
-        return "Gemini API key not configured."
+        return None
     query = f"Explain about disease {disease} and give the precaution in 5 lines clearly in simple way"
     resp = model.generate_content(query)
-    return getattr(resp, "text", "No response")
+    try:
+        return resp.text or None
+    except (AttributeError, ValueError):
+        # genai raises ValueError for a blocked or empty candidate
+        return None
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Sequence
+
+
+@dataclass
+class _PendingItem:
+    payload: Any
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class BatchStats:
+    """Running counters for batch sizes and time spent waiting in the queue."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_batch_time = 0.0
+
+    def record(self, batch_size: int, waits: Sequence[float], batch_time: float) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.total_queue_wait += sum(waits)
+            self.max_queue_wait = max(self.max_queue_wait, max(waits, default=0.0))
+            self.total_batch_time += batch_time
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "avg_queue_wait_ms": round(1000 * self.total_queue_wait / self.items, 3) if self.items else 0.0,
+                "max_queue_wait_ms": round(1000 * self.max_queue_wait, 3),
+                "avg_batch_time_ms": round(1000 * self.total_batch_time / self.batches, 3) if self.batches else 0.0,
+            }
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches and runs them on a worker thread.
+
+    ``batch_fn`` receives a list of payloads and must return one result per
+    payload, in the same order; an ``Exception`` instance in place of a result
+    is raised in the awaiting request only. A batch is dispatched as soon as it reaches
+    ``max_batch_size`` or the oldest item has waited ``max_wait_ms``.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        name: str = "batcher",
+    ) -> None:
+        self._batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.stats = BatchStats()
+        self._queue: "queue.Queue[_PendingItem | None]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    async def submit(self, payload: Any) -> Any:
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_PendingItem(payload=payload, future=future, loop=loop))
+        return await future
+
+    def _collect(self, first: _PendingItem) -> tuple[List[_PendingItem], bool]:
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_PendingItem]) -> None:
+        started = time.perf_counter()
+        waits = [started - item.enqueued_at for item in batch]
+        try:
+            results = self._batch_fn([item.payload for item in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name}: batch function returned {len(results)} results for {len(batch)} inputs"
+                )
+        except Exception as exc:
+            for item in batch:
+                item.loop.call_soon_threadsafe(_set_exception, item.future, exc)
+        else:
+            for item, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    item.loop.call_soon_threadsafe(_set_exception, item.future, result)
+                else:
+                    item.loop.call_soon_threadsafe(_set_result, item.future, result)
+        self.stats.record(len(batch), waits, time.perf_counter() - started)
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException) -> None:
+    if not future.done():
+        future.set_exception(exc)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Optional
+
+from app.core.config import get_settings
+from app.core.database import get_db
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float | None = None) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple[float | None, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float | None = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class PredictionCache:
+    """Content-addressed cache of prediction results.
+
+    Keys combine the endpoint, the model version and a SHA-256 of the image
+    bytes. Lookups go to the in-process LRU first and then, when enabled, to a
+    shared ``prediction_cache`` collection in Mongo.
+    """
+
+    collection = "prediction_cache"
+
+    def __init__(self, max_entries: int, ttl_seconds: float, use_mongo: bool = False) -> None:
+        self.memory = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.use_mongo = use_mongo
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+        self._index_ready = False
+
+    @staticmethod
+    def key(namespace: str, model_version: str, image_bytes: bytes | memoryview, digest: str | None = None) -> str:
+        digest = digest or hashlib.sha256(image_bytes).hexdigest()
+        return f"{namespace}:{model_version}:{digest}"
+
+    async def _ensure_index(self) -> None:
+        if not self._index_ready:
+            await get_db()[self.collection].create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if not self.use_mongo:
+            return None
+        try:
+            doc = await get_db()[self.collection].find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now()}}, {"value": 1}
+            )
+        except Exception:
+            self.shared_errors += 1
+            return None
+        if doc is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.memory.set(key, doc["value"])
+        return doc["value"]
+
+    async def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if not self.use_mongo:
+            return
+        try:
+            await self._ensure_index()
+            await get_db()[self.collection].replace_one(
+                {"_id": key},
+                {"value": value, "expires_at": datetime.now() + timedelta(seconds=self.ttl_seconds)},
+                upsert=True,
+            )
+        except Exception:
+            self.shared_errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"memory": self.memory.stats()}
+        if self.use_mongo:
+            stats["shared"] = {
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+                "errors": self.shared_errors,
+            }
+        return stats
+
+
+@lru_cache
+def get_prediction_cache() -> PredictionCache | None:
+    settings = get_settings()
+    if not settings.PREDICTION_CACHE_ENABLED:
+        return None
+    return PredictionCache(
+        max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+        use_mongo=settings.PREDICTION_CACHE_MONGO,
+    )
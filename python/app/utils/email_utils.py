@@ -1,25 +1,140 @@
 from email.mime.text import MIMEText
+from functools import lru_cache
+import queue
 import smtplib
-from typing import Optional
+import threading
+import time
+from typing import List, Optional
 
 from app.core.config import get_settings
 
 
-def send_email(subject: str, body: str, to_email: str) -> Optional[str]:
-    settings = get_settings()
-    if not (settings.SMTP_HOST and settings.SMTP_USER and settings.SMTP_PASS and settings.SMTP_FROM):
-        return "SMTP not configured"
-
+def build_message(subject: str, body: str, to_email: str, from_email: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
-    msg["From"] = settings.SMTP_FROM
+    msg["From"] = from_email
     msg["To"] = to_email
+    return msg
+
 
-    try:
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT or 587) as server:
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP connections open for reuse across sends.
+
+    Idle connections are checked with NOOP before reuse and replaced once they
+    have been idle longer than ``max_idle_seconds`` or the server dropped them.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        size: int = 2,
+        max_idle_seconds: float = 60.0,
+        starttls: bool = True,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_idle_seconds = max_idle_seconds
+        self.starttls = starttls
+        self._idle: "queue.LifoQueue[tuple[smtplib.SMTP, float]]" = queue.LifoQueue(maxsize=max(1, size))
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
             server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASS)
-            server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+        server.login(self.user, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - released_at > self.max_idle_seconds:
+                self._close(server)
+                continue
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._close(server)
+
+    def _release(self, server: smtplib.SMTP) -> None:
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self._close(server)
+
+    def send_batch(self, messages: List[MIMEText]) -> List[Optional[str]]:
+        """Sends every message over one connection; returns an error string or None per message."""
+        errors: List[Optional[str]] = []
+        try:
+            server = self._acquire()
+        except Exception as e:
+            return [str(e)] * len(messages)
+        for msg in messages:
+            try:
+                try:
+                    server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+                except smtplib.SMTPServerDisconnected:
+                    server = self._connect()
+                    server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        self._release(server)
+        return errors
+
+    def close(self) -> None:
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+@lru_cache
+def get_smtp_pool() -> Optional[SMTPConnectionPool]:
+    settings = get_settings()
+    if not (settings.SMTP_HOST and settings.SMTP_USER and settings.SMTP_PASS and settings.SMTP_FROM):
         return None
-    except Exception as e:
-        return str(e)
+    return SMTPConnectionPool(
+        settings.SMTP_HOST,
+        settings.SMTP_PORT or 587,
+        settings.SMTP_USER,
+        settings.SMTP_PASS,
+        size=settings.SMTP_POOL_SIZE,
+        max_idle_seconds=settings.SMTP_POOL_MAX_IDLE_SECONDS,
+        starttls=settings.SMTP_STARTTLS,
+    )
+
+
+def send_email(subject: str, body: str, to_email: str) -> Optional[str]:
+    settings = get_settings()
+    pool = get_smtp_pool()
+    if pool is None:
+        return "SMTP not configured"
+
+    msg = build_message(subject, body, to_email, settings.SMTP_FROM)
+    return pool.send_batch([msg])[0]
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator
+
+_CANNED_REPLY = (
+    "Sure! The AI Crop Monitoring System can predict water needs and harvest time, "
+    "detect pests and diseases from leaf photos, and flag possible nutrient deficiencies. "
+    "Upload a clear photo or enter your crop details to get started."
+)
+
+
+@dataclass
+class _FakeChunk:
+    text: str
+
+
+class _FakeResponse:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Offline stand-in for ``genai.GenerativeModel`` with configurable latency.
+
+    Waits ``ttfb_ms`` before the first chunk and ``token_ms`` between words,
+    so streaming and caching can be measured without network access or quota.
+    """
+
+    def __init__(self, ttfb_ms: float = 300.0, token_ms: float = 20.0, reply: str = _CANNED_REPLY) -> None:
+        self.ttfb = ttfb_ms / 1000.0
+        self.token_delay = token_ms / 1000.0
+        self.reply = reply
+
+    def _words(self) -> list[str]:
+        words = self.reply.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _iter_chunks(self) -> Iterator[_FakeChunk]:
+        time.sleep(self.ttfb)
+        for word in self._words():
+            yield _FakeChunk(word)
+            time.sleep(self.token_delay)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._iter_chunks()
+        time.sleep(self.ttfb + self.token_delay * len(self._words()))
+        return _FakeResponse(self.reply)
+
+    async def _aiter_chunks(self) -> AsyncIterator[_FakeChunk]:
+        await asyncio.sleep(self.ttfb)
+        for word in self._words():
+            yield _FakeChunk(word)
+            await asyncio.sleep(self.token_delay)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._aiter_chunks()
+        await asyncio.sleep(self.ttfb + self.token_delay * len(self._words()))
+        return _FakeResponse(self.reply)
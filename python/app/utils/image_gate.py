@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import get_settings
+from app.utils.image_preprocessing import DecodedImage, ImageRejectedError
+
+# Longest side of the thumbnail the checks run on
+GATE_SIZE = 64
+
+# Foliage hues, from yellowing and browning leaves through green (degrees)
+_PLANT_HUES = (20.0, 170.0)
+_PLANT_MIN_SATURATION = 0.15
+_PLANT_MIN_VALUE = 0.12
+
+
+class ImageGateError(ImageRejectedError):
+    """An upload the prefilter judged unfit for the classifiers; ``reason`` names the failed check."""
+
+    # reason has a default so the error survives pickling out of a process pool
+    def __init__(self, message: str, reason: str = "rejected") -> None:
+        super().__init__(message, status_code=422)
+        self.reason = reason
+
+
+@dataclass
+class ImageQuality:
+    sharpness: float  # variance of the Laplacian of the grey thumbnail
+    contrast: float  # largest standard deviation of its colour channels
+    plant_fraction: float  # share of pixels with a foliage hue and enough saturation and light
+
+
+def measure(image: Image.Image) -> ImageQuality:
+    """Blur, contrast and foliage statistics of a GATE_SIZE thumbnail; well under a millisecond."""
+    scale = GATE_SIZE / max(image.size)
+    if scale < 1:
+        size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    rgb = np.asarray(image, dtype=np.float32)
+    grey = np.asarray(image.convert("L"), dtype=np.float32)
+    laplacian = (
+        4 * grey[1:-1, 1:-1] - grey[:-2, 1:-1] - grey[2:, 1:-1] - grey[1:-1, :-2] - grey[1:-1, 2:]
+    )
+    hsv = np.asarray(image.convert("HSV"), dtype=np.float32) / 255.0
+    hue = hsv[..., 0] * 360.0
+    plant = (
+        (hue >= _PLANT_HUES[0]) & (hue <= _PLANT_HUES[1])
+        & (hsv[..., 1] >= _PLANT_MIN_SATURATION) & (hsv[..., 2] >= _PLANT_MIN_VALUE)
+    )
+    return ImageQuality(
+        sharpness=float(laplacian.var()) if laplacian.size else 0.0,
+        contrast=float(rgb.reshape(-1, 3).std(axis=0).max()),
+        plant_fraction=float(plant.mean()),
+    )
+
+
+def screen_image(decoded: DecodedImage, min_plant_fraction: float = 0.0) -> ImageQuality | None:
+    """Raises ImageGateError for blank, blurred or (with ``min_plant_fraction``) non-plant photos.
+
+    Runs before the CNNs, so such uploads never reach inference, Gemini or
+    Mongo. Returns None when IMAGE_GATE_ENABLED is off.
+    """
+    settings = get_settings()
+    if not settings.IMAGE_GATE_ENABLED:
+        return None
+    quality = measure(decoded.image)
+    if quality.contrast < settings.IMAGE_GATE_MIN_CONTRAST:
+        raise ImageGateError("The image is almost uniform; please upload a photo of the plant", "contrast")
+    if quality.sharpness < settings.IMAGE_GATE_MIN_SHARPNESS:
+        raise ImageGateError("The image is too blurred to analyze; please retake it in focus", "blur")
+    if quality.plant_fraction < min_plant_fraction:
+        raise ImageGateError("No leaves were found in the image; please upload a photo of the plant", "plant")
+    return quality
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import io
+import math
+import threading
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.core.config import get_settings
+
+PEST_INPUT_SIZE = 224
+DISEASE_INPUT_SIZE = 256
+
+# EXIF orientations that swap width and height (rotated by 90 or 270 degrees)
+_ORIENTATION_TAG = 0x0112
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# torchvision ToTensor + Normalize folded into one multiply-add per channel
+_IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_PEST_SCALE = (1.0 / (255.0 * _IMAGENET_STD)).reshape(1, 3, 1, 1)
+_PEST_BIAS = (-_IMAGENET_MEAN / _IMAGENET_STD).reshape(1, 3, 1, 1)
+
+_buffers = threading.local()
+
+
+class ImageRejectedError(ValueError):
+    """An upload that is not an acceptable image; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class DecodedImage:
+    """An upright RGB decode of an upload, possibly at reduced resolution, plus its original (upright) size."""
+
+    image: Image.Image
+    original_size: tuple[int, int]
+
+    @property
+    def array(self) -> np.ndarray:
+        return np.asarray(self.image)
+
+    @property
+    def scale(self) -> tuple[float, float]:
+        """Factors that map decoded x/y coordinates back to the original image."""
+        return self.original_size[0] / self.image.size[0], self.original_size[1] / self.image.size[1]
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable file over a bytes-like object; unlike BytesIO it does not copy a memoryview first."""
+
+    def __init__(self, data: bytes | memoryview) -> None:
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self._view) - self._pos)
+        if count <= 0:
+            return 0
+        buffer[:count] = self._view[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = (0, self._pos, len(self._view))[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def open_image(data: bytes | memoryview, max_bytes: int | None = None, max_pixels: int | None = None) -> Image.Image:
+    """Reads the image header and enforces the size limits without decoding any pixels."""
+    settings = get_settings()
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    max_pixels = settings.MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+    if max_bytes and len(data) > max_bytes:
+        raise ImageRejectedError(f"Image is larger than {max_bytes} bytes", status_code=413)
+    try:
+        img = Image.open(io.BytesIO(data) if isinstance(data, bytes) else _BufferReader(data))
+    except Exception:
+        raise ImageRejectedError("Unsupported or corrupt image file", status_code=415)
+    width, height = img.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageRejectedError(f"Image is {width}x{height}; the limit is {max_pixels} pixels", status_code=413)
+    return img
+
+
+def decode_image(
+    data: bytes | memoryview,
+    min_size: Sequence[int] | None = None,
+    max_pixels: int | None = None,
+) -> DecodedImage:
+    """Decodes an upload once, as small as the callers allow.
+
+    ``min_size`` is the smallest (width, height) any consumer resizes to and
+    ``max_pixels`` caps the decoded area. JPEGs are decoded directly at 1/2,
+    1/4 or 1/8 scale where that still satisfies both. The EXIF orientation is
+    applied, as cv2.imdecode does, so rotated phone photos reach the models
+    upright.
+    """
+    img = open_image(data)
+    try:
+        return _decode_opened(img, min_size, max_pixels)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        # A truncated or corrupt file gets past the header read and fails here
+        raise ImageRejectedError("Unsupported or corrupt image file", status_code=415)
+
+
+def _decode_opened(img: Image.Image, min_size: Sequence[int] | None, max_pixels: int | None) -> DecodedImage:
+    orientation = img.getexif().get(_ORIENTATION_TAG, 1)
+    transposed = orientation in _TRANSPOSED_ORIENTATIONS
+    if min_size and transposed:
+        # min_size is in upright terms; the decoder works on the stored layout
+        min_size = (min_size[1], min_size[0])
+    width, height = img.size
+
+    request = None
+    if max_pixels and width * height > max_pixels:
+        factor = math.sqrt(width * height / max_pixels)
+        request = (math.ceil(width / factor), math.ceil(height / factor))
+    elif min_size:
+        request = (min(width, min_size[0]), min(height, min_size[1]))
+    if request is not None:
+        if min_size:
+            request = (max(request[0], min(width, min_size[0])), max(request[1], min(height, min_size[1])))
+        img.draft("RGB", request)
+
+    if max_pixels and img.size[0] * img.size[1] > max_pixels:
+        img = img.reduce(math.ceil(math.sqrt(img.size[0] * img.size[1] / max_pixels)))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    else:
+        img.load()
+    if orientation not in (0, 1):
+        img = ImageOps.exif_transpose(img)
+    return DecodedImage(image=img, original_size=(height, width) if transposed else (width, height))
+
+
+def pest_input(decoded: DecodedImage) -> np.ndarray:
+    """224x224x3 uint8 RGB; resized like torchvision's Resize on a PIL image."""
+    return np.asarray(decoded.image.resize((PEST_INPUT_SIZE, PEST_INPUT_SIZE), Image.BILINEAR))
+
+
+def normalize_pest_batch(images: Sequence[np.ndarray]) -> np.ndarray:
+    """Stacks 224x224x3 uint8 images into a normalized (N, 3, 224, 224) float32 batch.
+
+    The batch lives in a per-thread buffer that is reused by the next call on
+    the same thread, so consume it before normalizing another batch.
+    """
+    count = len(images)
+    buffer = getattr(_buffers, "pest", None)
+    if buffer is None or buffer.shape[0] < count:
+        buffer = np.empty((count, 3, PEST_INPUT_SIZE, PEST_INPUT_SIZE), dtype=np.float32)
+        _buffers.pest = buffer
+    batch = buffer[:count]
+    for i, img in enumerate(images):
+        batch[i] = img.transpose(2, 0, 1)
+    batch *= _PEST_SCALE
+    batch += _PEST_BIAS
+    return batch
+
+
+def disease_input(decoded: DecodedImage) -> np.ndarray:
+    """(1, 256, 256, 3) uint8 in BGR order, resized with OpenCV as the disease model was trained."""
+    from app.utils.ai_helpers import import_framework
+
+    cv2 = import_framework("cv2")
+    resized = cv2.resize(decoded.array, (DISEASE_INPUT_SIZE, DISEASE_INPUT_SIZE))
+    return np.ascontiguousarray(resized[np.newaxis, :, :, ::-1])
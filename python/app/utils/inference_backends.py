@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from app.utils.ai_helpers import (
+    MODELS_DIR,
+    get_model_registry,
+    get_settings_cached,
+    import_framework,
+)
+from app.utils.model_registry import LoadedModel
+
+_export_lock = threading.Lock()
+
+
+def onnx_dir() -> Path:
+    configured = get_settings_cached().ONNX_CACHE_DIR
+    return Path(configured) if configured else MODELS_DIR / "onnx"
+
+
+def onnx_path(name: str, version: str, quantized: bool = False) -> Path:
+    """Exported models are named after the source model version, so a retrained model gets a fresh export."""
+    suffix = ".int8" if quantized else ""
+    return onnx_dir() / f"{name}-{version}{suffix}.onnx"
+
+
+def export_pest_onnx(path: Path, loaded: LoadedModel) -> Path:
+    torch = import_framework("torch")
+    model = loaded.assets[0]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 3, 224, 224),
+        str(path),
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+        dynamo=False,
+    )
+    return path
+
+
+def export_disease_onnx(path: Path, loaded: LoadedModel) -> Path:
+    try:
+        tf2onnx = import_framework("tf2onnx")
+    except ImportError:
+        raise RuntimeError("Exporting the disease model to ONNX requires the 'tf2onnx' package")
+    tf = import_framework("tensorflow")
+    model = loaded.assets[0]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    spec = (tf.TensorSpec((None, 256, 256, 3), tf.float32, name="input"),)
+
+    # Converting a traced call works for both Keras 2 and Keras 3 models
+    @tf.function(input_signature=spec)
+    def forward(images):
+        return model(images, training=False)
+
+    tf2onnx.convert.from_function(forward, input_signature=spec, opset=17, output_path=str(path))
+    return path
+
+
+EXPORTERS = {
+    "pest": export_pest_onnx,
+    "disease": export_disease_onnx,
+}
+
+
+def quantize_onnx(source: Path, target: Path) -> Path:
+    """Dynamic int8 quantization of weights; activations are quantized on the fly at run time."""
+    quantization = import_framework("onnxruntime.quantization")
+    quantization.quantize_dynamic(str(source), str(target), weight_type=quantization.QuantType.QInt8)
+    return target
+
+
+def _write_atomically(path: Path, build: Callable[[Path], Any]) -> Path:
+    """Runs ``build`` on a file aside and renames it into place, so other workers never open half an export."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    try:
+        build(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def ensure_onnx_model(name: str, quantized: bool = False, loaded: LoadedModel | None = None) -> Path:
+    loaded = loaded or get_model_registry().get(name)
+    path = onnx_path(name, loaded.version, quantized)
+    if path.exists():
+        return path
+    # The lock covers this process; across workers an existing path is always a complete file
+    with _export_lock:
+        if path.exists():
+            return path
+        base = onnx_path(name, loaded.version)
+        if not base.exists():
+            _write_atomically(base, lambda tmp: EXPORTERS[name](tmp, loaded))
+        if quantized:
+            _write_atomically(path, lambda tmp: quantize_onnx(base, tmp))
+    return path
+
+
+def get_onnx_session(name: str, quantized: bool | None = None, loaded: LoadedModel | None = None) -> Any:
+    """The session for ``loaded`` (default: the live version), exporting the model on first use."""
+    if quantized is None:
+        quantized = get_settings_cached().ONNX_QUANTIZE_INT8
+    return _load_session(str(ensure_onnx_model(name, quantized, loaded)))
+
+
+# A swap keeps the previous version's session until it is evicted
+@lru_cache(maxsize=8)
+def _load_session(path: str) -> Any:
+    ort = import_framework("onnxruntime")
+    settings = get_settings_cached()
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.ONNX_INTRA_OP_THREADS:
+        options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+    # Requests already run concurrently on the executor pools
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def run_onnx(
+    name: str, batch: np.ndarray, quantized: bool | None = None, loaded: LoadedModel | None = None
+) -> np.ndarray:
+    session = get_onnx_session(name, quantized, loaded)
+    input_name = session.get_inputs()[0].name
+    return session.run(None, {input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
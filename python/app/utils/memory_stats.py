@@ -0,0 +1,74 @@
+import os
+import resource
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROC = Path("/proc")
+MB = 1024 * 1024
+
+# Set in each worker by serve.py; None when running a single process (run.py)
+_master_pid: Optional[int] = None
+
+
+def register_master(pid: int) -> None:
+    global _master_pid
+    _master_pid = pid
+
+
+def process_memory(pid: int) -> Dict[str, Any]:
+    """RSS, PSS and shared/private split of one process, in MB.
+
+    PSS divides each shared page between the processes mapping it, so summing
+    PSS over the master and workers gives the real footprint of the server.
+    """
+    fields: Dict[str, int] = {}
+    try:
+        with open(PROC / str(pid) / "smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[key] = int(parts[0]) * 1024
+    except OSError:
+        if pid != os.getpid():
+            return {"pid": pid, "error": "unavailable"}
+        # No /proc (macOS): peak RSS is all we have, in bytes there and in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"pid": pid, "max_rss_mb": round(peak / (MB if sys.platform == "darwin" else 1024), 1)}
+    return {
+        "pid": pid,
+        "rss_mb": round(fields.get("Rss", 0) / MB, 1),
+        "pss_mb": round(fields.get("Pss", 0) / MB, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / MB, 1),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / MB, 1),
+        "swap_mb": round(fields.get("Swap", 0) / MB, 1),
+    }
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for stat in PROC.glob("[0-9]*/stat"):
+        try:
+            # The command name may contain spaces, so split after its closing parenthesis
+            ppid = int(stat.read_text().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def worker_memory() -> Dict[str, Any]:
+    """Memory of the server master and every worker, or of this process alone."""
+    current = os.getpid()
+    if _master_pid is None:
+        return {"current_pid": current, "master": None, "workers": [process_memory(current)]}
+    workers = [process_memory(pid) for pid in _children(_master_pid)]
+    master = process_memory(_master_pid)
+    return {
+        "current_pid": current,
+        "master": master,
+        "workers": workers,
+        "total_pss_mb": round(sum(p.get("pss_mb", 0) for p in [master, *workers]), 1),
+    }
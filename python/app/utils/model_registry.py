@@ -0,0 +1,363 @@
+"""Versioned models that can be swapped while the server runs.
+
+Every model is a bundle of files. The "builtin" version is the files in
+models/ and data/; further versions are registered under the registry
+directory, one folder per version with a manifest of SHA-256 checksums, and
+may override any subset of the bundle's files:
+
+    python -m app.utils.model_registry register pest path/to/pest_cnn_model.pth --version 2024-06
+    python -m app.utils.model_registry list
+
+Activating a version verifies its checksums, loads it in a background thread,
+runs the warm-up inference on it and only then replaces the live version with
+one assignment. Requests already running keep the objects they started with.
+The active version of each model is persisted in active.json, which every
+process polls (at most every MODEL_REGISTRY_POLL_SECONDS, when it next uses
+the model) and follows in the same way.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+BUILTIN = "builtin"
+STATE_FILE = "active.json"
+MANIFEST_FILE = "manifest.json"
+# Versions kept in each model's history for rollback
+HISTORY_LENGTH = 10
+
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelVersionError(ValueError):
+    """Unknown model or version, a bad bundle, or a swap already in progress; ``status_code`` is the HTTP status."""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    files: Sequence[Path]  # the builtin bundle
+    load: Callable[[Dict[str, Path]], Any]  # file name -> path, to the loaded assets
+    warm: Callable[["LoadedModel"], Any]  # one dummy inference on a freshly loaded version
+
+
+@dataclass
+class LoadedModel:
+    version: str
+    assets: Any
+    checksums: Dict[str, str]
+    loaded_at: datetime
+
+
+@dataclass
+class _Slot:
+    current: Optional[LoadedModel] = None
+    pending: Optional[Dict[str, Any]] = None  # version, state, error of the last swap
+    lock: threading.Lock = field(default_factory=threading.Lock)  # held while the first version loads
+    swapping: threading.Lock = field(default_factory=threading.Lock)
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(paths: Sequence[Path]) -> str:
+    """Short fingerprint of files by name, size and mtime; cheap enough for every request."""
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = path.stat()
+            h.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        except FileNotFoundError:
+            h.update(f"{path.name}:missing;".encode())
+    return h.hexdigest()[:12]
+
+
+class ModelRegistry:
+    def __init__(self, specs: Sequence[ModelSpec], root: Path, poll_seconds: float = 0.0) -> None:
+        self.specs = {spec.name: spec for spec in specs}
+        self.root = root
+        self.poll_seconds = poll_seconds
+        self._slots = {name: _Slot() for name in self.specs}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._state_mtime: Optional[int] = None
+        self._polled = 0.0
+        self._read_state()
+
+    # ---------------------- Versions on disk ----------------------
+    def _spec(self, name: str) -> ModelSpec:
+        if name not in self.specs:
+            raise ModelVersionError(f"Unknown model '{name}'; expected one of: {', '.join(self.specs)}", 404)
+        return self.specs[name]
+
+    def _builtin_version(self, name: str) -> str:
+        return f"{BUILTIN}-{fingerprint(self.specs[name].files)}"
+
+    def _folder(self, name: str, version: str) -> Path:
+        """The version's directory; names that could reach outside the registry root are refused."""
+        if not version or "/" in version or "\\" in version or version.startswith("."):
+            raise ModelVersionError(f"Invalid version name '{version}'")
+        folder = self.root / name / version
+        if not folder.resolve().is_relative_to((self.root / name).resolve()):
+            raise ModelVersionError(f"Invalid version name '{version}'")
+        return folder
+
+    def _manifest(self, name: str, version: str) -> Dict[str, Any]:
+        folder = self._folder(name, version)
+        try:
+            return json.loads((folder / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raise ModelVersionError(f"Model '{name}' has no version '{version}'", 404)
+
+    def _paths(self, name: str, version: str) -> Dict[str, Path]:
+        paths = {path.name: path for path in self._spec(name).files}
+        if not version.startswith(BUILTIN):
+            folder = self._folder(name, version)
+            # Only the bundle's own file names, whatever the manifest lists
+            paths.update({file: folder / file for file in self._manifest(name, version)["checksums"] if file in paths})
+        return paths
+
+    def versions(self, name: str) -> List[Dict[str, Any]]:
+        spec = self._spec(name)
+        found = [{"version": self._builtin_version(name), "files": [path.name for path in spec.files]}]
+        folder = self.root / name
+        if folder.is_dir():
+            for entry in sorted(folder.iterdir()):
+                if (entry / MANIFEST_FILE).is_file():
+                    manifest = self._manifest(name, entry.name)
+                    found.append({
+                        "version": entry.name,
+                        "files": sorted(manifest["checksums"]),
+                        "registered_at": manifest.get("registered_at"),
+                        "note": manifest.get("note"),
+                    })
+        return found
+
+    def register(self, name: str, files: Sequence[Path], version: Optional[str] = None, note: Optional[str] = None) -> Dict[str, Any]:
+        """Copies ``files`` (named like the builtin files they replace) in as a new version."""
+        bundle = {path.name for path in self._spec(name).files}
+        unknown = [path.name for path in files if path.name not in bundle]
+        if unknown or not files:
+            raise ModelVersionError(f"Files for '{name}' must be named one of: {', '.join(sorted(bundle))}")
+        checksums = {path.name: sha256_file(path) for path in files}
+        if version is None:
+            combined = hashlib.sha256("".join(f"{k}:{v};" for k, v in sorted(checksums.items())).encode())
+            version = combined.hexdigest()[:12]
+        if version.startswith(BUILTIN):
+            raise ModelVersionError(f"Invalid version name '{version}'")
+        target = self._folder(name, version)
+        if target.exists():
+            raise ModelVersionError(f"Model '{name}' already has a version '{version}'", 409)
+
+        # Copied aside and renamed, so a half-copied version is never listed
+        staging = self.root / name / f".{version}.{os.getpid()}.tmp"
+        staging.mkdir(parents=True)
+        try:
+            for path in files:
+                shutil.copyfile(path, staging / path.name)
+            manifest = {
+                "version": version,
+                "checksums": checksums,
+                "registered_at": datetime.now(timezone.utc).isoformat(),
+                "note": note,
+            }
+            (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return manifest
+
+    def _verify(self, name: str, version: str, paths: Dict[str, Path]) -> Dict[str, str]:
+        checksums = {file: sha256_file(path) for file, path in paths.items() if path.exists()}
+        if not version.startswith(BUILTIN):
+            for file, expected in self._manifest(name, version)["checksums"].items():
+                if checksums.get(file) != expected:
+                    raise ModelVersionError(f"Checksum mismatch for {name}/{version}/{file}", 422)
+        return checksums
+
+    # ---------------------- Active versions ----------------------
+    def _state_path(self) -> Path:
+        return self.root / STATE_FILE
+
+    def _read_state(self) -> bool:
+        """Reloads active.json if it changed; True when it did."""
+        try:
+            mtime = self._state_path().stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._state_mtime:
+            return False
+        try:
+            self._state = json.loads(self._state_path().read_text(encoding="utf-8")) if mtime else {}
+        except (OSError, ValueError):
+            return False
+        self._state_mtime = mtime
+        return True
+
+    def _write_state(self, name: str, entry: Dict[str, Any]) -> None:
+        self._read_state()
+        state = {**self._state, name: entry}
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{STATE_FILE}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(tmp, self._state_path())
+        self._state = state
+        self._state_mtime = self._state_path().stat().st_mtime_ns
+
+    def _wanted(self, name: str) -> str:
+        version = self._state.get(name, {}).get("active")
+        # The builtin files may have been replaced in place since the state was written
+        return self._builtin_version(name) if version is None or version.startswith(BUILTIN) else version
+
+    def _poll(self) -> None:
+        if not self.poll_seconds or time.monotonic() - self._polled < self.poll_seconds:
+            return
+        self._polled = time.monotonic()
+        if not self._read_state():
+            return
+        for name, slot in self._slots.items():
+            wanted = self._wanted(name)
+            if slot.current is not None and slot.current.version != wanted:
+                try:
+                    self._start_swap(name, wanted, history=None, background=True)
+                except ModelVersionError:
+                    # Already swapping, or the version is not on this machine; the next poll retries
+                    self._state_mtime = None
+
+    def version(self, name: str) -> str:
+        """The version serving ``name`` (or about to, if it has not been loaded yet)."""
+        self._poll()
+        current = self._slots[name].current
+        return current.version if current is not None else self._wanted(name)
+
+    def get(self, name: str) -> LoadedModel:
+        """The live version of ``name``, loading the active one on first use."""
+        self._poll()
+        slot = self._slots[name]
+        current = slot.current
+        if current is None:
+            with slot.lock:
+                if slot.current is None:
+                    slot.current = self._load(name, self._wanted(name))
+                current = slot.current
+        return current
+
+    def _load(self, name: str, version: str) -> LoadedModel:
+        spec = self.specs[name]
+        paths = self._paths(name, version)
+        checksums = self._verify(name, version, paths)
+        assets = spec.load(paths)
+        return LoadedModel(version=version, assets=assets, checksums=checksums, loaded_at=datetime.now(timezone.utc))
+
+    def _swap(self, name: str, version: str, history: Optional[List[str]]) -> None:
+        slot = self._slots[name]
+        try:
+            loaded = self._load(name, version)
+            self.specs[name].warm(loaded)
+            if history is not None:
+                self._write_state(name, {"active": version, "history": history[-HISTORY_LENGTH:]})
+            # One reference assignment; requests holding the old version finish with it
+            slot.current = loaded
+            slot.pending = {"version": version, "state": READY, "error": None}
+        except Exception as e:
+            slot.pending = {"version": version, "state": FAILED, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            slot.swapping.release()
+
+    def _start_swap(self, name: str, version: str, history: Optional[List[str]], background: bool) -> Dict[str, Any]:
+        if version.startswith(BUILTIN):
+            version = self._builtin_version(name)
+        else:
+            self._manifest(name, version)
+        slot = self._slots[name]
+        if not slot.swapping.acquire(blocking=False):
+            raise ModelVersionError(f"A new version of '{name}' is already loading", 409)
+        slot.pending = {"version": version, "state": LOADING, "error": None}
+        if background:
+            threading.Thread(target=self._swap, args=(name, version, history), name=f"swap-{name}", daemon=True).start()
+        else:
+            self._swap(name, version, history)
+        return dict(slot.pending)
+
+    def activate(self, name: str, version: str, background: bool = True) -> Dict[str, Any]:
+        """Loads, verifies and warms ``version``, then swaps it in and records it as active.
+
+        Runs in a daemon thread unless ``background`` is False; the returned
+        state (and ``status()``) tells whether the swap is loading, ready or failed.
+        """
+        self._spec(name)
+        self._read_state()
+        history = [v for v in self._state.get(name, {}).get("history", []) if v != version]
+        return self._start_swap(name, version, history + [version], background)
+
+    def rollback(self, name: str, background: bool = True) -> Dict[str, Any]:
+        """Swaps back to the version activated before the current one (the builtin files at the start)."""
+        self._spec(name)
+        self._read_state()
+        history = self._state.get(name, {}).get("history", [])[:-1]
+        if not history and self._wanted(name).startswith(BUILTIN):
+            raise ModelVersionError(f"Model '{name}' has no earlier version to roll back to", 409)
+        return self._start_swap(name, history[-1] if history else BUILTIN, history, background)
+
+    def status(self) -> Dict[str, Any]:
+        self._poll()
+        report = {}
+        for name, slot in self._slots.items():
+            current = slot.current
+            report[name] = {
+                "active": self._wanted(name),
+                "loaded": None if current is None else {
+                    "version": current.version,
+                    "checksums": current.checksums,
+                    "loaded_at": current.loaded_at.isoformat(),
+                },
+                "pending": slot.pending,
+                "history": self._state.get(name, {}).get("history", []),
+            }
+        return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    register = commands.add_parser("register", help="copy files in as a new version")
+    register.add_argument("model")
+    register.add_argument("files", nargs="+", type=Path)
+    register.add_argument("--version")
+    register.add_argument("--note")
+    listing = commands.add_parser("list", help="show the registered versions")
+    listing.add_argument("model", nargs="?")
+    args = parser.parse_args()
+
+    from app.utils.ai_helpers import get_model_registry
+
+    registry = get_model_registry()
+    if args.command == "register":
+        print(json.dumps(registry.register(args.model, args.files, args.version, args.note), indent=2))
+    else:
+        names = [args.model] if args.model else list(registry.specs)
+        print(json.dumps({name: registry.versions(name) for name in names}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
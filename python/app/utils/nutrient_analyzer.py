@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, List
+
+import numpy as np
+
+from app.utils.image_preprocessing import DecodedImage
+
+# Medium-intensity range (of the min-max normalized grey level) that indicates possible deficiency
+MEDIUM_RED_MIN = 0.75
+MEDIUM_RED_MAX = 0.9
+
+
+def _channel_sum(arr: np.ndarray, tile_rows: int) -> np.ndarray:
+    """Sum of the RGB channels (3x the channel mean) as uint16, built one band of rows at a time."""
+    out = np.empty(arr.shape[:2], dtype=np.uint16)
+    if arr.ndim == 2:
+        np.multiply(arr, 3, out=out, dtype=np.uint16)
+        return out
+    for top in range(0, arr.shape[0], tile_rows):
+        band = arr[top:top + tile_rows]
+        np.add(band[..., 0], band[..., 1], out=out[top:top + tile_rows], dtype=np.uint16)
+        out[top:top + tile_rows] += band[..., 2]
+    return out
+
+
+def deficiency_mask(arr: np.ndarray, tile_rows: int = 512) -> np.ndarray:
+    """Pixels whose min-max normalized grey level lies in [MEDIUM_RED_MIN, MEDIUM_RED_MAX].
+
+    The normalization is folded into integer thresholds on the channel sum,
+    so no float image is ever materialized.
+    """
+    channel_sum = _channel_sum(arr, tile_rows)
+    low, high = int(channel_sum.min()), int(channel_sum.max())
+    span = high - low + 3e-8  # 1e-8 on the mean scale
+    lower = low + math.ceil(MEDIUM_RED_MIN * span)
+    upper = low + math.floor(MEDIUM_RED_MAX * span)
+
+    mask = np.empty(channel_sum.shape, dtype=bool)
+    for top in range(0, channel_sum.shape[0], tile_rows):
+        band = channel_sum[top:top + tile_rows]
+        np.greater_equal(band, lower, out=mask[top:top + tile_rows])
+        mask[top:top + tile_rows] &= band <= upper
+    return mask
+
+
+def find_regions(
+    decoded: DecodedImage,
+    min_region_pixels: int = 0,
+    tile_rows: int = 512,
+) -> List[Dict[str, int]]:
+    """Bounding boxes and areas of candidate deficiency regions, in original-image coordinates.
+
+    ``decoded`` may be a reduced-resolution decode (see ``decode_image``); the
+    boxes are scaled back up to the original size.
+    """
+    from scipy import ndimage  # slow to import; only needed once an image arrives
+
+    scale_x, scale_y = decoded.scale
+    width, height = decoded.original_size
+    mask = deficiency_mask(decoded.array, tile_rows)
+
+    labeled, count = ndimage.label(mask)
+    if not count:
+        return []
+    areas = np.bincount(labeled.ravel(), minlength=count + 1)[1:]
+    slices = ndimage.find_objects(labeled)
+
+    boxes = np.array(
+        [(sl[1].start, sl[1].stop, sl[0].start, sl[0].stop) for sl in slices],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    keep = areas >= max(1, min_region_pixels)
+    boxes, areas = boxes[keep], areas[keep]
+
+    # Map back to the full-resolution image
+    boxes[:, 0] = np.floor(boxes[:, 0] * scale_x)
+    boxes[:, 1] = np.minimum(np.ceil(boxes[:, 1] * scale_x), width)
+    boxes[:, 2] = np.floor(boxes[:, 2] * scale_y)
+    boxes[:, 3] = np.minimum(np.ceil(boxes[:, 3] * scale_y), height)
+    scaled_areas = np.rint(areas * (scale_x * scale_y))
+
+    return [
+        {"x_start": x0, "x_stop": x1, "y_start": y0, "y_stop": y1, "area": area}
+        for (x0, x1, y0, y1), area in zip(boxes.astype(np.int64).tolist(), scaled_areas.astype(np.int64).tolist())
+    ]
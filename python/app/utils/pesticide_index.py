@@ -0,0 +1,218 @@
+"""Pest name -> pesticide recommendation index, compiled from data/Pesticides.csv.
+
+The CSV is parsed once into a small JSON artifact (names, deduplicated
+recommendations, normalized keys and trigram postings) stamped with the CSV's
+hash; later loads read the artifact and rebuild it only when the CSV changes.
+
+    python -m app.utils.pesticide_index     # build the artifact ahead of time
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from app.core.config import get_settings
+
+ROOT_DIR = Path(__file__).resolve().parents[2]  # points to python/
+CSV_PATH = ROOT_DIR / "data" / "Pesticides.csv"
+NAME_COLUMN = "Pest Name"
+RECOMMENDATION_COLUMN = "Most Commonly Used Pesticides"
+NO_RECOMMENDATION = "No Recommendation"
+FORMAT_VERSION = 1
+
+# Fuzzy matching scores at most this many trigram candidates by edit distance
+FUZZY_CANDIDATES = 20
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(name: str) -> str:
+    """Lowercase ASCII words separated by single spaces ("Aphis  gossypii (Glover)" -> "aphis gossypii glover")."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", ascii_name.lower()).strip()
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """1 - Levenshtein distance / length of the longer string."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return 1.0 - previous[-1] / max(len(a), len(b))
+
+
+@dataclass
+class Match:
+    name: str
+    recommendation: str
+    match: str  # exact, normalized, partial or fuzzy
+    score: float
+
+
+class PesticideIndex:
+    def __init__(self, names: List[str], recommendations: List[str], entries: List[int], grams: Dict[str, List[int]]) -> None:
+        self.names = names
+        self.recommendations = recommendations  # distinct recommendation strings
+        self.entries = entries  # per name: position in recommendations
+        self.grams = grams  # trigram -> names containing it
+        self.keys = [normalize(name) for name in names]
+        self._exact = {name: i for i, name in enumerate(names)}
+        self._normalized: Dict[str, int] = {}
+        for i, key in enumerate(self.keys):
+            self._normalized.setdefault(key, i)
+
+    @classmethod
+    def from_csv(cls, path: Path = CSV_PATH) -> "PesticideIndex":
+        names: List[str] = []
+        recommendations: List[str] = []
+        entries: List[int] = []
+        positions: Dict[str, int] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                name = (row.get(NAME_COLUMN) or "").strip()
+                if not name:
+                    continue
+                recommendation = (row.get(RECOMMENDATION_COLUMN) or "").strip() or NO_RECOMMENDATION
+                names.append(name)
+                entries.append(positions.setdefault(recommendation, len(positions)))
+                if entries[-1] == len(recommendations):
+                    recommendations.append(recommendation)
+        grams: Dict[str, List[int]] = {}
+        for i, name in enumerate(names):
+            for gram in sorted(trigrams(normalize(name))):
+                grams.setdefault(gram, []).append(i)
+        return cls(names, recommendations, entries, grams)
+
+    def to_dict(self, source: str) -> dict:
+        return {
+            "version": FORMAT_VERSION,
+            "source": source,
+            "names": self.names,
+            "recommendations": self.recommendations,
+            "entries": self.entries,
+            "grams": self.grams,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PesticideIndex":
+        return cls(data["names"], data["recommendations"], data["entries"], data["grams"])
+
+    def recommendation(self, i: int) -> str:
+        return self.recommendations[self.entries[i]]
+
+    def _match(self, i: int, kind: str, score: float) -> Match:
+        return Match(self.names[i], self.recommendation(i), kind, round(score, 3))
+
+    def _fuzzy(self, key: str, cutoff: float) -> List[Match]:
+        shared: Dict[int, int] = {}
+        for gram in trigrams(key):
+            for i in self.grams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        candidates = sorted(shared, key=lambda i: -shared[i])[:FUZZY_CANDIDATES]
+        matches = [self._match(i, "fuzzy", similarity(key, self.keys[i])) for i in candidates]
+        return sorted((m for m in matches if m.score >= cutoff), key=lambda m: -m.score)
+
+    def lookup(self, name: str, cutoff: float | None = None) -> Match | None:
+        """Best entry for ``name``: exact, then normalized, then the closest fuzzy match above ``cutoff``."""
+        if name in self._exact:
+            return self._match(self._exact[name], "exact", 1.0)
+        key = normalize(name)
+        if key in self._normalized:
+            return self._match(self._normalized[key], "normalized", 1.0)
+        if cutoff is None:
+            cutoff = get_settings().PESTICIDE_MATCH_CUTOFF
+        fuzzy = self._fuzzy(key, cutoff) if key else []
+        return fuzzy[0] if fuzzy else None
+
+    def search(self, query: str, limit: int = 10, cutoff: float | None = None) -> List[Match]:
+        """Entries for a free-text query: exact and normalized hits, names containing it, then fuzzy matches."""
+        key = normalize(query)
+        if not key:
+            return []
+        if cutoff is None:
+            cutoff = get_settings().PESTICIDE_MATCH_CUTOFF
+        results: Dict[int, Match] = {}
+        if query.strip() in self._exact:
+            results[self._exact[query.strip()]] = self._match(self._exact[query.strip()], "exact", 1.0)
+        if key in self._normalized:
+            results.setdefault(self._normalized[key], self._match(self._normalized[key], "normalized", 1.0))
+        for i, candidate in enumerate(self.keys):
+            if key in candidate and i not in results:
+                results[i] = self._match(i, "partial", len(key) / len(candidate))
+        partial = sorted((m for m in results.values() if m.match == "partial"), key=lambda m: -m.score)
+        ranked = [m for m in results.values() if m.match != "partial"] + partial
+        for match in self._fuzzy(key, cutoff):
+            if len(ranked) >= limit:
+                break
+            if all(m.name != match.name for m in ranked):
+                ranked.append(match)
+        return ranked[:limit]
+
+    def for_classes(self, classes: Sequence[str]) -> List[str]:
+        """Recommendation for each class index, or NO_RECOMMENDATION when nothing matches."""
+        recommendations = []
+        for name in classes:
+            match = self.lookup(name)
+            recommendations.append(match.recommendation if match else NO_RECOMMENDATION)
+        return recommendations
+
+
+def index_path() -> Path:
+    configured = get_settings().PESTICIDE_INDEX_PATH
+    return Path(configured) if configured else ROOT_DIR / "models" / "pesticide_index.json"
+
+
+def _csv_digest(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()[:12]
+
+
+def build_index(csv_path: Path = CSV_PATH, path: Path | None = None) -> PesticideIndex:
+    path = path or index_path()
+    index = PesticideIndex.from_csv(csv_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, so concurrent workers never read half a file
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index.to_dict(_csv_digest(csv_path)), separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+    return index
+
+
+@lru_cache
+def get_pesticide_index() -> PesticideIndex:
+    """The compiled index, rebuilt from the CSV when the artifact is missing or stale."""
+    path = index_path()
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") == FORMAT_VERSION and data.get("source") == _csv_digest(CSV_PATH):
+            return PesticideIndex.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        return build_index()
+    except OSError:
+        # Read-only model directory: serve from the CSV without caching the artifact
+        return PesticideIndex.from_csv(CSV_PATH)
+
+
+if __name__ == "__main__":
+    built = build_index()
+    print(f"{len(built.names)} pests, {len(built.recommendations)} distinct recommendations -> {index_path()}")
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import Any, List, Tuple
+
+import numpy as np
+
+# Rows evaluated at a time; keeps the per-chunk (rows, trees) masks in cache
+CHUNK_ROWS = 256
+# Compiled forests whose lookup tables would exceed this stay on sklearn
+MAX_TABLE_BYTES = 64 * 1024 * 1024
+
+_MASK_DTYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+class CompiledForest:
+    """Array form of a fitted single-output tree regressor (a forest or one tree).
+
+    Evaluation follows QuickScorer: each tree's leaves are numbered left to
+    right, and every split whose test fails (x > threshold) clears the leaves
+    of its left subtree from a per-tree bitmask. The exit leaf is then the
+    lowest bit still set. Splits are grouped by feature and sorted by
+    threshold, so for each feature the failed splits of a row are a prefix of
+    that list, and the ANDed masks of every prefix are precomputed. A
+    prediction is one searchsorted and one table lookup per feature, with no
+    per-node branching and none of sklearn's validation or per-tree dispatch.
+
+    searchsorted would send NaN and infinity past every threshold, so inputs
+    that are not finite are refused with ValueError, as sklearn refuses
+    infinity, rather than predicted.
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        thresholds: List[np.ndarray],
+        masks: List[np.ndarray],
+        leaf_values: np.ndarray,
+    ) -> None:
+        self.n_features = n_features
+        self.thresholds = thresholds  # per feature: sorted split thresholds
+        self.masks = masks  # per feature: (splits + 1, trees) ANDed masks of each prefix
+        self.leaf_values = leaf_values.ravel()  # (trees * max_leaves,)
+        self.n_trees, self.max_leaves = leaf_values.shape
+        self._leaf_offsets = np.arange(self.n_trees) * self.max_leaves
+        self._features = [f for f in range(n_features) if len(thresholds[f])]
+        self._all_leaves = masks[0].dtype.type(np.iinfo(masks[0].dtype).max)
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "CompiledForest":
+        from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+        from sklearn.tree import DecisionTreeRegressor
+
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees = [est.tree_ for est in model.estimators_]
+        elif isinstance(model, DecisionTreeRegressor):
+            trees = [model.tree_]
+        else:
+            raise TypeError(f"Cannot compile {type(model).__name__}")
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only single-output regressors can be compiled")
+        max_leaves = max(tree.n_leaves for tree in trees)
+        dtype = next((d for d in _MASK_DTYPES if np.iinfo(d).bits >= max_leaves), None)
+        if dtype is None:
+            raise ValueError(f"Trees with {max_leaves} leaves are too large to compile")
+        n_features = model.n_features_in_
+
+        leaf_values = np.zeros((len(trees), max_leaves))
+        splits: List[List[Tuple[float, int, int]]] = [[] for _ in range(n_features)]
+        for t, tree in enumerate(trees):
+            _number_leaves(tree, t, leaf_values, splits)
+
+        table_bytes = sum(len(s) + 1 for s in splits) * len(trees) * np.dtype(dtype).itemsize
+        if table_bytes > MAX_TABLE_BYTES:
+            raise ValueError(f"Lookup tables would take {table_bytes} bytes")
+        full = np.iinfo(dtype).max
+        thresholds, masks = [], []
+        for feature_splits in splits:
+            feature_splits.sort(key=lambda split: split[0])
+            table = np.full((len(feature_splits) + 1, len(trees)), full, dtype=dtype)
+            for i, (_, t, mask) in enumerate(feature_splits, start=1):
+                table[i] = table[i - 1]
+                table[i, t] &= dtype(mask & int(full))
+            thresholds.append(np.array([split[0] for split in feature_splits], dtype=np.float64))
+            masks.append(table)
+        return cls(n_features, thresholds, masks, leaf_values)
+
+    def predict(self, X: Any) -> np.ndarray:
+        # sklearn compares float32 inputs against float64 thresholds; do the same for identical splits
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        # After the cast, so values too large for float32 are caught too, as sklearn does
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN, infinity or a value too large for dtype('float32')")
+        out = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            alive = np.full((chunk.shape[0], self.n_trees), self._all_leaves)
+            for f in self._features:
+                # Splits with threshold < x are exactly the ones this row fails
+                failed = np.searchsorted(self.thresholds[f], chunk[:, f], side="left")
+                alive &= self.masks[f].take(failed, axis=0)
+            lowest = alive & (alive.dtype.type(0) - alive)
+            leaf = np.frexp(lowest.astype(np.float64))[1] - 1
+            out[start:start + chunk.shape[0]] = self.leaf_values.take(leaf + self._leaf_offsets).mean(axis=1)
+        return out
+
+
+def _number_leaves(tree: Any, t: int, leaf_values: np.ndarray, splits: List[list]) -> None:
+    """Numbers ``tree``'s leaves left to right and records (threshold, tree, mask) for each split."""
+    left, right = tree.children_left, tree.children_right
+    next_leaf = 0
+
+    def walk(node: int) -> Tuple[int, int]:
+        nonlocal next_leaf
+        if left[node] < 0:
+            leaf_values[t, next_leaf] = tree.value[node, 0, 0]
+            next_leaf += 1
+            return next_leaf - 1, next_leaf - 1
+        first, last = walk(left[node])
+        _, end = walk(right[node])
+        # Failing this split rules out the left subtree's leaves
+        left_leaves = ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+        splits[tree.feature[node]].append((float(tree.threshold[node]), t, ~left_leaves))
+        return first, end
+
+    walk(0)
+
+
+def compile_regressor(model: Any) -> Any:
+    """A CompiledForest for tree regressors; any other estimator is returned unchanged."""
+    try:
+        return CompiledForest.from_sklearn(model)
+    except (TypeError, ValueError):
+        return model
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Sequence
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+from app.utils.image_preprocessing import ImageRejectedError
+
+CHUNK_BYTES = 256 * 1024
+# Give up looking for dimensions in the header after this many bytes (large EXIF blocks
+# can push a JPEG's frame header back); the decoder still enforces the pixel limit.
+HEADER_SCAN_BYTES = 512 * 1024
+
+IMAGE_FORMATS = ("jpeg", "png", "webp", "bmp", "tiff")
+
+
+@dataclass
+class Upload:
+    """An upload read into one buffer, with what was learned while reading it."""
+
+    data: memoryview  # read-only view over the received bytes; decoders read it without copying
+    digest: str  # SHA-256 of the bytes
+    format: str
+    size: tuple[int, int] | None  # (width, height) from the header, when it could be parsed
+
+
+def sniff_format(head: bytes | bytearray) -> str | None:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def _jpeg_size(head: bytes | bytearray) -> tuple[int, int] | None:
+    pos = 2
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            return None
+        marker = head[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # markers without a payload
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", head[pos + 2:pos + 4])
+        # Start-of-frame markers, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(head):
+                return None
+            height, width = struct.unpack(">HH", head[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def _webp_size(head: bytes | bytearray) -> tuple[int, int] | None:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30 and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25 and head[20] == 0x2F:
+        (bits,) = struct.unpack("<I", head[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(head) >= 30:
+        return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    return None
+
+
+def header_size(fmt: str, head: bytes | bytearray) -> tuple[int, int] | None:
+    """(width, height) read from the first bytes of an image, or None if they are not there (yet)."""
+    if fmt == "jpeg":
+        return _jpeg_size(head)
+    if fmt == "png" and len(head) >= 24 and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    if fmt == "webp":
+        return _webp_size(head)
+    if fmt == "bmp" and len(head) >= 26:
+        width, height = struct.unpack("<ii", head[18:26])
+        return abs(width), abs(height)
+    return None
+
+
+def ingest(
+    stream: BinaryIO,
+    size_hint: int | None = None,
+    max_bytes: int | None = None,
+    max_pixels: int | None = None,
+    formats: Sequence[str] = IMAGE_FORMATS,
+) -> Upload:
+    """Reads an image from ``stream`` in chunks, rejecting it as early as the bytes allow.
+
+    Oversized files fail before (when the size is known) or as soon as the
+    limit is crossed, unsupported formats after the first chunk, and
+    oversized dimensions once the header has been read, all without
+    buffering the rest of the file. The content hash is computed on the way.
+    """
+    settings = get_settings()
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    max_pixels = settings.MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+    if max_bytes and size_hint is not None and size_hint > max_bytes:
+        raise ImageRejectedError(f"Image is larger than {max_bytes} bytes", status_code=413)
+
+    # Filled in place when the size is known up front, so the bytes are copied exactly once
+    buffer = bytearray(size_hint or 0)
+    hasher = hashlib.sha256()
+    fmt = None
+    size = None
+    length = 0
+    while True:
+        if length < len(buffer):
+            with memoryview(buffer) as view:
+                read = stream.readinto(view[length:length + CHUNK_BYTES])
+                hasher.update(view[length:length + read])
+        else:
+            chunk = stream.read(CHUNK_BYTES)
+            read = len(chunk)
+            hasher.update(chunk)
+            buffer += chunk
+        if not read:
+            break
+        length += read
+        if max_bytes and length > max_bytes:
+            raise ImageRejectedError(f"Image is larger than {max_bytes} bytes", status_code=413)
+
+        if fmt is None and length >= 16:
+            fmt = sniff_format(buffer[:16])
+            if fmt not in formats:
+                raise ImageRejectedError(
+                    f"Unsupported image format; expected one of: {', '.join(formats)}", status_code=415
+                )
+        if fmt is not None and size is None and length <= HEADER_SCAN_BYTES:
+            size = header_size(fmt, buffer[:length])
+            if size and max_pixels and size[0] * size[1] > max_pixels:
+                raise ImageRejectedError(
+                    f"Image is {size[0]}x{size[1]}; the limit is {max_pixels} pixels", status_code=413
+                )
+
+    if fmt is None:
+        raise ImageRejectedError("Unsupported or corrupt image file", status_code=415)
+    del buffer[length:]
+    return Upload(data=memoryview(buffer).toreadonly(), digest=hasher.hexdigest(), format=fmt, size=size)
+
+
+async def read_image_upload(upload: UploadFile, formats: Sequence[str] = IMAGE_FORMATS) -> Upload:
+    """Streams an UploadFile through ``ingest`` in a thread, as UploadFile.read does."""
+    return await run_in_threadpool(ingest, upload.file, upload.size, formats=formats)
@@ -0,0 +1,41 @@
+"""Re-score an image archive offline.
+
+    python batch_score.py survey.tar.gz results.jsonl --workers 4
+    python batch_score.py images/ results.parquet --analyses pest disease --resume
+"""
+import argparse
+import json
+
+from dotenv import load_dotenv
+
+
+def main() -> None:
+    load_dotenv()
+    from app.services.archive_scoring_service import ANALYSES, score_archive
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory of images or a (compressed) tar file")
+    parser.add_argument("output", help="a .jsonl file or a .parquet directory")
+    parser.add_argument("--analyses", nargs="+", default=list(ANALYSES), choices=list(ANALYSES))
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="math threads per worker (0 = CPUs / workers)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="images sent to a worker at a time")
+    parser.add_argument("--resume", action="store_true", help="skip images already scored without an error")
+    parser.add_argument("--progress-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    summary = score_archive(
+        args.source,
+        args.output,
+        analyses=args.analyses,
+        workers=args.workers or None,
+        threads_per_worker=args.threads_per_worker or None,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        progress_seconds=args.progress_seconds,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
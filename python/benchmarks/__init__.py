@@ -0,0 +1 @@
+# Benchmarks: run from the python/ directory, e.g. python -m benchmarks.backends
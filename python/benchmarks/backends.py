@@ -0,0 +1,157 @@
+"""Parity and latency/memory comparison of the CNN inference backends.
+
+Each backend runs in a fresh process so its resident memory can be measured
+on its own. Outputs are compared against the native torch/keras model; the
+run exits non-zero when a backend's largest output difference is over its
+tolerance or its top-1 predictions agree with the native ones too rarely.
+
+    python -m benchmarks.backends --models pest disease --batch-sizes 1 8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BACKENDS = {
+    "native": {"INFERENCE_BACKEND": "native"},
+    "onnx": {"INFERENCE_BACKEND": "onnx", "ONNX_QUANTIZE_INT8": "false"},
+    "onnx-int8": {"INFERENCE_BACKEND": "onnx", "ONNX_QUANTIZE_INT8": "true"},
+}
+
+
+def _inputs(model: str, batch_size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed + batch_size)
+    if model == "pest":
+        return rng.standard_normal((batch_size, 3, 224, 224), dtype=np.float32)
+    return rng.integers(0, 256, (batch_size, 256, 256, 3), dtype=np.uint8)
+
+
+def _run_backend(backend: str, models: list, batch_sizes: list, iterations: int, threads: int, queue) -> None:
+    os.environ.update(BACKENDS[backend])
+    if threads:
+        os.environ["ONNX_INTRA_OP_THREADS"] = str(threads)
+    from app.utils.ai_helpers import disease_probabilities, import_framework, pest_logits
+
+    torch = import_framework("torch")
+    if threads:
+        torch.set_num_threads(threads)
+
+    def infer(model, batch):
+        if model == "pest":
+            return pest_logits(torch.from_numpy(batch))
+        return disease_probabilities(batch)
+
+    report = {"backend": backend, "models": {}}
+    try:
+        for model in models:
+            started = time.perf_counter()
+            infer(model, _inputs(model, 1))
+            entry = {"first_call_ms": round(1000 * (time.perf_counter() - started), 2), "batches": {}}
+            for batch_size in batch_sizes:
+                batch = _inputs(model, batch_size)
+                outputs = infer(model, batch)
+                timings = []
+                for _ in range(iterations):
+                    t0 = time.perf_counter()
+                    infer(model, batch)
+                    timings.append(1000 * (time.perf_counter() - t0))
+                timings.sort()
+                entry["batches"][batch_size] = {
+                    "p50_ms": round(statistics.median(timings), 3),
+                    "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+                    "images_per_sec": round(1000 * batch_size / statistics.mean(timings), 1),
+                    "outputs": np.asarray(outputs, dtype=np.float32).tolist(),
+                }
+            report["models"][model] = entry
+        report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+    queue.put(report)
+
+
+def run(backends: list, models: list, batch_sizes: list, iterations: int, threads: int) -> dict:
+    ctx = mp.get_context("spawn")
+    reports = {}
+    for backend in backends:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_backend, args=(backend, models, batch_sizes, iterations, threads, queue))
+        proc.start()
+        reports[backend] = queue.get()
+        proc.join()
+
+    reference = reports.get("native", {}).get("models", {})
+    for backend, report in reports.items():
+        for model, entry in report.get("models", {}).items():
+            for batch_size, stats in entry["batches"].items():
+                outputs = np.asarray(stats.pop("outputs"))
+                ref = reference.get(model, {}).get("batches", {}).get(batch_size, {}).get("_outputs")
+                if backend == "native":
+                    stats["_outputs"] = outputs
+                    continue
+                if ref is not None:
+                    stats["max_abs_diff"] = float(np.max(np.abs(outputs - ref)))
+                    stats["top1_agreement"] = float(np.mean(outputs.argmax(axis=1) == ref.argmax(axis=1)))
+    for report in reports.values():
+        for entry in report.get("models", {}).values():
+            for stats in entry["batches"].values():
+                stats.pop("_outputs", None)
+    return reports
+
+
+def parity_failures(reports: dict, tolerance: float, int8_tolerance: float, min_agreement: float) -> list:
+    failures = []
+    for backend, report in reports.items():
+        if backend == "native":
+            continue
+        if "error" in report:
+            failures.append(f"{backend}: {report['error']}")
+            continue
+        limit = int8_tolerance if backend.endswith("int8") else tolerance
+        for model, entry in report.get("models", {}).items():
+            for batch_size, stats in entry["batches"].items():
+                if "max_abs_diff" not in stats:
+                    continue
+                if stats["max_abs_diff"] > limit:
+                    failures.append(f"{backend}/{model}/batch {batch_size}: max_abs_diff {stats['max_abs_diff']:.3g} > {limit}")
+                if stats["top1_agreement"] < min_agreement:
+                    failures.append(
+                        f"{backend}/{model}/batch {batch_size}: top1_agreement {stats['top1_agreement']:.3f} < {min_agreement}"
+                    )
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--models", nargs="+", default=["pest", "disease"], choices=["pest", "disease"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads for every backend (0 = default)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="largest output difference for fp32 backends")
+    parser.add_argument("--int8-tolerance", type=float, default=0.5, help="largest output difference for int8 backends")
+    parser.add_argument("--min-agreement", type=float, default=0.9, help="smallest share of matching top-1 predictions")
+    args = parser.parse_args()
+
+    if "native" not in args.backends:
+        args.backends.insert(0, "native")  # parity reference
+    reports = run(args.backends, args.models, args.batch_sizes, args.iterations, args.threads)
+    text = json.dumps(reports, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    failures = parity_failures(reports, args.tolerance, args.int8_tolerance, args.min_agreement)
+    if failures:
+        print("backend outputs differ from the native model:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Parity check and benchmark of the compiled crop regressors against sklearn.
+
+Predictions of the compiled evaluator must match sklearn's on random inputs
+spanning every crop and season, and rows holding NaN or infinity must be
+refused rather than predicted; the run exits non-zero when either fails.
+
+    python -m benchmarks.crop_trees
+    python -m benchmarks.crop_trees --rows 200000 --batch-sizes 1 64 4096
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.endpoints import summarize
+
+
+def random_features(rows: int, crops: int, seasons: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, crops, rows),
+        rng.integers(0, seasons, rows),
+        rng.uniform(0, 45, rows),
+        rng.uniform(0, 100, rows),
+        rng.uniform(3, 9, rows),
+        rng.uniform(0, 1500, rows),
+    ])
+
+
+def non_finite_rows(X: np.ndarray) -> np.ndarray:
+    """Copies of the first row with NaN, +inf and -inf in turn in each reading column."""
+    rows = []
+    for column in range(2, X.shape[1]):
+        for value in (np.nan, np.inf, -np.inf):
+            row = X[0].copy()
+            row[column] = value
+            rows.append(row)
+    return np.array(rows)
+
+
+def _time(fn: Callable[[], Any], min_seconds: float) -> List[float]:
+    fn()
+    timings: List[float] = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        timings.append(1e6 * (time.perf_counter() - started))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="random rows for the parity check")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 1024, 100000])
+    parser.add_argument("--seconds", type=float, default=1.0, help="minimum time per measurement")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    from app.utils.ai_helpers import get_crop_encoder, get_harvest_model, get_season_encoder, get_water_model
+    from app.utils.tree_ensembles import CompiledForest
+
+    X = random_features(args.rows, len(get_crop_encoder().classes_), len(get_season_encoder().classes_))
+    report: Dict[str, Any] = {}
+    failed = False
+    for name, model in (("water", get_water_model()), ("harvest", get_harvest_model())):
+        started = time.perf_counter()
+        compiled = CompiledForest.from_sklearn(model)
+        compile_ms = 1000 * (time.perf_counter() - started)
+
+        error = float(np.abs(compiled.predict(X) - model.predict(X)).max())
+        failed |= error > args.tolerance
+        accepted = 0
+        for row in non_finite_rows(X):
+            try:
+                compiled.predict(row)
+                accepted += 1
+            except ValueError:
+                pass
+        failed |= accepted > 0
+        result: Dict[str, Any] = {
+            "compile_ms": round(compile_ms, 1),
+            "max_abs_error": error,
+            "non_finite_rows_accepted": accepted,
+        }
+        for size in args.batch_sizes:
+            batch = X[:size]
+            sk = summarize(_time(lambda: model.predict(batch), args.seconds))
+            fast = summarize(_time(lambda: compiled.predict(batch), args.seconds))
+            result[f"batch/{size}"] = {
+                "sklearn_p50_us": sk["p50_ms"],
+                "compiled_p50_us": fast["p50_ms"],
+                "speedup": round(sk["p50_ms"] / fast["p50_ms"], 1) if fast["p50_ms"] else None,
+                "compiled_rows_per_sec": round(size / fast["p50_ms"] * 1e6) if fast["p50_ms"] else None,
+            }
+        report[name] = result
+
+    print(json.dumps(report, indent=2))
+    if failed:
+        print(f"compiled predictions differ from sklearn by more than {args.tolerance}, or rows that are not finite were predicted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
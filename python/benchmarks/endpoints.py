@@ -0,0 +1,185 @@
+"""Cold start, single-request latency and saturated throughput of the HTTP endpoints.
+
+Everything runs in one freshly spawned process against the ASGI app (no
+network server), with Mongo, SMTP and Gemini replaced by benchmarks.stubs.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Sequence
+
+from benchmarks.images import leaf_image, unique_variant
+
+IMAGE_ENDPOINTS = ("pest", "disease", "nutrient")
+ENDPOINTS = ("crop", "pest", "disease", "nutrient", "chatbot")
+MODELS = ("crop", "pest", "disease", "nutrient")
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(timings_ms: List[float]) -> Dict[str, float]:
+    values = sorted(timings_ms)
+    return {
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def _request(endpoint: str, resolution: str, index: int) -> Dict[str, Any]:
+    """Keyword arguments for ``client.post``; uploads differ per index so caches never answer."""
+    if endpoint == "crop":
+        crops = ("rice", "maize", "cotton")
+        return {
+            "url": "/predict_crop",
+            "json": {
+                "crop": crops[index % len(crops)],
+                "season": "rainy",
+                "temperature": 20 + index % 15,
+                "humidity": 40 + index % 50,
+                "ph": 5.5 + (index % 20) / 10,
+                "avg_water": 300 + index % 400,
+            },
+        }
+    if endpoint == "chatbot":
+        return {"url": "/chatbot", "json": {"message": f"How do I improve soil health on plot {index}?"}}
+    image = unique_variant(leaf_image(resolution), index)
+    files = {"image": (f"leaf-{index}.jpg", image, "image/jpeg")}
+    if endpoint == "pest":
+        return {"url": "/predict_pest", "files": files}
+    if endpoint == "disease":
+        return {"url": "/disease-prediction", "files": files}
+    return {
+        "url": "/predict_nutrient_deficiency",
+        "files": files,
+        "data": {"mobile_number": "9999999999", "email": f"bench{index % 5}@example.com"},
+    }
+
+
+async def _timed(client: Any, endpoint: str, resolution: str, index: int) -> tuple:
+    started = time.perf_counter()
+    response = await client.post(**_request(endpoint, resolution, index))
+    return 1000 * (time.perf_counter() - started), response.status_code
+
+
+async def measure_latency(client: Any, endpoint: str, resolution: str, iterations: int, offset: int) -> Dict[str, Any]:
+    """Sequential requests: the latency of one request on an otherwise idle server."""
+    timings, statuses = [], Counter()
+    for i in range(iterations):
+        elapsed, status = await _timed(client, endpoint, resolution, offset + i)
+        timings.append(elapsed)
+        statuses[status] += 1
+    return {**summarize(timings), "requests": iterations, "statuses": dict(statuses)}
+
+
+async def measure_throughput(
+    client: Any, endpoint: str, resolution: str, concurrency: int, total: int, offset: int
+) -> Dict[str, Any]:
+    """``concurrency`` clients issuing ``total`` requests back to back."""
+    timings: List[float] = []
+    statuses: Counter = Counter()
+    next_index = iter(range(offset, offset + total))
+
+    async def worker() -> None:
+        for index in next_index:
+            elapsed, status = await _timed(client, endpoint, resolution, index)
+            statuses[status] += 1
+            if status == 200:
+                timings.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        **summarize(timings),
+        "requests": total,
+        "concurrency": concurrency,
+        "requests_per_sec": round(statuses.get(200, 0) / elapsed, 2) if elapsed else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+def _cases(endpoints: Sequence[str], resolutions: Sequence[str]) -> List[tuple]:
+    cases = []
+    for endpoint in endpoints:
+        for resolution in (resolutions if endpoint in IMAGE_ENDPOINTS else ("-",)):
+            cases.append((endpoint, resolution))
+    return cases
+
+
+async def _run(options: Dict[str, Any], started: float, imported: float) -> Dict[str, Any]:
+    import httpx
+
+    from app.main import app, shutdown_event, startup_event
+    from app.services.warmup_service import is_ready, model_status
+    from benchmarks.stubs import install_mongo
+
+    install_mongo()
+    await startup_event()
+    while not is_ready(MODELS):
+        if any(status["state"] == "failed" for status in model_status().values()):
+            raise RuntimeError(f"Model warm-up failed: {model_status()}")
+        await asyncio.sleep(0.05)
+    ready = time.perf_counter()
+
+    report: Dict[str, Any] = {
+        "cold_start": {
+            "import_seconds": round(imported - started, 3),
+            "ready_seconds": round(ready - started, 3),
+            "models": model_status(),
+            "first_request_ms": {},
+        },
+        "latency": {},
+        "throughput": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        cases = _cases(options["endpoints"], options["resolutions"])
+        offset = 0
+        for endpoint, resolution in cases:
+            elapsed, status = await _timed(client, endpoint, resolution, offset)
+            offset += 1
+            report["cold_start"]["first_request_ms"][f"{endpoint}/{resolution}"] = round(elapsed, 3)
+        for endpoint, resolution in cases:
+            report["latency"][f"{endpoint}/{resolution}"] = await measure_latency(
+                client, endpoint, resolution, options["iterations"], offset
+            )
+            offset += options["iterations"]
+        for endpoint, resolution in cases:
+            report["throughput"][f"{endpoint}/{resolution}"] = await measure_throughput(
+                client, endpoint, resolution, options["concurrency"], options["requests"], offset
+            )
+            offset += options["requests"]
+    await shutdown_event()
+    return report
+
+
+def _child(options: Dict[str, Any], env: Dict[str, str], queue: Any) -> None:
+    started = time.perf_counter()
+    os.environ.update(env)
+    try:
+        import app.main  # noqa: F401  (timed as part of the cold start)
+
+        imported = time.perf_counter()
+        queue.put(asyncio.run(_run(options, started, imported)))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run(options: Dict[str, Any], env: Dict[str, str], spawn: Callable) -> Dict[str, Any]:
+    """Runs the endpoint benchmarks in a fresh process created by ``spawn`` (a multiprocessing context)."""
+    queue = spawn.Queue()
+    proc = spawn.Process(target=_child, args=(options, env, queue))
+    proc.start()
+    report = queue.get()
+    proc.join()
+    return report
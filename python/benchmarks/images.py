@@ -0,0 +1,43 @@
+"""Deterministic synthetic leaf photos at several resolutions."""
+import io
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "small": (320, 240),
+    "medium": (1280, 960),
+    "large": (4000, 3000),
+}
+
+
+@lru_cache
+def leaf_image(resolution: str, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """A green, textured frame with a few brown blotches, encoded as ``fmt``."""
+    width, height = RESOLUTIONS[resolution]
+    rng = np.random.default_rng(seed)
+    # Build at low resolution and upscale so large images are cheap to generate
+    small_w, small_h = max(8, width // 8), max(8, height // 8)
+    base = np.empty((small_h, small_w, 3), dtype=np.float32)
+    base[..., 0] = 60 + 30 * rng.random((small_h, small_w))
+    base[..., 1] = 120 + 60 * rng.random((small_h, small_w))
+    base[..., 2] = 40 + 20 * rng.random((small_h, small_w))
+    yy, xx = np.mgrid[0:small_h, 0:small_w]
+    for _ in range(6):
+        cy, cx = rng.integers(0, small_h), rng.integers(0, small_w)
+        radius = rng.integers(2, max(3, min(small_h, small_w) // 6))
+        spot = (yy - cy) ** 2 + (xx - cx) ** 2 <= radius ** 2
+        base[spot] = (150, 100, 50)
+    img = Image.fromarray(base.clip(0, 255).astype(np.uint8)).resize((width, height), Image.BILINEAR)
+    noise = rng.integers(-8, 9, (height, width, 3), dtype=np.int16)
+    img = Image.fromarray((np.asarray(img, dtype=np.int16) + noise).clip(0, 255).astype(np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=90) if fmt == "JPEG" else img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def unique_variant(data: bytes, index: int) -> bytes:
+    """Same image with a few trailing bytes so content-addressed caches see a new upload."""
+    return data + index.to_bytes(4, "big")
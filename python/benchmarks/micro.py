@@ -0,0 +1,72 @@
+"""Microbenchmarks of the ai_helpers preprocessing/inference functions and the nutrient pipeline."""
+import os
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from benchmarks.endpoints import summarize
+from benchmarks.images import leaf_image
+
+
+def _bench(fn: Callable[[], Any], iterations: int, min_seconds: float = 0.0) -> Dict[str, Any]:
+    fn()  # warm caches and lazy imports
+    timings: List[float] = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < iterations or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        timings.append(1000 * (time.perf_counter() - started))
+    return {**summarize(timings), "iterations": len(timings)}
+
+
+def _cases(resolutions: Sequence[str]) -> Dict[str, Callable[[], Any]]:
+    import numpy as np
+
+    from app.schemas.crop_schema import CropRequest
+    from app.services.crop_service import _predict as crop_predict
+    from app.services.nutrient_service import _analyze as nutrient_analyze
+    from app.utils.ai_helpers import (
+        disease_predict_from_array,
+        disease_preprocess,
+        pest_predict_batch,
+        pest_preprocess,
+    )
+    from app.utils.image_preprocessing import PEST_INPUT_SIZE, decode_image, normalize_pest_batch
+
+    crop_request = CropRequest(crop="rice", season="rainy", temperature=25, humidity=60, ph=6.5, avg_water=500)
+    pest_images = [np.zeros((PEST_INPUT_SIZE, PEST_INPUT_SIZE, 3), dtype=np.uint8)] * 8
+    disease_input = np.zeros((1, 256, 256, 3), dtype=np.uint8)
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "crop_predict": lambda: crop_predict(crop_request),
+        "normalize_pest_batch/8": lambda: normalize_pest_batch(pest_images),
+        "pest_predict_batch/1": lambda: pest_predict_batch(pest_images[:1]),
+        "pest_predict_batch/8": lambda: pest_predict_batch(pest_images),
+        "disease_predict_from_array": lambda: disease_predict_from_array(disease_input),
+    }
+    for resolution in resolutions:
+        data = leaf_image(resolution)
+        cases[f"decode_image/{resolution}"] = lambda data=data: decode_image(data)
+        cases[f"pest_preprocess/{resolution}"] = lambda data=data: pest_preprocess(data)
+        cases[f"disease_preprocess/{resolution}"] = lambda data=data: disease_preprocess(data)
+        cases[f"nutrient_analyze/{resolution}"] = lambda data=data: nutrient_analyze(data)
+    return cases
+
+
+def _child(resolutions: Sequence[str], iterations: int, env: Dict[str, str], queue: Any) -> None:
+    os.environ.update(env)
+    try:
+        from app.services.warmup_service import warm_up_models
+
+        warm_up_models(("crop", "pest", "disease", "nutrient"))
+        queue.put({name: _bench(fn, iterations) for name, fn in _cases(resolutions).items()})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run(resolutions: Sequence[str], iterations: int, env: Dict[str, str], spawn: Any) -> Dict[str, Any]:
+    queue = spawn.Queue()
+    proc = spawn.Process(target=_child, args=(list(resolutions), iterations, env, queue))
+    proc.start()
+    report = queue.get()
+    proc.join()
+    return report
@@ -0,0 +1,279 @@
+"""Local stand-ins for Mongo, SMTP and Gemini so benchmarks need no external services.
+
+Mongo is an in-memory, Motor-compatible subset of the collection API (just
+what the app calls), SMTP is a threaded sink that accepts and discards mail,
+and Gemini is the app's own GEMINI_FAKE model.
+"""
+import copy
+import itertools
+import socketserver
+import threading
+from typing import Any, Dict, List, Optional
+
+
+# ---------------------- Mongo ----------------------
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        if key == "$and":
+            if not all(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict) and any(op.startswith("$") for op in cond):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$exists" and (key in doc) != bool(arg):
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > arg:
+                        return False
+                    if op == "$gte" and not value >= arg:
+                        return False
+                    if op == "$lt" and not value < arg:
+                        return False
+                    if op == "$lte" and not value <= arg:
+                        return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [key for key, flag in projection.items() if flag]
+    if included:
+        out = {key: copy.deepcopy(doc[key]) for key in included if key in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {key: copy.deepcopy(value) for key, value in doc.items() if projection.get(key, 1)}
+
+
+def _sorted(docs: List[Dict[str, Any]], sort: Optional[List[tuple]]) -> List[Dict[str, Any]]:
+    for key, direction in reversed(sort or []):
+        docs = sorted(docs, key=lambda d: (d.get(key) is None, d.get(key)), reverse=direction < 0)
+    return docs
+
+
+class _Result:
+    def __init__(self, inserted_id: Any = None, inserted_ids: Optional[List[Any]] = None, matched: int = 0) -> None:
+        self.inserted_id = inserted_id
+        self.inserted_ids = inserted_ids or []
+        self.matched_count = self.modified_count = matched
+
+
+class _Cursor:
+    def __init__(self, docs: List[Dict[str, Any]]) -> None:
+        self._docs = docs
+
+    def sort(self, key: Any, direction: int = 1) -> "_Cursor":
+        self._docs = _sorted(self._docs, key if isinstance(key, list) else [(key, direction)])
+        return self
+
+    def limit(self, count: int) -> "_Cursor":
+        if count:
+            self._docs = self._docs[:count]
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield doc
+
+
+class InMemoryCollection:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        doc.setdefault("_id", next(self._ids))
+        if doc["_id"] in self.docs:
+            raise ValueError(f"duplicate key {doc['_id']!r} in {self.name}")
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+        return doc["_id"]
+
+    async def insert_one(self, doc: Dict[str, Any]) -> _Result:
+        with self._lock:
+            return _Result(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs: List[Dict[str, Any]], ordered: bool = True) -> _Result:
+        with self._lock:
+            return _Result(inserted_ids=[self._insert(doc) for doc in docs])
+
+    def _find(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        return [doc for doc in self.docs.values() if _matches(doc, query)]
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, sort=None):
+        found = _sorted(self._find(query or {}), sort)
+        return _project(found[0], projection) if found else None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> _Cursor:
+        return _Cursor([_project(doc, projection) for doc in self._find(query or {})])
+
+    def _apply(self, doc: Dict[str, Any], update: Dict[str, Any]) -> None:
+        for key, value in update.get("$set", {}).items():
+            doc[key] = copy.deepcopy(value)
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> _Result:
+        with self._lock:
+            found = self._find(query)
+            if found:
+                self._apply(found[0], update)
+                return _Result(matched=1)
+            if upsert:
+                doc = {k: v for k, v in query.items() if not k.startswith("$")}
+                self._apply(doc, update)
+                return _Result(inserted_id=self._insert(doc))
+            return _Result()
+
+    async def replace_one(self, query: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False) -> _Result:
+        with self._lock:
+            found = self._find(query)
+            if found:
+                new = dict(copy.deepcopy(replacement), _id=found[0]["_id"])
+                self.docs[new["_id"]] = new
+                return _Result(matched=1)
+            if upsert:
+                return _Result(inserted_id=self._insert(dict(replacement, **{k: v for k, v in query.items() if k == "_id"})))
+            return _Result()
+
+    async def find_one_and_update(self, query, update, sort=None, return_document=False, projection=None, upsert=False):
+        with self._lock:
+            found = _sorted(self._find(query), sort)
+            if not found:
+                return None
+            before = copy.deepcopy(found[0])
+            self._apply(found[0], update)
+            return _project(found[0] if return_document else before, projection)
+
+    async def delete_many(self, query: Dict[str, Any]) -> _Result:
+        with self._lock:
+            doomed = [doc["_id"] for doc in self._find(query)]
+            for key in doomed:
+                del self.docs[key]
+            return _Result(matched=len(doomed))
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        return len(self._find(query))
+
+    async def create_index(self, *args: Any, **kwargs: Any) -> str:
+        return "index"
+
+    async def create_indexes(self, indexes: List[Any]) -> List[str]:
+        return ["index" for _ in indexes]
+
+
+class InMemoryDatabase(dict):
+    def __missing__(self, name: str) -> InMemoryCollection:
+        self[name] = InMemoryCollection(name)
+        return self[name]
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        return self[name]
+
+
+def install_mongo() -> InMemoryDatabase:
+    """Points app.core.database at a fresh in-memory database."""
+    import app.core.database as database
+
+    database._db = InMemoryDatabase()
+    return database._db
+
+
+# ---------------------- SMTP ----------------------
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        self._reply("220 benchmark SMTP sink")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    in_data = False
+                    self.server.messages += 1
+                    self._reply("250 OK")
+                continue
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-benchmark\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command.startswith("AUTH"):
+                self._reply("235 Authentication successful")
+            elif command == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:  # MAIL, RCPT, NOOP, RSET
+                self._reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Accepts mail on 127.0.0.1 and only counts it."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _SMTPHandler)
+        self.messages = 0
+        self._thread = threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "SMTPSink":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def stub_environment(smtp_port: int, gemini_ttfb_ms: float = 300, gemini_token_ms: float = 20) -> Dict[str, str]:
+    """Settings that route the app to the stand-ins; apply before app.core.config is imported."""
+    return {
+        "MONGODB_URI": "mongodb://127.0.0.1:1",
+        "GEMINI_FAKE": "true",
+        "GEMINI_FAKE_TTFB_MS": str(gemini_ttfb_ms),
+        "GEMINI_FAKE_TOKEN_MS": str(gemini_token_ms),
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_USER": "bench",
+        "SMTP_PASS": "bench",
+        "SMTP_FROM": "bench@example.com",
+        "SMTP_STARTTLS": "false",
+        "WRITE_BEHIND_SPILL_DIR": "benchmarks/results/spill",
+    }
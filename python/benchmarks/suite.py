@@ -0,0 +1,158 @@
+"""Benchmark suite for every endpoint plus microbenchmarks, with baseline comparison.
+
+Mongo, SMTP and Gemini are replaced by local stand-ins (benchmarks.stubs), so
+the numbers reflect this service only. Results are written as JSON and
+compared with a baseline; the run fails when a latency grows, or a
+throughput drops, by more than --tolerance.
+
+Timings depend on the machine, so no baseline is shipped: record one with
+--save-baseline on the machine (and settings) the comparisons will run on
+before anything else. Without one the run exits with status 2.
+
+    python -m benchmarks.suite --save-baseline       # first: run and store the result as the baseline
+    python -m benchmarks.suite                       # run and compare to benchmarks/baseline.json
+    python -m benchmarks.suite --skip-endpoints --resolutions small medium
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from benchmarks import endpoints, micro
+from benchmarks.images import RESOLUTIONS
+from benchmarks.stubs import SMTPSink, stub_environment
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_OUTPUT = BENCH_DIR / "results" / "latest.json"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# Figures compared against the baseline, by key suffix
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "ready_seconds")
+HIGHER_IS_BETTER = ("requests_per_sec",)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=BENCH_DIR
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _flatten(report: Dict[str, Any], prefix: str = "") -> Iterable[Tuple[str, float]]:
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, float(value)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Figures that regressed by more than ``tolerance`` (a fraction) against the baseline."""
+    before = dict(_flatten(baseline.get("results", {})))
+    regressions = []
+    for path, value in _flatten(current.get("results", {})):
+        old = before.get(path)
+        if not old:
+            continue
+        if path.endswith(LOWER_IS_BETTER):
+            change = (value - old) / old
+        elif path.endswith(HIGHER_IS_BETTER):
+            change = (old - value) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": path, "baseline": old, "current": value, "regression": round(change, 3)})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=list(endpoints.ENDPOINTS), choices=list(endpoints.ENDPOINTS))
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--iterations", type=int, default=20, help="sequential requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients for throughput")
+    parser.add_argument("--requests", type=int, default=64, help="requests per throughput run")
+    parser.add_argument("--micro-iterations", type=int, default=20)
+    parser.add_argument("--gemini-ttfb-ms", type=float, default=300, help="latency of the Gemini stand-in")
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    smtp = SMTPSink().start()
+    env = stub_environment(smtp.port, gemini_ttfb_ms=args.gemini_ttfb_ms)
+    # Every request must do the real work
+    env["PREDICTION_CACHE_ENABLED"] = "false"
+    env["CROP_CACHE_ENABLED"] = "false"
+    # The synthetic leaves score low; keep them on the full explain-and-store path
+    env["PEST_MIN_CONFIDENCE"] = "0"
+    env["DISEASE_MIN_CONFIDENCE"] = "0"
+    # The load generators run as one client and would be rate limited
+    env["ADMISSION_ENABLED"] = "false"
+    env["CHATBOT_CACHE_MAX_ENTRIES"] = "1"
+    spawn = mp.get_context("spawn")
+
+    results: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try:
+        if not args.skip_endpoints:
+            options = {
+                "endpoints": args.endpoints,
+                "resolutions": args.resolutions,
+                "iterations": args.iterations,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+            }
+            results["endpoints"] = endpoints.run(options, env, spawn)
+            results["endpoints"]["emails_received"] = smtp.messages
+        if not args.skip_micro:
+            results["micro"] = micro.run(args.resolutions, args.micro_iterations, env, spawn)
+    finally:
+        smtp.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "duration_seconds": round(time.perf_counter() - started, 1),
+            "options": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; record one on this machine with --save-baseline first")
+        sys.exit(2)
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"  {r['metric']}: {r['baseline']} -> {r['current']} (+{r['regression']:.0%})")
+        sys.exit(1)
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
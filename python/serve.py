@@ -0,0 +1,84 @@
+"""Production server: a gunicorn master loads the models once and forks uvicorn workers that share them.
+
+    python serve.py                   # SERVER_WORKERS workers on HOST:PORT
+
+The models in SERVER_SHARED_MODELS are loaded in the master before forking,
+so every worker maps the same weight pages copy-on-write; gc.freeze() keeps
+the collector from writing to (and so copying) those objects. TensorFlow
+does not survive a fork, so the disease model still loads in each worker.
+GET /stats/workers reports the memory of the master and every worker.
+
+Signals to the master (its pid is written to SERVER_PIDFILE, if set):
+    HUP         graceful restart: fresh workers are forked from the loaded master
+                while the old ones finish their in-flight requests
+    USR2, QUIT  USR2 starts a second master that re-reads code and model files;
+                QUIT the old master once the new one is serving
+    TTIN, TTOU  add or remove one worker
+"""
+import gc
+import os
+import sys
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict) -> None:
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.core.config import get_settings
+        from app.main import app
+        from app.services.warmup_service import preload_models
+
+        settings = get_settings()
+        loaded = preload_models(settings.SERVER_SHARED_MODELS, settings.SERVER_SHARE_TORCH_MEMORY)
+        print(f"preloaded models in the master: {loaded}", flush=True)
+        # Everything allocated so far is exempt from collection in the master and workers alike
+        gc.freeze()
+        return app
+
+
+def post_fork(server, worker) -> None:
+    from app.core.config import get_settings
+    from app.utils.memory_stats import register_master
+
+    settings = get_settings()
+    register_master(server.pid)
+    threads = settings.SERVER_WORKER_THREADS or max(1, (os.cpu_count() or 1) // settings.SERVER_WORKERS)
+    # Read when TensorFlow initializes, which happens after the fork
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def main() -> None:
+    load_dotenv()
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    Server({
+        "bind": f"{host}:{port}",
+        "workers": settings.SERVER_WORKERS,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": settings.SERVER_TIMEOUT_SECONDS,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "pidfile": settings.SERVER_PIDFILE,
+        "post_fork": post_fork,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()